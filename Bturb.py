@@ -7,6 +7,9 @@ Class to calculate turbulent B field
 History:
 --------
 - 04/08/2014: version 0.01 - created
+- 10/18/2026: scipy is imported only when spatial correlation is calculated
+- 10/18/2026: random numbers can be drawn from a given random generator
+- 10/18/2026: random numbers can be read out and set
 """
 
 __author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
@@ -17,7 +20,7 @@ import numpy as np
 from numpy.random import rand
 from numpy import log,log10,pi,meshgrid,cos,sum,sqrt,linspace,array,isscalar
 from math import ceil
-from scipy.integrate import simps
+from PhotALPsConv.tools import uniform
 
 class Bgaussian(object):
     """
@@ -80,15 +83,55 @@ class Bgaussian(object):
 
 	return
 
-    def new_random_numbers(self):
-	"""Generate new random numbers for Un,Vn, and kn if knType == random"""
+    def new_random_numbers(self, rng = None):
+	"""
+	Generate new random numbers for Un,Vn, and kn if knType == random
+
+	kwargs
+	------
+	rng:	numpy Generator or RandomState instance, if None, the global numpy random state is used
+	"""
+	if rng == None:
+	    draw = rand
+	else:
+	    draw = lambda n: uniform(rng,n)
 	if self.dkType == 'random':
-	    self.dk = rand(self.dkSteps)
+	    self.dk = draw(self.dkSteps)
 	    self.dk *= (self.kH - self.kMin) / sum(self.dk)
 	    self.kn = np.array([self.kMin + sum(self.dk[:n]) for n in range(self.dk.shape[0])])
 
-	self.Un = rand(self.kn.shape[0])
-	self.Vn = rand(self.kn.shape[0])
+	self.Un = draw(self.kn.shape[0])
+	self.Vn = draw(self.kn.shape[0])
+	return
+
+    def random_numbers(self):
+	"""
+	Returns
+	-------
+	dictionary with copies of the current random numbers Un, Vn, and dk if dkType == random
+	"""
+	numbers = {'Un': self.Un.copy(), 'Vn': self.Vn.copy()}
+	if self.dkType == 'random':
+	    numbers['dk'] = self.dk.copy()
+	return numbers
+
+    def set_random_numbers(self, numbers):
+	"""
+	Set the random numbers
+
+	Parameters
+	----------
+	numbers:	dictionary with the random numbers Un, Vn, and dk if dkType == random, see random_numbers
+	"""
+	if self.dkType == 'random':
+	    self.dk = np.array(numbers['dk'], dtype = np.float)
+	    self.kn = np.array([self.kMin + sum(self.dk[:n]) for n in range(self.dk.shape[0])])
+	for k in ['Un','Vn']:
+	    if not numbers[k].shape == self.kn.shape:
+		raise ValueError("Shape of {0:s} {1} does not match the {2:n} wave numbers of the turbulent field".format(k,
+				    numbers[k].shape,self.kn.shape[0]))
+	self.Un = np.array(numbers['Un'], dtype = np.float)
+	self.Vn = np.array(numbers['Vn'], dtype = np.float)
 	return
 
     def Fq(self,x):
@@ -171,6 +214,8 @@ class Bgaussian(object):
 	-------
 	m-dim array with spatial coherences 
 	"""
+	from scipy.integrate import simps
+
 	if isscalar(z):
 	    z = array([z])
 	t	= 10.**linspace(-9.,0.,steps)
@@ -1 +1 @@
-__all__ = ['deltas','conversion','conversion_ICM','conversion_GMF','conversion_Jet','tools','iminuit_fit','calc_conversion', 'Bturb']
+__all__ = ['deltas','conversion','conversion_ICM','conversion_GMF','conversion_Jet','tools','iminuit_fit','calc_conversion', 'Bturb', 'pgg_table', 'scan', 'realizations', 'stats', 'workspace', 'pipeline', 'fieldbank', 'binaverage', 'superop', 'joint_fit', 'derivatives', 'fitstore']
@@ -0,0 +1,274 @@
+"""
+Benchmarks for the transfer matrix calculation of each B-field environment
+(SetDomainN* methods) at realistic numbers of domains and for the full
+calculation of the conversion probabilities with the shipped config files.
+
+By default, the external packages eblstud, gmf, and kapteyn are replaced by
+the offline stand-ins in standins.py. Timings are stored in json files and
+can be compared against a stored baseline to track regressions.
+
+Usage:
+> python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+> python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json
+
+PhotALPsConv has to be in your PYTHONPATH.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+- 10/18/2026: IGM benchmark uses the optical depth table of the energy grid
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import sys
+import time
+import json
+import platform
+import logging
+import warnings
+from optparse import OptionParser
+# ------------------------ #
+
+# directory of the config files
+CONFIGDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# parameters of the benchmarked stages: list of tuples with (name, scenario, kwargs)
+STAGES = \
+    [('IGM_z{0:.2f}'.format(z), 'IGM', {'z': z}) for z in [0.1,0.25,0.5,1.]] + \
+    [('Jet_sens{0:.3f}'.format(s), 'Jet', {'sens': s}) for s in [0.9,0.99,0.999]] + \
+    [('ICM_Nd{0:n}'.format(int(r / L)), 'ICM', {'r_abell': r, 'Lcoh': L}) for r,L in [(500.,10.),(500.,1.),(1000.,1.)]] + \
+    [('GMF_steps{0:n}'.format(n), 'GMF', {'int_steps': n}) for n in [100,300,1000]] + \
+    [('BLR_Nd{0:n}'.format(int(R / L)), 'BLR', {'R_BLR': R, 'L_BLR': L}) for R,L in [(0.3,0.3),(0.3,0.003)]]
+
+# config files for the full calculation
+CONFIGS = ['EXAMPLE.yaml', 'yaml/BLR.yaml', 'yaml/PG1553.yaml']
+
+def best_time(func, repeat = 3, number = 1):
+    """
+    Minimum wall time of repeat runs of number calls of func, divided by number
+
+    Parameters
+    ----------
+    func:	function without arguments
+
+    kwargs
+    ------
+    repeat:	int, number of repetitions, default: 3
+    number:	int, number of calls per repetition, default: 1
+
+    Returns
+    -------
+    float, time per call in seconds
+    """
+    t = []
+    for i in range(repeat):
+	t0 = time.time()
+	for j in range(number):
+	    func()
+	t.append((time.time() - t0) / number)
+    return min(t)
+
+def bench_stage(scenario, EGeV, repeat = 3, **kwargs):
+    """
+    Time the transfer matrix calculation of one B-field environment
+
+    Parameters
+    ----------
+    scenario:	string, one of IGM, Jet, ICM, GMF, BLR
+    EGeV:	n-dim array, energies in GeV
+
+    kwargs
+    ------
+    repeat:	int, number of repetitions
+    and kwargs for PhotALPsConv.calc_conversion.Calc_Conv
+
+    Returns
+    -------
+    dictionary with time per energy in seconds and number of domains
+    """
+    import PhotALPsConv.calc_conversion as CC
+
+    kwargs.setdefault('z',0.1)
+    kwargs.setdefault('ra',329.71696)
+    kwargs.setdefault('dec',-30.22558)
+    kwargs.setdefault('B_gauss',False)
+    kwargs.setdefault('B',1.)
+    kwargs.setdefault('n',1.)
+    np.random.seed(0)
+    cc = CC.Calc_Conv(scenario = [scenario], **kwargs)
+
+    if scenario == 'IGM':
+	def f():
+	    cc.set_energy_grid_IGM(EGeV)	# optical depth table of all domains and energies, as in the propagation
+	    for E in EGeV:
+		cc.E0 = E
+		cc.SetDomainN_IGM()
+	nd = cc.Nd_IGM
+    elif scenario == 'Jet':
+	def f():
+	    for E in EGeV:
+		cc.E = E
+		cc.SetDomainN_Jet()
+	nd = cc.Nd_jet
+    elif scenario == 'ICM':
+	def f():
+	    for E in EGeV:
+		cc.E = E
+		cc.SetDomainN()
+	nd = cc.Nd
+    elif scenario == 'GMF':
+	def f():
+	    for E in EGeV:
+		cc.Pag_TM(E, cc.ra, cc.dec, cc.pol)
+	nd = cc.int_steps
+    elif scenario == 'BLR':
+	def f():
+	    for E in EGeV:
+		cc.E = E
+		cc.SetDomainN_BLR()
+	nd = cc.Nd_BLR
+    else:
+	raise ValueError("Unknown scenario {0}".format(scenario))
+
+    return {'time': best_time(f, repeat = repeat) / EGeV.shape[0], 'domains': int(nd)}
+
+def bench_config(config, repeat = 3):
+    """
+    Time the full calculation of the conversion probability for one config file
+
+    Parameters
+    ----------
+    config:	string, path to yaml config file
+
+    kwargs
+    ------
+    repeat:	int, number of repetitions
+
+    Returns
+    -------
+    dictionary with time per call of calc_conversion in seconds and number of energies
+    """
+    import PhotALPsConv.calc_conversion as CC
+
+    np.random.seed(0)
+    cc = CC.Calc_Conv(config = config)
+    try:
+	EGeV = np.logspace(cc.log10Estart,cc.log10Estop,cc.Estep)
+    except AttributeError:
+	EGeV = np.logspace(-1.,4.5,100)
+    try:
+	cc.scenario.index('Jet')
+	new_angles = False
+    except ValueError:
+	new_angles = True
+
+    t = best_time(lambda : cc.calc_conversion(EGeV, new_angles = new_angles), repeat = repeat)
+    return {'time': t, 'energies': EGeV.shape[0]}
+
+def run(select = '', repeat = 3, nE = 20):
+    """
+    Run all benchmarks whose name contains select
+
+    kwargs
+    ------
+    select:	string, only run benchmarks whose name contains this string
+    repeat:	int, number of repetitions of each benchmark
+    nE:		int, number of energies for the stage benchmarks
+
+    Returns
+    -------
+    dictionary with results, failed benchmarks have an entry 'error'
+    """
+    EGeV = np.logspace(-1.,4.5,nE)
+    result = {}
+    cases = [(n, bench_stage, (s, EGeV), k) for n,s,k in STAGES] + \
+	[('calc_conversion_' + os.path.basename(c).split('.')[0], bench_config, (os.path.join(CONFIGDIR,c),), {}) for c in CONFIGS]
+    for name,func,args,kwargs in cases:
+	if name.find(select) < 0:
+	    continue
+	try:
+	    result[name] = func(*args, repeat = repeat, **kwargs)
+	    logging.info("{0:35s} {1:12.3e} s".format(name,result[name]['time']))
+	except Exception as e:
+	    result[name] = {'error': '{0}: {1}'.format(type(e).__name__,e)}
+	    logging.error("{0:35s} failed: {1}".format(name,result[name]['error']))
+    return result
+
+def compare(result, baseline, tolerance = 0.2):
+    """
+    Compare benchmark results to a baseline
+
+    Parameters
+    ----------
+    result:	dictionary with benchmark results
+    baseline:	dictionary with baseline results
+
+    kwargs
+    ------
+    tolerance:	float, relative slow down above which a benchmark counts as regression, default: 0.2
+
+    Returns
+    -------
+    list with names of the benchmarks that regressed or failed (and did not fail in the baseline)
+    """
+    bad = []
+    for name in sorted(result.keys()):
+	if not 'time' in result[name]:
+	    if name in baseline and not 'time' in baseline[name]:
+		logging.warning("{0:35s} failed, also in baseline: {1}".format(name,result[name]['error']))
+	    else:
+		bad.append(name)
+	    continue
+	if not name in baseline or not 'time' in baseline[name]:
+	    logging.info("{0:35s} {1:12.3e} s   (no baseline)".format(name,result[name]['time']))
+	    continue
+	ratio = result[name]['time'] / baseline[name]['time']
+	flag = ''
+	if ratio > 1. + tolerance:
+	    flag = 'REGRESSION'
+	    bad.append(name)
+	logging.info("{0:35s} {1:12.3e} s {2:12.3e} s {3:8.2f} {4:s}".format(name,result[name]['time'],baseline[name]['time'],ratio,flag))
+    return bad
+
+if __name__ == '__main__':
+    usage = "usage: %prog [options]"
+    description = "Run benchmarks of the photon-ALP conversion calculation"
+    parser = OptionParser(usage = usage, description = description)
+    parser.add_option("-s","--save",dest="save",help="save results to this json file",action="store",default='None')
+    parser.add_option("-c","--compare",dest="compare",help="compare results to baseline json file",action="store",default='None')
+    parser.add_option("-k","--select",dest="select",help="only run benchmarks whose name contains this string",action="store",default='')
+    parser.add_option("-r","--repeat",dest="repeat",help="number of repetitions, default: 3",action="store",type="int",default=3)
+    parser.add_option("-t","--tolerance",dest="tolerance",help="relative slow down that counts as regression, default: 0.2",
+			action="store",type="float",default=0.2)
+    parser.add_option("--real",dest="real",help="use the installed eblstud, gmf, and kapteyn packages instead of the stand-ins",
+			action="store_true",default=False)
+    (opt, args) = parser.parse_args()
+
+    logging.basicConfig(level = logging.INFO, format = '%(message)s')
+    warnings.simplefilter('ignore')
+
+    if not opt.real:
+	import standins
+	standins.install()
+
+    result = run(select = opt.select, repeat = opt.repeat)
+    meta = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+	    'node': platform.node(), 'standins': not opt.real, 'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+    if not opt.save == 'None':
+	json.dump({'meta': meta, 'results': result}, open(opt.save,'w'), indent = 1, sort_keys = True)
+	logging.info("Results saved to {0:s}".format(opt.save))
+
+    if not opt.compare == 'None':
+	baseline = json.load(open(opt.compare))
+	if not baseline['meta']['standins'] == meta['standins']:
+	    logging.warning("Baseline was {0:s}run with the stand-ins".format('' if baseline['meta']['standins'] else 'not '))
+	bad = compare(result, baseline['results'], tolerance = opt.tolerance)
+	if len(bad):
+	    logging.error("Regressions or failures: {0}".format(', '.join(bad)))
+	    sys.exit(1)
@@ -0,0 +1,226 @@
+"""
+Offline stand-ins for the external packages eblstud, gmf, and kapteyn.
+
+The stand-ins provide the interfaces that are used by PhotALPsConv with simple
+analytic models, so that the benchmarks run without the external packages
+and model files and the timings do not depend on their installed versions.
+The results of the conversion calculation are NOT physically meaningful.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+- 10/18/2026: fitting tools of eblstud for the tests of the fit modules
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import sys
+import types
+import numpy as np
+# ------------------------ #
+
+# --- eblstud.ebl.tau_from_model -------------------------------------------------- #
+class OptDepth(object):
+    """Smooth analytic EBL optical depth, tau(z,E) with E in TeV"""
+    def __init__(self):
+	self.model = 'None'
+	return
+
+    def readfile(self, model = 'gilmore', file_name = 'None'):
+	self.model = model
+	return
+
+    def opt_depth(self, z, E):
+	"""optical depth for scalar z and scalar or n-dim E in TeV"""
+	return 3. * z * (1. + z) ** 2. * E ** 1.3 * np.exp(-0.03 / E)
+
+    def opt_depth_array(self, z, E):
+	"""optical depth for m-dim z and n-dim E in TeV, returns (m x n)-dim array"""
+	z,E = np.meshgrid(np.atleast_1d(z), np.atleast_1d(E), indexing = 'ij')
+	return self.opt_depth(z,E)
+
+    def opt_depth_Ebin(self, z, Ebin, func, p, steps = 50):
+	"""optical depth averaged over n bins with boundaries Ebin in TeV, weighted with func(p,E)"""
+	tau = np.zeros(len(Ebin) - 1)
+	for i in range(tau.shape[0]):
+	    E = np.logspace(np.log10(Ebin[i]), np.log10(Ebin[i+1]), steps)
+	    w = func(p,E) * E
+	    tau[i] = -np.log(np.trapz(w * np.exp(-self.opt_depth(z,E)), np.log(E)) / np.trapz(w, np.log(E)))
+	return tau
+
+# --- eblstud.blr.absorption ------------------------------------------------------ #
+class OptDepth_BLR(object):
+    """Pair production optical depth on BLR lines with a smooth onset above threshold"""
+    def __init__(self, Elines = [13.6,10.2,8.0,24.6,21.2], Nlines = [24.,24.,24.,24.,24.], z = 0.):
+	self.Elines	= np.array(Elines, dtype = np.float)
+	self.Nlines	= np.array(Nlines, dtype = np.float)
+	self.z		= z
+	self.Eth	= 0.511e-3 ** 2. / (self.Elines * 1e-9) / (1. + z)	# threshold energy in GeV
+	return
+
+    def __call__(self, E):
+	"""optical depth of each line for n-dim E in GeV, returns (lines x n)-dim array"""
+	x = np.maximum(1. - np.outer(self.Eth, 1. / np.atleast_1d(E)), 0.)
+	return 50. * (10. ** (self.Nlines - 24.))[:,np.newaxis] * x ** 1.5 / (1. + 10. * x ** 2.)
+
+# --- eblstud.misc.bin_energies --------------------------------------------------- #
+def calc_bin_bounds(x):
+    """logarithmic bin boundaries around n-dim bin centers x"""
+    lx = np.log(x)
+    d = np.diff(lx)
+    return np.exp(np.concatenate([[lx[0] - d[0] / 2.], lx[:-1] + d / 2., [lx[-1] + d[-1] / 2.]]))
+
+# --- eblstud.tools.iminuit_fit --------------------------------------------------- #
+def pl(p, x):
+    """power law with parameters Prefactor, Index, and Scale"""
+    return p['Prefactor'] * (x / p['Scale']) ** p['Index']
+
+def lp(p, x):
+    """log parabola with parameters Prefactor, Index, Curvature, and Scale"""
+    return p['Prefactor'] * (x / p['Scale']) ** (p['Index'] + p.get('Curvature',0.) * np.log(x / p['Scale']))
+
+# --- eblstud.tools.lsq_fit ------------------------------------------------------- #
+def prior_pl_ind(x, y):
+    """power-law index from a straight line fit in log-log space"""
+    return np.polyfit(np.log(x), np.log(y), 1)[0]
+
+def prior_norm(x, y):
+    """power-law normalization at x = 1 from a straight line fit in log-log space"""
+    return np.exp(np.polyfit(np.log(x), np.log(y), 1)[1])
+
+def pvalue(dof, chisq):
+    """p-value of the chi^2 distribution"""
+    from scipy.stats import chi2
+    return chi2.sf(chisq, dof)
+
+# --- gmf.gmf ----------------------------------------------------------------------- #
+class GMF(object):
+    """
+    Regular GMF with disk, toroidal halo and X-field components in muG in
+    galactocentric cylindrical coordinates. Parameters follow Jansson & Farrar (2012),
+    the field shapes are simplified.
+    """
+    def __init__(self):
+	self.Bn, self.Bn_unc		= 1.38, 0.1
+	self.Bs, self.Bs_unc		= -1.14, 0.08
+	self.rhon, self.rhon_unc	= 9.22, 0.08
+	self.rhos, self.rhos_unc	= 16.7, 0.
+	self.whalo, self.whalo_unc	= 0.2, 0.12
+	self.z0, self.z0_unc		= 5.3, 1.6
+	self.BX0, self.BX_unc		= 4.6, 0.3
+	self.ThetaX0, self.ThetaX0_unc	= 49., 1.
+	self.rhoXc, self.rhoXc_unc	= 4.8, 0.2
+	self.rhoX, self.rhoX_unc	= 2.9, 0.1
+	self.pitch			= 11.5 * np.pi / 180.
+	return
+
+    def __comp(self, Brho, Bphi, Bz):
+	B = np.array([Brho, Bphi, Bz])
+	return B, np.sqrt(np.sum(B ** 2., axis = 0))
+
+    def Bdisk(self, rho, phi, z):
+	"""logarithmic spiral field in the disk"""
+	b = 3. * np.exp(-np.abs(z) / 0.4) * np.exp(-(rho - 5.) / 8.) * (rho > 3.) * (rho < 20.) * \
+	    np.cos(2. * (phi - np.log(np.maximum(rho,1e-3)) / np.tan(self.pitch)))
+	return self.__comp(b * np.sin(self.pitch), b * np.cos(self.pitch), 0. * z)
+
+    def Bhalo(self, rho, z):
+	"""toroidal halo field with different strength in north and south"""
+	L = lambda x,h,w: 1. / (1. + np.exp(-2. * (np.abs(x) - h) / w))
+	Bphi = np.where(z >= 0., self.Bn * (1. - L(rho,self.rhon,self.whalo)), self.Bs * (1. - L(rho,self.rhos,self.whalo)))
+	Bphi *= np.exp(-np.abs(z) / self.z0) * L(z,0.4,0.27)
+	return self.__comp(0. * z, Bphi, 0. * z)
+
+    def BX(self, rho, z):
+	"""out-of-plane X-shaped field with constant inclination"""
+	b = self.BX0 * np.exp(-rho / self.rhoX) * (1. + (rho < self.rhoXc))
+	t = self.ThetaX0 * np.pi / 180.
+	return self.__comp(b * np.cos(t) * np.sign(z), 0. * z, b * np.sin(t))
+
+class GMF_Pshirkov(GMF):
+    """Pshirkov et al. (2011) model, same simplified field shapes as GMF"""
+    def __init__(self, mode = 'ASS'):
+	super(GMF_Pshirkov,self).__init__()
+	self.mode = mode
+	return
+
+# --- gmf.trafo ------------------------------------------------------------------- #
+def _HC2GC_cart(s,l,b,d):
+    return s * np.cos(b) * np.cos(l) + d, s * np.cos(b) * np.sin(l), s * np.sin(b)
+
+def rho_HC2GC(s,l,b,d):
+    x,y,z = _HC2GC_cart(s,l,b,d)
+    return np.sqrt(x ** 2. + y ** 2.)
+
+def phi_HC2GC(s,l,b,d):
+    x,y,z = _HC2GC_cart(s,l,b,d)
+    return np.arctan2(y,x)
+
+def z_HC2GC(s,l,b,d):
+    return _HC2GC_cart(s,l,b,d)[2]
+
+def GC2HCproj(B,s,l,b,d):
+    """project B in GC cylindrical coordinates onto heliocentric s, b, and l unit vectors"""
+    phi = phi_HC2GC(s,l,b,d)
+    Bx = B[0] * np.cos(phi) - B[1] * np.sin(phi)
+    By = B[0] * np.sin(phi) + B[1] * np.cos(phi)
+    Bs = Bx * np.cos(b) * np.cos(l) + By * np.cos(b) * np.sin(l) + B[2] * np.sin(b)
+    Bb = -Bx * np.sin(b) * np.cos(l) - By * np.sin(b) * np.sin(l) + B[2] * np.cos(b)
+    Bl = -Bx * np.sin(l) + By * np.cos(l)
+    return Bs, Bb, Bl
+
+# --- gmf.ne2001 ------------------------------------------------------------------ #
+def density_2001_los(s,l,b,filename,d = -8.5):
+    """thick exponential disk electron density in cm^-3 along line of sight, nothing is written to filename"""
+    return 0.03 * np.exp(-np.abs(z_HC2GC(s,l,b,d)) / 1.) * np.exp(-rho_HC2GC(s,l,b,d) / 20.)
+
+# --- kapteyn.wcs ----------------------------------------------------------------- #
+class Transformation(object):
+    """Transformation from equatorial (J2000) to galactic coordinates in degrees"""
+    R = np.array([[-0.0548755604, -0.8734370902, -0.4838350155],
+		    [ 0.4941094279, -0.4448296300,  0.7469822445],
+		    [-0.8676661490, -0.1980763734,  0.4559837762]])
+    def __init__(self, skyin, skyout):
+	return
+
+    def transform(self, pos):
+	ra,dec = np.radians(pos[0]), np.radians(pos[1])
+	x = np.dot(self.R, [np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+	return np.degrees(np.arctan2(x[1],x[0])) % 360., np.degrees(np.arcsin(x[2]))
+
+# --------------------------------------------------------------------------------- #
+def install():
+    """
+    Install the stand-ins as the modules eblstud, gmf, and kapteyn in sys.modules,
+    replacing installed versions of these packages.
+    """
+    content = {
+	'eblstud':			{},
+	'eblstud.misc':			{},
+	'eblstud.misc.constants':	{},
+	'eblstud.misc.bin_energies':	{'calc_bin_bounds': calc_bin_bounds},
+	'eblstud.tools':		{},
+	'eblstud.tools.iminuit_fit':	{'pl': pl, 'lp': lp},
+	'eblstud.tools.lsq_fit':	{'prior_norm': prior_norm, 'prior_pl_ind': prior_pl_ind, 'pvalue': pvalue},
+	'eblstud.ebl':			{},
+	'eblstud.ebl.tau_from_model':	{'OptDepth': OptDepth},
+	'eblstud.blr':			{},
+	'eblstud.blr.absorption':	{'OptDepth_BLR': OptDepth_BLR},
+	'gmf':				{},
+	'gmf.gmf':			{'GMF': GMF, 'GMF_Pshirkov': GMF_Pshirkov},
+	'gmf.trafo':			{'rho_HC2GC': rho_HC2GC, 'phi_HC2GC': phi_HC2GC, 'z_HC2GC': z_HC2GC, 'GC2HCproj': GC2HCproj},
+	'gmf.ne2001':			{'density_2001_los': density_2001_los},
+	'kapteyn':			{},
+	'kapteyn.wcs':			{'Transformation': Transformation},
+	}
+    for name in sorted(content.keys()):
+	m = types.ModuleType(name)
+	m.__dict__.update(content[name])
+	m.__all__ = content[name].keys()
+	sys.modules[name] = m
+	if name.find('.') >= 0:
+	    parent,child = name.rsplit('.',1)
+	    setattr(sys.modules[parent],child,m)
+    return
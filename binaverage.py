@@ -0,0 +1,75 @@
+"""
+Module to calculate transfer matrices on a fine energy grid within an energy bin
+from only three evaluations of the mixing matrices per bin.
+
+The transfer matrix of a domain is U = sum_k exp(i EW_k L) T_k. Within a bin, the
+eigenvalues EW_k and the matrices T_k change slowly with energy, while the phases
+EW_k L can oscillate rapidly. Both are interpolated quadratically in log(E)
+between the values at the lower boundary, the center, and the upper boundary of the bin,
+and the phases are evaluated on a fine grid, so that the oscillations within the bin are
+resolved without calculating the mixing matrices at every grid point.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+# ------------------------ #
+
+def quadratic(flo, fc, fhi, x, D):
+    """
+    Quadratic interpolation through the values flo, fc, fhi at -D/2, 0, and D/2
+
+    Parameters
+    ----------
+    flo, fc, fhi:	arrays with the same shape s (or scalars)
+    x:			m-dim array, positions of the interpolation
+    D:			float, distance between flo and fhi
+
+    Returns
+    -------
+    array with shape (m,) + s
+    """
+    x = x.reshape(x.shape + (1,) * np.ndim(fc))
+    return fc + x * (fhi - flo) / D + x**2. * 2. * (fhi + flo - 2. * fc) / D**2.
+
+def transfer_bin(eig, x, D, left = False):
+    """
+    Transfer matrices of all domains multiplied on a fine grid within an energy bin
+
+    Parameters
+    ----------
+    eig:	list with three tuples (T, EW, L) at the lower boundary, the center, and the upper boundary of the bin,
+		each with a list of three (3 x 3 x Nd)-dim arrays T1, T2, T3, a list of three Nd-dim arrays
+		with the eigenvalues (real or complex), and the domain lengths (float or Nd-dim array)
+    x:		m-dim array, positions of the grid points in log(E) relative to the bin center
+    D:		float, width of the bin in log(E)
+
+    kwargs
+    ------
+    left:	bool, if True, the matrix of domain i is multiplied from the left,
+		otherwise from the right, see PhotALPsConv.workspace.domain_product, default: False
+
+    Returns
+    -------
+    (m x 3 x 3)-dim complex numpy array with the product of the transfer matrices of all domains at each grid point
+    """
+    (Tlo,EWlo,L),(Tc,EWc,L),(Thi,EWhi,L) = eig
+    Nd	= Tc[0].shape[2]
+    Un	= np.zeros((x.shape[0],3,3,Nd), dtype = np.complex128)
+    for k in range(3):
+	EW	= quadratic(np.ones(Nd) * EWlo[k],np.ones(Nd) * EWc[k],np.ones(Nd) * EWhi[k],x,D)	# m x Nd
+	Un	+= np.exp(1.j * EW * L)[:,np.newaxis,np.newaxis,:] * quadratic(Tlo[k],Tc[k],Thi[k],x,D)
+
+    U = Un[...,0].copy()
+    for i in range(1,Nd):
+	if left:
+	    U = np.einsum('nij,njk->nik',Un[...,i],U)
+	else:
+	    U = np.einsum('nij,njk->nik',U,Un[...,i])
+    return U
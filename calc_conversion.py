@@ -6,6 +6,20 @@ History:
 --------
 - 01/05/2014: version 0.01 - created
 - 03/14/2014: version 0.1 - added BLR conversion
+- 10/18/2026: added cloning and snapshots of configured instances
+- 10/18/2026: yaml, scipy and fitting modules are only imported where they are used
+- 10/18/2026: optional timing and counter statistics for each B-field environment
+- 10/18/2026: optional single precision transfer matrices
+- 10/18/2026: transfer matrices are kept in preallocated work space buffers
+- 10/18/2026: scenario is compiled into a pipeline of stages, transfer matrices of all stages are fused
+- 10/18/2026: realizations can be taken from a random field bank
+- 10/18/2026: adaptive energy sampling of the photon survival probability
+- 10/18/2026: bin averaged photon survival probability from interpolated eigenvalues and eigenprojectors
+- 10/18/2026: mean conversion probabilities over the random angles with superoperators
+- 10/18/2026: derivatives of the conversion probabilities and the bin averaged photon survival probability
+- 10/18/2026: bin averages on an adaptive energy grid are integrated over the adaptive energies within each bin
+- 10/18/2026: sub-bins of the eigenvalue interpolation are refined if the BLR is included
+- 10/18/2026: sub-bins of the eigenvalue interpolation are refined until the bin average has converged
 """
 
 __author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
@@ -13,34 +27,37 @@ __version__ = 0.01
 
 # --- Imports ------------ #
 import numpy as np
-import iminuit as minuit
 import sys
-import yaml
 from math import floor, ceil
-from eblstud.tools.lsq_fit import *
-from scipy.integrate import simps
-from scipy.interpolate import interp1d
 import logging
 import copy
+import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 # --- ALP imports 
 import PhotALPsConv.conversion_Jet as JET
 import PhotALPsConv.conversion as IGM 				
 import PhotALPsConv.conversion_ICM as ICM 
 import PhotALPsConv.conversion_GMF as GMF
 import conversion_BLR as BLR	                    
-from PhotALPsConv.tools import median_contours
+from PhotALPsConv.tools import median_contours,complex_dtype,adaptive_sampling
+from PhotALPsConv.stats import StageStats
+from PhotALPsConv.pipeline import Pipeline,changed_params
 from PhotALPsConv.deltas import Ecrit_GeV,Delta_Osc_kpc_array
-# --- EBL imports
-import eblstud.ebl.tau_from_model as TAU
-from eblstud.misc.bin_energies import calc_bin_bounds
-from eblstud.tools.iminuit_fit import *
-# --- BLR imports
+# --- yaml, scipy, and the eblstud fitting and binning tools are imported 
+# --- in the methods that use them to keep the import of this module fast
 # ------------------------ #
 
 class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR):
     """
     Class to wrap the calculation for photons to ALPs.
     """
+    _shared = ['tau','Bgmf','tt']	# read-only model tables that are shared between clones
+    _tmatrices = ['T1','T2','T3','Un','T1jet','T2jet','T3jet','Unjet',
+		'T1_IGM','T2_IGM','T3_IGM','Un_IGM','T1_BLR','T2_BLR','T3_BLR','Un_BLR']	# transfer matrices of all stages
+
     def __init__(self, **kwargs):
 	"""
 	Init class to calculate conversion from photons to ALPs
@@ -90,6 +107,18 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	pol_t: 		float, initial photon polarization
 	pol_u: 		float, initial photon polarization
 	pol_a: 		float, initial ALP polarization
+	nsim:		int, number of random B-field realizations, default: 1
+
+	precision:	string, precision of the complex transfer matrices, either 'double' (complex128) or 'single' (complex64),
+			check the accuracy of single precision with check_precision, default: 'double'
+	strong_mixing:	bool, if True, the ICM, GMF, and BLR use the energy independent transfer matrix of the 
+			strong mixing regime wherever its error bound is below strong_mixing_tol, default: False
+	strong_mixing_tol:	float, tolerance for the strong mixing approximation, default: 1e-2
+
+	instrument:	bool, if True, wall time, calls, domains, and matrix multiplications of each 
+			B-field environment are accumulated in self.stats (a StageStats instance), default: False
+	stats_callback:	function, if given and instrument is True, it is called with the StageStats
+			of each call of calc_conversion, e.g. to collect statistics from worker processes, default: 'None'
 
 	Notes
 	-----
@@ -102,70 +131,49 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	# -----------------
 
 	if not kwargs['config'] == 'None':
+	    import yaml
 	    kwargs = yaml.load(open(kwargs['config']))
+	kwargs.setdefault('nsim',1)
+	kwargs.setdefault('instrument',False)
+	kwargs.setdefault('stats_callback','None')
+
+	self.stats = StageStats()
 
 	super(Calc_Conv,self).__init__(**kwargs)	# init the jet mixing and gmf mixing, see e.g.
 							# for a small example
 	self.update_params_all(**kwargs)
 
 	# --- init random angles
-	try:
-	    self.scenario.index('IGM')
-	    self.new_random_psi_IGM()
-	except ValueError:
-	    pass
-	try:
-	    self.scenario.index('ICM')
-	    if not self.B_gauss:
-		self.new_random_psi()
-	except ValueError:
-	    pass
-	try:
-	    self.scenario.index('BLR')
-	    self.new_random_psi_BLR()
-	except ValueError:
-	    pass
+	self.pipeline.new_random(self, init = True)
 
 	return
 
     def update_params_all(self,new_init=True,**kwargs):
 	"""
 	Update all parameters and initial all matrices.
+	Only the B-field environments whose parameters have changed since the last call are updated,
+	so their current B-field realization is kept otherwise.
 
 	kwargs
 	------
 	new_init:	bool, if True, re-init all polarization matrices
 	"""
 
-	self.__dict__.update(kwargs)			# form instance of kwargs
-
-	# --- init params
-	try:
-	    self.scenario.index('GMF')
-	    self.update_params_GMF(**kwargs)
-	except ValueError:
-	    pass
-
-	try:
-	    self.scenario.index('IGM')
-	    self.update_params_IGM(**kwargs)
-	except ValueError:
-	    pass
-	try:
-	    self.scenario.index('ICM')
-	    self.update_params(**kwargs)
-	except ValueError:
-	    pass
+	# --- only parameters that have changed since the last call are set
 	try:
-	    self.scenario.index('Jet')
-	    self.update_params_Jet(**kwargs)
-	except ValueError:
-	    pass
-	try:
-	    self.scenario.index('BLR')
-	    self.update_params_BLR(**kwargs)
-	except ValueError:
-	    pass
+	    changed = changed_params(self.params_last, kwargs)
+	except AttributeError:
+	    self.params_last	= {}
+	    changed		= kwargs.keys()
+	self.__dict__.update(dict([(k,kwargs[k]) for k in changed]))	# form instance of kwargs
+
+	# --- compile the scenario into a pipeline, all stages are updated if it has changed,
+	# --- otherwise only the stages that depend on changed parameters
+	force = 'scenario' in changed or not 'pipeline' in self.__dict__
+	if force:
+	    self.pipeline = Pipeline(self.scenario)
+	updated = self.pipeline.update(self, changed, force = force, **kwargs)
+	self.params_last.update(dict([(k,copy.copy(kwargs[k])) for k in changed]))
 
 	# --- init initial and final polarization states ------ #
 	if new_init:
@@ -185,7 +193,8 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	self.kwargs = kwargs	# save kwargs
 	# change galactic magnetic field model
 	try:
-	    if not self.GMF_FitVal == 0 and self.model == 'jansson':
+	    if not self.GMF_FitVal == 0 and self.model == 'jansson' and 'GMF' in updated:
+		self.init_gmf_model()
 		parGMF			= {}
 		parGMF['Bn']		= self.Bgmf.Bn
 		parGMF['Bs']		= self.Bgmf.Bs
@@ -217,6 +226,95 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	    self.GMF_FitVal = 0
 	return
 
+    def clone(self):
+	"""
+	Copy of the configured instance including the current random B-field realization.
+	The read-only model tables (EBL optical depth, GMF model, BLR absorption) 
+	are shared with the original instance, all other attributes are copied.
+
+	Returns
+	-------
+	new instance of the same class
+	"""
+	memo = {}
+	for k in self._shared:
+	    if k in self.__dict__:
+		memo[id(self.__dict__[k])] = self.__dict__[k]
+	return copy.deepcopy(self, memo)
+
+    def snapshot(self, filename = 'None'):
+	"""
+	Serialize the configured instance including the current random B-field realization,
+	e.g. to pass it to worker processes or to store it to disk.
+
+	kwargs
+	------
+	filename:	string, if given, snapshot is also written to this file
+
+	Returns
+	-------
+	string with pickled instance, restore it with restore_snapshot
+	"""
+	s = pickle.dumps(self, pickle.HIGHEST_PROTOCOL)
+	if not filename == 'None':
+	    f = open(filename,'wb')
+	    f.write(s)
+	    f.close()
+	return s
+
+    def set_precision(self, precision):
+	"""
+	Change the precision of the transfer matrices of all stages, the B-field realization is kept.
+
+	Parameters
+	----------
+	precision:	string, either 'double' (complex128) or 'single' (complex64)
+	"""
+	self.ctype	= complex_dtype(precision)
+	self.precision	= precision
+	self.kwargs['precision'] = precision
+	self.params_last['precision'] = precision
+	for k in self._tmatrices:
+	    if k in self.__dict__:
+		T = self.ws.get(k,self.__dict__[k].shape,self.ctype, zero = True)
+		T[...] = self.__dict__[k]
+		self.__dict__[k] = T
+	return
+
+    def check_precision(self, EGeV):
+	"""
+	Check the accuracy of single precision transfer matrices for the current B-field realization.
+
+	Parameters
+	----------
+	EGeV:	n-dim array, energies in GeV
+
+	Returns
+	-------
+	dictionary with entries
+	    unitarity_<stage>:	float, maximum deviation max |U U^dagger - 1| over all energies of the single precision transfer 
+				matrix of each stage without absorption (ICM, Jet, and BLR if absorption is switched off)
+	    dP:			float, maximum absolute difference of the photon survival probability between 
+				single and double precision
+	"""
+	precision	= self.precision
+	result		= {}
+
+	self.set_precision('single')
+	for stage in self.pipeline.matrix:
+	    if not stage.unitary(self):
+		continue
+	    U = stage.transfer(self, EGeV)
+	    result['unitarity_' + stage.name] = np.abs(np.einsum('nij,nkj->nik',U,U.conjugate()) - np.eye(3)).max()
+	Pt,Pu,Pa	= self.calc_conversion(EGeV, new_angles = False)
+
+	self.set_precision('double')
+	Pt0,Pu0,Pa0	= self.calc_conversion(EGeV, new_angles = False)
+	result['dP']	= np.abs(Pt + Pu - Pt0 - Pu0).max()
+
+	self.set_precision(precision)
+	return result
+
     def calc_conversion(self,EGeV,new_angles = True):
 	"""
 	Calculate conversion probailities for energies EGeV
@@ -236,89 +334,141 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	if np.isscalar(EGeV):
 	    EGeV = np.array([EGeV])
 
-	Pt,Pu,Pa	= np.ones(EGeV.shape[0]) * 1e-40,np.ones(EGeV.shape[0]) * 1e-40,np.ones(EGeV.shape[0]) * 1e-40
+	if self.instrument:
+	    stats	= StageStats(trace = self.stats.trace)
+	else:
+	    stats	= None
+
 	# --- calculate new random angles
-	try:
-	    self.scenario.index('IGM')
-	    if new_angles:
-		self.new_random_psi_IGM()
-	except ValueError:
-	    pass
-	try:
-	    self.scenario.index('ICM')
-	    if new_angles:
-		if self.B_gauss:
-		    self.new_B_n()
-		else:
-		    self.new_random_psi()
-	except ValueError:
-	    pass
-	try:
-	    self.scenario.index('BLR')
-	    if new_angles:
-		self.new_random_psi_BLR()
-	except ValueError:
-	    pass
-
-	# --- calculate transfer matrix for every energy
-	for i,E in enumerate(EGeV):
-	    pol		= self.pol
-	    self.E	= E
-	    try:
-		self.scenario.index('BLR')
-		T	= self.SetDomainN_BLR()
-		pol	= np.dot(T,np.dot(pol,T.transpose().conjugate()))	# new polarization matrix
-	    except ValueError:
-		pass
-	    try:
-		self.scenario.index('Jet')
-		T	= self.SetDomainN_Jet()
-		pol	= np.dot(T,np.dot(pol,T.transpose().conjugate()))	# new polarization matrix
-	    except ValueError:
-		pass
-	    try:
-		self.scenario.index('ICM')
-		T	= self.SetDomainN()
-		pol	= np.dot(T,np.dot(pol,T.transpose().conjugate()))	# new polarization matrix
-		if not i:
-		# store values that are modified by GMF conversion calculation
-		    B,Lcoh,Nd,Psin,n = copy.copy(self.B),copy.copy(self.Lcoh),copy.copy(self.Nd),copy.copy(self.Psin),copy.copy(self.n)
-	    except ValueError:
-		pass
-	    try:
-		self.scenario.index('IGM')
-		self.E0 = E
-		T	= self.SetDomainN_IGM()	
-		pol	= np.dot(T,np.dot(pol,T.transpose().conjugate()))	# new polarization matrix
-		atten	= 1.
-	    except ValueError:
-		atten		= np.exp(-1. * self.ebl_norm * self.tau.opt_depth(self.z,E / 1e3))
-
-	    Pt[i]	= np.real(np.sum(np.diag(np.dot(self.polt,pol))))
-	    Pu[i]	= np.real(np.sum(np.diag(np.dot(self.polu,pol))))
-	    Pa[i]	= np.real(np.sum(np.diag(np.dot(self.pola,pol))))
-
-	    pol		= np.diag([Pt[i] * atten,Pu[i] * atten, Pa[i]])
-	    try:
-		self.scenario.index('GMF')
-
-		Pt[i],Pu[i],Pa[i]= np.real(self.Pag_TM(self.E,self.ra,self.dec,pol))	# mixing in GMF
-
-		try:
-		    # if ICM also considered, restore these values
-		    self.scenario.index('ICM')
-		    self.B,self.Lcoh,self.Nd,self.Psin,self.n = copy.copy(B),copy.copy(Lcoh),copy.copy(Nd),copy.copy(Psin),copy.copy(n)
-		    self.T1		= np.zeros((3,3,self.Nd),np.complex)	# Transfer matrices
-		    self.T2		= np.zeros((3,3,self.Nd),np.complex)
-		    self.T3		= np.zeros((3,3,self.Nd),np.complex)
-		    self.Un		= np.zeros((3,3,self.Nd),np.complex)
-		except ValueError:
-		    pass
-	    except ValueError:
-		pass
+	if new_angles:
+	    t = time.time()
+	    self.pipeline.new_random(self)
+	    if self.instrument:
+		stats.add('angles', t)
+
+	# --- fused transfer matrix of all stages for every energy, EBL absorption, and GMF
+	Pt,Pu,Pa = self.pipeline.propagate(self, EGeV, stats = stats)
+
+	if self.instrument:
+	    self.stats.merge(stats)
+	    if not self.stats_callback == 'None':
+		self.stats_callback(stats)
 	return Pt,Pu,Pa
 
-    def calc_pggave_conversion(self, bins, func=None, pfunc=None, new_angles = True, logPgg = 'None', Esteps = 50):
+    def iter_conversion(self, EGeV, nsim = None, new_angles = True, bank = 'None'):
+	"""
+	Generator for the conversion probabilities of random B-field realizations.
+	Realizations are only calculated when they are requested.
+
+	Parameters
+	----------
+	EGeV:	n-dim array, energies in GeV
+
+	kwargs
+	------
+	nsim:		int, number of realizations, if None, use self.nsim (or bank.nsim if a bank is given)
+	new_angles:	bool, if True, calculate new random angles for each realization. Default: True
+	bank:		PhotALPsConv.fieldbank.RandomFieldBank instance, if given, the B-field realizations 
+			are taken from the bank and new_angles is ignored
+
+	Yields
+	------
+	tuple with conversion probabilities in t,u, and a polarization of one realization
+	"""
+	if not bank == 'None':
+	    if nsim == None:
+		nsim = bank.nsim
+	    for i in range(nsim):
+		bank.apply(self, i)
+		yield self.calc_conversion(EGeV, new_angles = False)
+	    return
+	if nsim == None:
+	    nsim = self.nsim
+	for i in range(nsim):
+	    yield self.calc_conversion(EGeV, new_angles = new_angles)
+
+    def calc_conversion_derivs(self, EGeV, params = ['g','m','B','n']):
+	"""
+	Calculate conversion probabilities for energies EGeV for the current B-field realization 
+	and their derivatives with respect to the logarithm of the parameters. For B and n, the fields and densities 
+	of all domains of the ICM are scaled by a common factor. Only implemented for the ICM and the GMF.
+
+	Parameters
+	----------
+	EGeV:	n-dim array, energies in GeV
+
+	kwargs
+	------
+	params:	list with parameter names, any of g, m, B, and n, default: ['g','m','B','n']
+
+	Returns
+	-------
+	tuple with conversion probabilities in t,u, and a polarization and dictionary with 
+	(3 x n)-dim arrays with the derivatives of the probabilities in t,u, and a with respect to log(p) 
+	for each parameter p
+	"""
+	if np.isscalar(EGeV):
+	    EGeV = np.array([EGeV])
+	Pt,Pu,Pa,dP = self.pipeline.propagate_derivs(self, EGeV, params = params)
+	return Pt,Pu,Pa,dP
+
+    def calc_mean_conversion(self, EGeV):
+	"""
+	Calculate the mean conversion probabilities over all realizations of the random angles 
+	of the B field in the ICM, IGM, and BLR in one pass with angle averaged superoperators, 
+	i.e. the limit of the mean of calc_conversion for nsim -> infinity.
+	For a turbulent field in the ICM, only the angles are averaged, while the field strengths of the 
+	current realization are kept.
+
+	Parameters
+	----------
+	EGeV:	n-dim array, energies in GeV
+
+	Returns
+	-------
+	tuple with mean conversion probabilities in t,u, and a polarization
+	"""
+	if np.isscalar(EGeV):
+	    EGeV = np.array([EGeV])
+	return self.pipeline.propagate_mean(self, EGeV)
+
+    def calc_pgg_adaptive(self, Emin, Emax, tol = 1e-2, new_angles = True, **kwargs):
+	"""
+	Calculate the photon survival probability on an adaptive energy grid, 
+	which is refined where log(Pgg) is not described by a linear interpolation in log(E) within tol, 
+	e.g. around the critical energy. The energies of each refinement step are calculated in one call of calc_conversion,
+	all with the same B-field realization.
+
+	Parameters
+	----------
+	Emin:	float, minimum energy in GeV
+	Emax:	float, maximum energy in GeV
+
+	kwargs
+	------
+	tol:		float, tolerance on log(Pgg), default: 1e-2
+	new_angles:	bool, if True, calculate new random angles before the first step. Default: True
+	n0:		int, number of equally spaced initial energies in log(E), default: 9
+	maxiter:	int, maximum number of refinements, default: 12
+	maxpoints:	int, maximum number of energies, default: 1000
+
+	Returns
+	-------
+	tuple with m-dim array of energies in GeV, m-dim array of log(Pgg), 
+	and interp1d function for log(Pgg) versus log(energy)
+	"""
+	angles = [new_angles]
+
+	def logPgg(logE):
+	    Pt,Pu,Pa = self.calc_conversion(np.exp(logE), new_angles = angles[0])
+	    angles[0] = False
+	    return np.log(Pt + Pu)
+
+	logE,logP,pgg = adaptive_sampling(logPgg, np.log(Emin), np.log(Emax), tol = tol, **kwargs)
+	return np.exp(logE),logP,pgg
+
+    def calc_pggave_conversion(self, bins, func=None, pfunc=None, new_angles = True, logPgg = 'None', Esteps = 50, tol = 'None',
+				mode = 'interp', nsub = 1, nx = 32, dlogE_BLR = 0.1, tol_eigen = 1e-3, nsub_max = 64):
 	"""
 	Calculate average photon transfer matrix from an interpolation
 
@@ -333,20 +483,85 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	func:	function used for averaging, has to be called with func(pfunc,E)
 	pfunc:	parameters for function
 	logPgg: Function for photon survival log(probability) versus log(energy). If not given it will be calculated.
+	tol:	float, if given, log(Pgg) is calculated on an adaptive energy grid with calc_pgg_adaptive 
+		with this tolerance instead of Esteps equally spaced energies, and the energies of the adaptive grid 
+		within each bin are added to the integration points of the bin, default: 'None'
+	mode:	string, either 'interp' or 'eigen'. For 'interp', the interpolated photon survival probability
+		is integrated over each bin. For 'eigen', each bin is divided into nsub sub-bins, the eigenvalues 
+		and matrices T1, T2, T3 of all domains are calculated at the center and the boundaries of each sub-bin only,
+		and the oscillating phases are integrated over nx points in each sub-bin, see PhotALPsConv.binaverage. 
+		Esteps, tol, and logPgg are not used in this mode. Default: 'interp'
+	nsub:	int, initial number of sub-bins per bin for mode = 'eigen', default: 1. 
+		The interpolation assumes that the eigenvalues and matrices T1, T2, T3 are quadratic in log(E)
+		within a sub-bin, which does not hold close to the critical energy, for large differences 
+		of the eigenvalues, and close to the absorption lines of the BLR. Sub-bins are therefore halved 
+		until the average photon survival probability of a sub-bin and the average of its two halves differ 
+		by less than tol_eigen. If the BLR is in the scenario, nsub is increased such that the sub-bins 
+		are not wider than dlogE_BLR, so that narrow features are not missed.
+	nx:	int, number of integration points per sub-bin for mode = 'eigen', default: 32
+	dlogE_BLR:	float, maximum width of the sub-bins in ln(E) for mode = 'eigen' if the BLR is in the scenario, default: 0.1
+	tol_eigen:	float, tolerance on the average photon survival probability of a sub-bin for mode = 'eigen', 
+			if 'None', the sub-bins are not refined, default: 1e-3
+	nsub_max:	int, maximum number of sub-bins per bin for mode = 'eigen', default: 64
 
 	Returns
 	-------
 	n+1-dim array with average photon survival probability for each bin
 	"""
+	from scipy.integrate import simps
+	from scipy.interpolate import interp1d
+
 	if not func == None:
 	    self.funcAve = func
 	if not pfunc == None:
 	    self.pobs = pfunc
 
+	if mode == 'eigen':
+	    if new_angles:
+		self.pipeline.new_random(self)
+	    logEb	= np.log(bins)
+	    if 'BLR' in self.pipeline:
+		nsub	= max(nsub, int(np.ceil(np.max(np.diff(logEb)) / dlogE_BLR)))
+	    ibin	= np.repeat(np.arange(len(bins) - 1), nsub)				# bin of each sub-bin
+	    dlogE	= np.repeat(np.diff(logEb) / nsub, nsub)				# width of the sub-bins
+	    logE	= logEb[ibin] + (np.tile(np.arange(nsub),len(bins) - 1) + 0.5) * dlogE	# centers of the sub-bins
+
+	    def average(logE, dlogE):
+		"""average photon survival probability and integrated weight of each sub-bin"""
+		Ex,Pt,Pu,Pa	= self.pipeline.propagate_bins(self, np.exp(logE), dlogE, nx = nx)
+		w		= self.funcAve(self.pobs,Ex) * Ex				# integration in log(E)
+		return np.sum(w * (Pt + Pu), axis = 1) / np.sum(w, axis = 1), np.mean(w, axis = 1) * dlogE
+
+	    # --- sub-bins are halved until the average changes by less than tol_eigen, 
+	    # --- the averages of the halves are used for the converged sub-bins
+	    P,W		= average(logE, dlogE)
+	    if tol_eigen == 'None':
+		return np.bincount(ibin, weights = P * W) / np.bincount(ibin, weights = W)
+
+	    PW		= np.zeros(len(bins) - 1)
+	    Wsum	= np.zeros(len(bins) - 1)
+	    while len(logE):
+		n	= logE.shape[0]
+		ibin	= np.concatenate((ibin,ibin))
+		logE	= np.concatenate((logE - dlogE / 4.,logE + dlogE / 4.))
+		dlogE	= np.concatenate((dlogE,dlogE)) / 2.
+		Ph,Wh	= average(logE, dlogE)
+		conv	= (np.abs((Ph[:n] * Wh[:n] + Ph[n:] * Wh[n:]) / (Wh[:n] + Wh[n:]) - P) < tol_eigen) | \
+			    (dlogE[:n] < np.diff(logEb)[ibin[:n]] / nsub_max * (1. + 1e-10))
+		conv	= np.concatenate((conv,conv))
+		PW	+= np.bincount(ibin[conv], weights = (Ph * Wh)[conv], minlength = len(bins) - 1)
+		Wsum	+= np.bincount(ibin[conv], weights = Wh[conv], minlength = len(bins) - 1)
+		ibin,logE,dlogE,P,W = ibin[~conv],logE[~conv],dlogE[~conv],Ph[~conv],Wh[~conv]
+	    return PW / Wsum
+	elif not mode == 'interp':
+	    raise ValueError("Unknown mode {0}! Use interp or eigen.".format(mode))
+
 	logEGeV = np.linspace(np.log(bins[0] * 0.9), np.log(bins[-1] * 1.1), Esteps)
 
 	# --- calculate the photon survival probability
-	if logPgg == 'None':
+	if logPgg == 'None' and not tol == 'None':
+	    Ead,logPad,self.pgg	= self.calc_pgg_adaptive(np.exp(logEGeV[0]),np.exp(logEGeV[-1]), tol = tol, new_angles = new_angles)
+	elif logPgg == 'None':
 	    Pt,Pu,Pa = self.calc_conversion(np.exp(logEGeV), new_angles = new_angles)
 
 	# --- calculate the average with interpolation
@@ -355,6 +570,17 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	    self.pgg	= logPgg
 
 	# --- calculate average correction for each bin
+	# with an adaptive grid, the number of integration points differs between the bins
+	if logPgg == 'None' and not tol == 'None':
+	    logEad	= np.log(Ead)
+	    PggAve	= np.zeros(len(bins) - 1)
+	    for i in range(len(bins) - 1):
+		logE	= np.linspace(np.log(bins[i]),np.log(bins[i+1]),Esteps / 3)
+		logE	= np.union1d(logE, logEad[(logEad > logE[0]) & (logEad < logE[-1])])
+		w	= self.funcAve(self.pobs,np.exp(logE)) * np.exp(logE)
+		PggAve[i] = simps(w * np.exp(self.pgg(logE)), logE) / simps(w, logE)
+	    return PggAve
+
 	for i,E in enumerate(bins):
 	    if not i:
 		logE_array	= np.linspace(np.log(E),np.log(bins[i+1]),Esteps / 3)
@@ -369,6 +595,52 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	return	simps(self.funcAve(self.pobs,np.exp(logE_array)) * pgg_array * np.exp(logE_array), logE_array, axis = 1) / \
 		simps(self.funcAve(self.pobs,np.exp(logE_array)) * np.exp(logE_array), logE_array, axis = 1)
 
+    def calc_pggave_gradient(self, bins, func=None, pfunc=None, params = ['g','m','B','n'], Esteps = 50):
+	"""
+	Calculate the average photon survival probability in each bin for the current B-field realization
+	from an interpolation, as calc_pggave_conversion with new_angles = False, 
+	together with its derivatives with respect to the logarithm of the parameters, see calc_conversion_derivs
+
+	Parameters
+	----------
+	bins:	n+1 -dim array with bin boundaries in GeV
+
+	kwargs
+	------
+	Esteps: int, number of energies to interpolate photon survival probability, default: 50
+	func:	function used for averaging, has to be called with func(pfunc,E)
+	pfunc:	parameters for function
+	params:	list with parameter names, any of g, m, B, and n, default: ['g','m','B','n']
+
+	Returns
+	-------
+	tuple with n-dim array with average photon survival probability for each bin and 
+	dictionary with n-dim arrays with its derivatives with respect to log(p) for each parameter p
+	"""
+	from scipy.integrate import simps
+	from scipy.interpolate import interp1d
+
+	if not func == None:
+	    self.funcAve = func
+	if not pfunc == None:
+	    self.pobs = pfunc
+
+	logEGeV		= np.linspace(np.log(bins[0] * 0.9), np.log(bins[-1] * 1.1), Esteps)
+	Pt,Pu,Pa,dP	= self.calc_conversion_derivs(np.exp(logEGeV), params = params)
+	self.pgg	= interp1d(logEGeV,np.log(Pt + Pu))
+
+	logE_array	= np.array([np.linspace(np.log(bins[i]),np.log(bins[i+1]),Esteps / 3) for i in range(len(bins) - 1)])
+	pgg_array	= np.exp(self.pgg(logE_array))
+	w		= self.funcAve(self.pobs,np.exp(logE_array)) * np.exp(logE_array)
+	norm		= simps(w, logE_array, axis = 1)
+
+	# log(Pgg) is interpolated linearly, so its derivative is the interpolation of the derivatives
+	dPggAve = {}
+	for p in params:
+	    dlogPgg	= interp1d(logEGeV,(dP[p][0] + dP[p][1]) / (Pt + Pu))(logE_array)
+	    dPggAve[p]	= simps(w * pgg_array * dlogPgg, logE_array, axis = 1) / norm
+	return simps(w * pgg_array, logE_array, axis = 1) / norm, dPggAve
+
 # --- Convenience function to plot a spectrum together with it's absorption corrected versions ----- #
     def plot_spectrum(self, x,y,s, logPgg = 'None', xerr = 'None',filename = 'spectrum.pdf',Emin = 0., Emax = 0.):
 	"""
@@ -389,6 +661,8 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	"""
 
 	import matplotlib.pyplot as plt
+	from eblstud.misc.bin_energies import calc_bin_bounds
+	from eblstud.tools.iminuit_fit import MinuitFitPL,pl,butterfly_pl
 
 	assert x.shape[0] == y.shape[0]
 	assert x.shape[0] == s.shape[0]
@@ -509,6 +783,7 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	"""
 
 	import matplotlib.pyplot as plt
+	from eblstud.misc.bin_energies import calc_bin_bounds
 
 	# calculate the bin bounds
 	if xerr == 'None':
@@ -586,6 +861,8 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	-------
 	Average critical energy is float
 	"""
+	from scipy.integrate import simps
+
 	Bave = simps(self.B * self.r, np.log(self.r)) / (self.r[-1] - self.r[0])
 	nave = simps(self.n * self.r, np.log(self.r)) / (self.r[-1] - self.r[0])
 
@@ -616,10 +893,9 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 	ax = plt.subplot(111)
 	ax2 = fig.add_axes([0.2, 0.2, 0.4, 0.4])	# left bottom width height
 
-	try:
-	    self.scenario.index('ICM')
+	if 'ICM' in self.pipeline:
 	    Ecrit = self.EcritAve()
-	except ValueError:
+	else:
 	    Ecrit = Ecrit_GeV(self.m,self.kwargs['n'],self.kwargs['B'],self.g)
 
 	imin = np.argmin(np.abs(EGeV - Ecrit))
@@ -669,3 +945,22 @@ class Calc_Conv(IGM.PhotALPs,JET.PhotALPs_Jet,GMF.PhotALPs_GMF,BLR.PhotALPs_BLR)
 
 
 	return ax,ax2
+
+def restore_snapshot(snapshot = 'None', filename = 'None'):
+    """
+    Restore a Calc_Conv instance (or an instance of a derived class) from a snapshot
+
+    kwargs
+    ------
+    snapshot:	string, as returned by Calc_Conv.snapshot
+    filename:	string, file written by Calc_Conv.snapshot, used if snapshot is not given
+
+    Returns
+    -------
+    restored instance
+    """
+    if snapshot == 'None':
+	f = open(filename,'rb')
+	snapshot = f.read()
+	f.close()
+    return pickle.loads(snapshot)
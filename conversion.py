@@ -5,6 +5,11 @@ in intergalactic magnetic field
 History:
 - 11/15/11: created
 - 07/18/13: updated and cleaned up
+- 10/18/26: loaded EBL models are cached and shared between instances
+- 10/18/26: optional single precision transfer matrices
+- 10/18/26: transfer matrices are kept in preallocated work space buffers
+- 10/18/26: redshift dependent arrays and the optical depth of each domain are precomputed
+- 10/18/26: added EigenDomainN_IGM
 """
 __version__=0.03
 __author__="M. Meyer // manuel.meyer@physik.uni-hamburg.de"
@@ -18,6 +23,50 @@ from numpy.random import rand, seed
 import logging
 import warnings
 from deltas import *
+from PhotALPsConv.tools import complex_dtype
+from PhotALPsConv.workspace import get_workspace,set_Un,domain_product
+
+# process-wide cache of loaded EBL models, keys are tuples (ebl, filename)
+_ebl_cache = {}
+
+def load_ebl_model(ebl, filename = 'None'):
+    """
+    Return the optical depth class for an EBL model. 
+    Each model is read from file only once per process, subsequent calls
+    return the same (read-only) instance.
+
+    Parameters
+    ----------
+    ebl:	string, EBL model, e.g. 'gilmore'
+
+    kwargs
+    ------
+    filename:	string, path to EBL model file, if 'None', use default file of model
+
+    Returns
+    -------
+    eblstud.ebl.tau_from_model.OptDepth instance
+    """
+    key = (ebl, filename)
+    try:
+	return _ebl_cache[key]
+    except KeyError:
+	pass
+
+    tau = Tau.OptDepth()
+    if filename == 'None':
+	tau.readfile(model = ebl)
+    else:
+	tau.readfile(model = ebl, file_name = filename)
+    logging.debug("Loaded EBL model {0:s} from file {1:s}".format(ebl,filename))
+
+    _ebl_cache[key] = tau
+    return tau
+
+def clear_ebl_cache():
+    """Remove all loaded EBL models from the cache, e.g. after a model file has changed"""
+    _ebl_cache.clear()
+    return
 
 def Tau_Fit(z,E):
     """
@@ -78,6 +127,10 @@ class PhotALPs(object):
     T3		= Transfer matrix 3
     Un		= Total transfermatrix in n-th domain
     ebl_norm	= normalization of optical depth
+    Ln		= length of n-th domain in Mpc
+    Bn_IGM	= magnetic field in n-th domain in nG
+    neln_IGM	= electron density in n-th domain
+    difftau_IGM	= optical depth of n-th domain for the energies in EGeV_IGM, see set_energy_grid_IGM
 
     Notes
     -----
@@ -100,6 +153,9 @@ class PhotALPs(object):
 	m : ALP mass in neV, default is 1. (only for energy dependent calculation)
 	n0: electron density at z=0 in 10^7, default is 1. (only for energy dependent calculation)
 
+	precision:	string, precision of the complex transfer matrices, either 'double' (complex128) or 'single' (complex64),
+			the phases are always calculated in double precision, default: 'double'
+
 	Returns
 	-------
 	Nothing
@@ -114,6 +170,7 @@ class PhotALPs(object):
 	kwargs.setdefault('ebl','gilmore')
 	kwargs.setdefault('ebl_norm',1.)
 	kwargs.setdefault('filename','None')
+	kwargs.setdefault('precision','double')
 # --------------------
 	self.update_params_IGM(**kwargs) 
 
@@ -130,14 +187,11 @@ class PhotALPs(object):
 
 	self.__dict__.update(kwargs)
 
-	self.dz = 1.17e-3 * self.L0 / 5.
+	self.ctype	= complex_dtype(self.precision)	# dtype of transfer matrices
 
-	self.tau = Tau.OptDepth()
+	self.dz = 1.17e-3 * self.L0 / 5.
 
-	if self.filename == 'None':
-	    self.tau.readfile(model = self.ebl)
-	else:
-	    self.tau.readfile(model = self.ebl, file_name = self.filename)
+	self.tau = load_ebl_model(self.ebl, filename = self.filename)
 
 	self.E0 = 0.	# Energy in GeV
 
@@ -148,14 +202,69 @@ class PhotALPs(object):
 	self.EW2n_IGM	= 0.
 	self.EW3n_IGM	= 0.
 	self.Dn		= 0.
+
+	# --- redshift dependent quantities in all domains, they only change with z, L0, B0, and n0
+	ones		= np.ones(self.Nd_IGM)
+	n		= np.array(range(1,self.Nd_IGM+1))
+	self.zn_IGM	= (n-ones)*self.dz				# redshift at the beginning of each domain
+	self.Ezn_IGM	= ones + self.zn_IGM				# energy in all domains in units of E0
+	self.Bn_IGM	= self.B0*(ones + (n-ones)*self.dz)**2.		# B-field in all domains in nG
+	self.neln_IGM	= self.n0*(ones + (n-ones)*self.dz)**3.		# electron density in all domains in 1e-7 cm^-3
+	self.Ln		= 4.29e3*self.dz / (ones + 1.45*(n - ones)*self.dz)	# domain length in Mpc
+
+	# --- table of the optical depth of each domain, filled by set_energy_grid_IGM
+	self.EGeV_IGM		= np.array([])
+	self.difftau_IGM	= np.zeros((self.Nd_IGM,0))
+	self.Eindex_IGM		= {}
 								# random realizations
-	self.T1_IGM		= np.zeros((3,3,self.Nd_IGM),np.complex)
-	self.T2_IGM		= np.zeros((3,3,self.Nd_IGM),np.complex)
-	self.T3_IGM		= np.zeros((3,3,self.Nd_IGM),np.complex)
-	self.Un_IGM		= np.zeros((3,3,self.Nd_IGM),np.complex)
+	ws			= get_workspace(self)
+	self.T1_IGM		= ws.get('T1_IGM',(3,3,self.Nd_IGM),self.ctype, zero = True)
+	self.T2_IGM		= ws.get('T2_IGM',(3,3,self.Nd_IGM),self.ctype, zero = True)
+	self.T3_IGM		= ws.get('T3_IGM',(3,3,self.Nd_IGM),self.ctype, zero = True)
+	self.Un_IGM		= ws.get('Un_IGM',(3,3,self.Nd_IGM),self.ctype)
 
 	return 
 
+    def set_energy_grid_IGM(self, EGeV):
+	"""
+	Calculate the optical depth of all domains for all energies, 
+	the table is only recalculated if the energies have changed
+
+	Parameters
+	----------
+	EGeV:	n-dim array, energies in GeV
+
+	Returns
+	-------
+	(Nd_IGM x n)-dim array with the optical depth of each domain
+	"""
+	if np.array_equal(self.EGeV_IGM, EGeV):
+	    return self.difftau_IGM
+	n		= np.array(range(1,self.Nd_IGM+1))
+	self.EGeV_IGM	= np.array(EGeV, dtype = np.float)
+	self.difftau_IGM	= self.tau.opt_depth_array(n*self.dz , self.EGeV_IGM / 1e3) - \
+			    self.tau.opt_depth_array(self.zn_IGM , self.EGeV_IGM / 1e3)
+	self.difftau_IGM[self.difftau_IGM < 1e-20] = 1e-20	# set to 1e-20 if difference is smaller
+	self.Eindex_IGM	= dict([(E,i) for i,E in enumerate(self.EGeV_IGM)])
+	return self.difftau_IGM
+
+    def difftau_IGM_E0(self):
+	"""
+	Optical depth of all domains for the energy E0, taken from the table
+	if E0 is in the energy grid, otherwise it is calculated
+
+	Returns
+	-------
+	Nd_IGM-dim array
+	"""
+	try:
+	    return self.difftau_IGM[:,self.Eindex_IGM[self.E0]]
+	except KeyError:
+	    n		= np.array(range(1,self.Nd_IGM+1))
+	    difftau	= (self.tau.opt_depth_array(n*self.dz , self.E0 / 1e3) - self.tau.opt_depth_array(self.zn_IGM , self.E0 / 1e3)).transpose()[0]
+	    difftau[difftau < 1e-20] = 1e-20	# set to 1e-20 if difference is smaller
+	    return difftau
+
     def new_random_psi_IGM(self):
 	"""
 	Calculate new random psi values
@@ -260,38 +369,28 @@ class PhotALPs(object):
 	-------
 	Nothing
 	"""
-	self.Un_IGM = np.exp(1.j*self.EW1n_IGM* self.Ln) * self.T1_IGM \
-	    + np.exp(1.j*self.EW2n_IGM* self.Ln) * self.T2_IGM \
-	    + np.exp(1.j*self.EW3n_IGM* self.Ln) * self.T3_IGM 
+	set_Un(self.ws,'IGM',self.Un_IGM,[self.T1_IGM,self.T2_IGM,self.T3_IGM],[self.EW1n_IGM,self.EW2n_IGM,self.EW3n_IGM],self.Ln)
 	return
 
-    def SetDomainN_IGM(self):
+    def __SetEWn_IGM(self):
 	"""
-	Set domain length, energy, magnetic field, mean free path and delta in all domains 
-	and calculate total transfer matrix, with energy dependence included (strong mixing regime not required)
+	Set energy, magnetic field, mean free path, deltas, and eigenvalues in all domains
 
 	Parameters
 	----------
-	n:	Number of domain, 0 < n <= self.Nd_IGM
+	None (self only)
 
-	Returns:
-	--------
-	U:	3x3 complex numpy array with total transfer matrix 
+	Returns
+	-------
+	Nothing
 	"""
 
-	ones	= np.ones(self.Nd_IGM)
-	n	= np.array(range(1,self.Nd_IGM+1))
-	En	= self.E0*(ones + (n-ones)*self.dz)		# Energy in all domains in GeV
-	Bn	= self.B0*(ones + (n-ones)*self.dz)**2.		# B-field in all domains in nG
-	neln	= self.n0*(ones + (n-ones)*self.dz)**3.		# electron density in all domains in 1e-7 cm^-3
+	En	= self.E0*self.Ezn_IGM		# Energy in all domains in GeV
+	Bn	= self.Bn_IGM			# B-field in all domains in nG
+	neln	= self.neln_IGM		# electron density in all domains in 1e-7 cm^-3
 
 	# calculate mean free path according to De Angelis et al. (2011) Eq. 131
-	difftau	= (self.tau.opt_depth_array(n*self.dz , self.E0 / 1e3) - self.tau.opt_depth_array((n-ones)*self.dz , self.E0 / 1e3)).transpose()[0]
-	difftau[difftau < 1e-20] = np.ones(difftau.shape[0])[difftau < 1e-20] * 1e-20	# set to 1e-20 if difference is smaller
-
-	self.Ln	= 4.29e3*self.dz / (ones + 1.45*(n - ones)*self.dz)
-
-	mfn	= self.Ln / difftau / self.ebl_norm 	# mean free path
+	mfn	= self.Ln / self.difftau_IGM_E0() / self.ebl_norm 	# mean free path
 
 	delta_pl_n		= Delta_pl_Mpc(neln,En / 1e3)
 	delta_QED_n		= Delta_QED_Mpc(Bn,En / 1e3)
@@ -311,15 +410,48 @@ class PhotALPs(object):
 	self.EW1n_IGM = self.delta_perp_n + self.delta_abs_n
 	self.EW2n_IGM = 0.5 * (self.delta_aa_n + self.delta_par_n + self.delta_abs_n - self.Dn)
 	self.EW3n_IGM = 0.5 * (self.delta_aa_n + self.delta_par_n + self.delta_abs_n + self.Dn)
+	return
+
+    def SetDomainN_IGM(self):
+	"""
+	Set domain length, energy, magnetic field, mean free path and delta in all domains 
+	and calculate total transfer matrix, with energy dependence included (strong mixing regime not required)
+
+	Parameters
+	----------
+	n:	Number of domain, 0 < n <= self.Nd_IGM
+
+	Returns:
+	--------
+	U:	3x3 complex numpy array with total transfer matrix 
+	"""
+
+	self.__SetEWn_IGM()
 
 	self.__SetT1n_IGM()
 	self.__SetT2n_IGM()
 	self.__SetT3n_IGM()
 
 	self.__SetUn_IGM()
-	for i in range(self.Nd_IGM):
-	    if not i:
-		U = self.Un_IGM[:,:,i]
-	    else:
-		U = np.dot(self.Un_IGM[:,:,i],U)
-	return U
+	return domain_product(self.ws,'IGM',self.Un_IGM,left = True)
+
+    def EigenDomainN_IGM(self):
+	"""
+	Set eigenvalues and the matrices T1, T2, T3 in all domains without multiplying the transfer matrices,
+	e.g. to build the superoperators of all domains, see PhotALPsConv.superop
+
+	Parameters
+	----------
+	None (self only)
+
+	Returns
+	-------
+	tuple with list of the (3x3xNd) matrices [T1,T2,T3], list of the Nd-dim eigenvalues [EW1,EW2,EW3], 
+	and the domain lengths in Mpc. The matrices are work space buffers that are overwritten by the next call.
+	The product of the domains is taken from the left, i.e. the first domain is on the right.
+	"""
+	self.__SetEWn_IGM()
+	self.__SetT1n_IGM()
+	self.__SetT2n_IGM()
+	self.__SetT3n_IGM()
+	return [self.T1_IGM,self.T2_IGM,self.T3_IGM],[self.EW1n_IGM,self.EW2n_IGM,self.EW3n_IGM],self.Ln
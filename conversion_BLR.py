@@ -4,6 +4,11 @@ Class for the calculation of photon-ALPs conversion in the BLR
 
 History:
 - 04/24/15: created
+- 10/18/26: BLR optical depth is initialized when it is first needed
+- 10/18/26: optional single precision transfer matrices
+- 10/18/26: transfer matrices are kept in preallocated work space buffers
+- 10/18/26: optional closed form transfer matrix in the strong mixing regime
+- 10/18/26: added EigenDomainN_BLR
 """
 __version__=0.01
 __author__="M. Meyer // manuel.meyer@fysik.su.se"
@@ -12,11 +17,12 @@ __author__="M. Meyer // manuel.meyer@fysik.su.se"
 import numpy as np
 import logging
 import warnings
-from eblstud.blr.absorption import OptDepth_BLR
 from eblstud.misc.constants import *
 from math import ceil
 from numpy.random import rand, seed
 from deltas import *
+from PhotALPsConv.tools import complex_dtype
+from PhotALPsConv.workspace import get_workspace,set_Un,domain_product
 # --------------------------------------------------------#
 
 class PhotALPs_BLR(object):
@@ -71,6 +77,13 @@ class PhotALPs_BLR(object):
 			used to calculate absorption, 
 			default: [24.,24.,24.,24.,24.]
 	A:		bool, toggles absorption on or off, default: 1
+	precision:	string, precision of the complex transfer matrices, either 'double' (complex128) or 'single' (complex64),
+			the phases are always calculated in double precision, default: 'double'
+	strong_mixing:	boolean, if True, the energy independent transfer matrix of the strong mixing regime is used
+			for all energies at which the error bound deltas.strong_mixing_error is below strong_mixing_tol,
+			the absorption term counts towards the error, default: False
+	strong_mixing_tol:	float, tolerance for the strong mixing approximation, default: 1e-2
+
 	Returns
 	-------
 	Nothing.
@@ -86,6 +99,9 @@ class PhotALPs_BLR(object):
 	kwargs.setdefault('A',1)
 	kwargs.setdefault('Elines',np.array([13.6,10.2,8.0,24.6,21.2]))
 	kwargs.setdefault('Nlines',np.array([24.,24.,24.,24.,24.]))
+	kwargs.setdefault('precision','double')
+	kwargs.setdefault('strong_mixing',False)
+	kwargs.setdefault('strong_mixing_tol',1e-2)
 # --------------------
 	self.update_params_BLR(**kwargs)
 		
@@ -105,6 +121,8 @@ class PhotALPs_BLR(object):
 	"""
 	self.__dict__.update(kwargs)
 
+	self.ctype	= complex_dtype(self.precision)	# dtype of transfer matrices
+
 	# number of domains, no expansion assumed
 	self.Nd_BLR	= int(self.R_BLR / self.L_BLR)	
 	if self.Nd_BLR == 0:
@@ -115,13 +133,14 @@ class PhotALPs_BLR(object):
 	if new_Bn_BLR:
 	    self.new_B_n_BLR()
 
-	self.T1_BLR	= np.zeros((3,3,self.Nd_BLR),np.complex)	# Transfer matrices
-	self.T2_BLR	= np.zeros((3,3,self.Nd_BLR),np.complex)    
-	self.T3_BLR	= np.zeros((3,3,self.Nd_BLR),np.complex)
-	self.Un_BLR	= np.zeros((3,3,self.Nd_BLR),np.complex)
+	ws		= get_workspace(self)
+	self.T1_BLR	= ws.get('T1_BLR',(3,3,self.Nd_BLR),self.ctype, zero = True)	# Transfer matrices
+	self.T2_BLR	= ws.get('T2_BLR',(3,3,self.Nd_BLR),self.ctype, zero = True)
+	self.T3_BLR	= ws.get('T3_BLR',(3,3,self.Nd_BLR),self.ctype, zero = True)
+	self.Un_BLR	= ws.get('Un_BLR',(3,3,self.Nd_BLR),self.ctype)
 
-	# Optical depth class
-	self.tt = OptDepth_BLR(Elines = self.Elines, Nlines = self.Nlines, z = self.z)  
+	# Optical depth class, initialized in __setDeltas_BLR if absorption is switched on
+	self.tt = None
 
 	return
 
@@ -173,15 +192,19 @@ class PhotALPs_BLR(object):
 	self.R_BLR = self.R_BLR*1e-3 
 	self.L_BLR = self.L_BLR*1e-3
 
+	if self.A and self.tt == None:
+	    from eblstud.blr.absorption import OptDepth_BLR
+	    self.tt = OptDepth_BLR(Elines = self.Elines, Nlines = self.Nlines, z = self.z)  
+
 	# np.arrays , self.Nd-dim
 	self.Dperp_BLR	= Delta_pl_kpc(self.n_BLR,self.E) +\
 	    2.*Delta_QED_kpc(self.B_BLR,self.E) +\
-	    bool(self.A)*(self.tt(self.E).sum(axis = 0) / (2. * self.R_BLR)) * 1.j	
+	    (bool(self.A) and self.tt(self.E).sum(axis = 0) / (2. * self.R_BLR)) * 1.j	
 
 	# np.arrays , self.Nd-dim
 	self.Dpar_BLR	= Delta_pl_kpc(self.n_BLR,self.E) + \
 	    3.5*Delta_QED_kpc(self.B_BLR,self.E) +\
-	    bool(self.A)*(self.tt(self.E).sum(axis = 0)/ (2. * self.R_BLR)) * 1.j 	
+	    (bool(self.A) and self.tt(self.E).sum(axis = 0)/ (2. * self.R_BLR)) * 1.j 	
 
 	# np.array, self.Nd-dim
 	self.Dag_BLR	= Delta_ag_kpc(self.g,self.B_BLR)				
@@ -217,6 +240,29 @@ class PhotALPs_BLR(object):
 	self.EW2_BLR = 0.5 * (self.Dpar_BLR + self.Da_BLR - self.Dosc_BLR)
 	self.EW3_BLR = 0.5 * (self.Dpar_BLR + self.Da_BLR + self.Dosc_BLR)
 	return
+
+    def __setEW_strong_BLR(self):
+	"""
+	Set Eigenvalues in the strong mixing limit, Dperp = Dpar = Da = 0,
+	i.e. the eigenvalues are 0, -Dag, and Dag
+	
+	Parameters
+	----------
+	None (self only)
+
+	Returns
+	-------
+	Nothing
+	"""
+	self.Dag_BLR	= Delta_ag_kpc(self.g,self.B_BLR * 1e6)
+	self.Dperp_BLR	= 0. * self.Dag_BLR
+	self.Dpar_BLR	= 0. * self.Dag_BLR
+	self.Da_BLR	= 0. * self.Dag_BLR
+	self.Dosc_BLR	= 2. * np.abs(self.Dag_BLR)
+	self.EW1_BLR	= self.Dperp_BLR
+	self.EW2_BLR	= -0.5 * self.Dosc_BLR
+	self.EW3_BLR	= 0.5 * self.Dosc_BLR
+	return
 	
 
     def __setT1n_BLR(self): 
@@ -317,9 +363,7 @@ class PhotALPs_BLR(object):
 	"""
 	self.L_BLR = self.L_BLR*1e-3 # Changing units to kpc 
 
-	self.Un_BLR = np.exp(1.j * self.EW1_BLR * self.L_BLR) * self.T1_BLR + \
-	np.exp(1.j * self.EW2_BLR * self.L_BLR) * self.T2_BLR + \
-	np.exp(1.j * self.EW3_BLR * self.L_BLR) * self.T3_BLR
+	set_Un(self.ws,'BLR',self.Un_BLR,[self.T1_BLR,self.T2_BLR,self.T3_BLR],[self.EW1_BLR,self.EW2_BLR,self.EW3_BLR],self.L_BLR)
  
 	self.L_BLR = self.L_BLR*1e3 # Changing back to pc
 
@@ -342,14 +386,66 @@ class PhotALPs_BLR(object):
 	    self.Nd_BLR,self.Psin_BLR.shape[0])
 	    )
 	self.__setEW_BLR()
+	if self.strong_mixing and np.all(self.Dag_BLR) and \
+	    strong_mixing_error(self.Dperp_BLR,self.Dpar_BLR,self.Da_BLR,self.L_BLR * 1e-3) < self.strong_mixing_tol:
+	    return self.SetDomainN_strong_BLR()
 	self.__setT1n_BLR()
 	self.__setT2n_BLR()
 	self.__setT3n_BLR()
 	self.__setUn_BLR()	# self.Un contains now all 3x3 matrices in all self.Nd domains
-	# do the matrix multiplication
-	for i in range(self.Un_BLR.shape[2]): 
-	    if not i:                     
-		U = self.Un_BLR[:,:,i]        
-	    else:                         
-		U = np.dot(U,self.Un_BLR[:,:,i])	# first matrix on the left
-	return U
+	# do the matrix multiplication, first matrix on the left
+	return domain_product(self.ws,'BLR',self.Un_BLR)
+
+    def EigenDomainN_BLR(self):
+	"""
+	Set eigenvalues and the matrices T1, T2, T3 in all domains without multiplying the transfer matrices,
+	e.g. to build the superoperators of all domains, see PhotALPsConv.superop
+
+	Parameters
+	----------
+	None (self only)
+
+	Returns
+	-------
+	tuple with list of the (3x3xNd) matrices [T1,T2,T3], list of the Nd-dim eigenvalues [EW1,EW2,EW3], 
+	and the domain length in kpc. The matrices are work space buffers that are overwritten by the next call.
+	"""
+	if not self.Nd_BLR == self.Psin_BLR.shape[0]:
+	    raise TypeError("Number of domains (={0:n}) is not equal to number of angles (={1:n})!".format(
+	    self.Nd_BLR,self.Psin_BLR.shape[0])
+	    )
+	self.__setEW_BLR()
+	self.__setT1n_BLR()
+	self.__setT2n_BLR()
+	self.__setT3n_BLR()
+	return [self.T1_BLR,self.T2_BLR,self.T3_BLR],[self.EW1_BLR,self.EW2_BLR,self.EW3_BLR],self.L_BLR * 1e-3
+
+    def SetDomainN_strong_BLR(self):
+	"""
+	Set Transfer matrix in all domains in the strong mixing limit and multiply it.
+	The result does not depend on energy, so it is kept until the B field, the angles, 
+	the coupling, or the domain length change.
+
+	Parameters
+	----------
+	None (self only)
+
+	Returns
+	-------
+	Transfer matrix as 3x3 complex numpy array
+	"""
+	key = [self.g, self.L_BLR, self.B_BLR, self.Psin_BLR]
+	try:
+	    if self.U_strong_BLR.dtype == self.ctype and \
+		np.all([np.array_equal(k,l) for k,l in zip(key,self.U_strong_key_BLR)]):
+		return self.U_strong_BLR.copy()
+	except AttributeError:
+	    pass
+	self.__setEW_strong_BLR()
+	self.__setT1n_BLR()
+	self.__setT2n_BLR()
+	self.__setT3n_BLR()
+	self.__setUn_BLR()
+	self.U_strong_BLR	= domain_product(self.ws,'BLR',self.Un_BLR)
+	self.U_strong_key_BLR	= [np.copy(k) for k in key]
+	return self.U_strong_BLR.copy()
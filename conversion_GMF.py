@@ -4,6 +4,14 @@ Class for the calculation of photon-ALPs conversion in the galactic magnetic fie
 History:
 - 06/01/12: created
 - 11/06/13: added the Pshirkov model
+- 10/18/26: set_coordinates is a method, so that instances can be pickled
+- 10/18/26: gmf, kapteyn and NE2001 modules and the GMF model are loaded when they are first needed
+- 10/18/26: transfer matrices use the precision set in PhotALPs_ICM
+- 10/18/26: transfer matrices are kept in preallocated work space buffers
+- 10/18/26: transfer matrix of the GMF is calculated in SetDomainN_GMF
+- 10/18/26: added EigenDomainN_GMF
+- 10/18/26: B field, angles, and density along the line of sight are cached process-wide
+- 10/18/26: added DerivDomainN_GMF
 """
 __version__=0.02
 __author__="M. Meyer // manuel.meyer@fysik.su.se"
@@ -11,19 +19,24 @@ __author__="M. Meyer // manuel.meyer@fysik.su.se"
 
 import numpy as np
 from math import ceil
-import eblstud.ebl.tau_from_model as Tau
 from eblstud.misc.constants import *
 from PhotALPsConv.conversion_ICM import PhotALPs_ICM
 import logging
 import warnings
 import pickle
 import subprocess,os,glob
+import copy
 # --- Conversion in the galactic magnetic field ---------------------------------------------------------------------#
-from gmf import gmf
-from gmf.trafo import *
-from kapteyn import wcs
-from scipy.integrate import simps
-from gmf.ne2001 import density_2001_los as dl
+# gmf, kapteyn, and NE2001 modules are imported in the methods that use them
+
+# process-wide cache of the B field, angles, and density along the lines of sight, 
+# keys are tuples with the coordinates of the source and the parameters of the GMF model, see PhotALPs_GMF.los_key
+_los_cache = {}
+
+def clear_los_cache():
+    """Remove all lines of sight from the cache, e.g. after the parameters of a GMF model instance have been changed"""
+    _los_cache.clear()
+    return
 
 class PhotALPs_GMF(PhotALPs_ICM):
     """
@@ -33,7 +46,7 @@ class PhotALPs_GMF(PhotALPs_ICM):
     ----------
     l: galactic longitude of source
     b: galactic latitude of source
-    B: B GMF field instance (B-field in muG)
+    Bgmf: GMF field instance (B-field in muG), None until init_gmf_model is called
     g: ALP-photon coupling in 10^-11 GeV^-1
     m: ALP mass in 10^-9 eV
     n: electron density in 10^-3 cm^-3
@@ -109,8 +122,6 @@ class PhotALPs_GMF(PhotALPs_ICM):
 	#super(PhotALPs_GMF,self).__init__(g = self.g, m = self.m, n = self.n, Lcoh = self.Lcoh)	#Inherit everything from PhotALPs_ICM
 	super(PhotALPs_GMF,self).__init__(**kwargs)	#Inherit everything from PhotALPs_ICM
 
-	self.set_coordinates = lambda r,d: self.__set_coordinates(r,d)	# helper function
-
 	return
 
     def update_params_GMF(self, **kwargs):
@@ -127,14 +138,33 @@ class PhotALPs_GMF(PhotALPs_ICM):
 	self.b		= 0.
 	self.smax	= 0.
 	self.E		= 0.	# Energy in GeV
-
-	if self.model == 'jansson':
-	    self.Bgmf = gmf.GMF()	# Initialize the Bfield class
-	elif self.model == 'pshirkov':
-	    self.Bgmf = gmf.GMF_Pshirkov(mode = self.model_sym)	
+	self.Bgmf	= None	# GMF model, initialized in init_gmf_model
 
 	return
 
+    def init_gmf_model(self):
+	"""
+	Initialize the GMF model if this has not been done yet
+
+	Returns
+	-------
+	GMF field instance
+	"""
+	if self.Bgmf == None:
+	    from gmf import gmf
+	    if self.model == 'jansson':
+		self.Bgmf = gmf.GMF()	# Initialize the Bfield class
+	    elif self.model == 'pshirkov':
+		self.Bgmf = gmf.GMF_Pshirkov(mode = self.model_sym)	
+	return self.Bgmf
+
+    def set_coordinates(self, ra, dec):
+	"""
+	set the coordinates l,b and the the maximum distance smax where |GMF| > 0,
+	see __set_coordinates
+	"""
+	return self.__set_coordinates(ra,dec)
+
     def __set_coordinates(self, ra, dec):
 	"""
 	set the coordinates l,b and the the maximum distance smax where |GMF| > 0
@@ -156,6 +186,8 @@ class PhotALPs_GMF(PhotALPs_ICM):
 	    maximum distance in kpc from sun considered here where |GMF| > 0
 	"""
 
+	from kapteyn import wcs
+
 	# Transformation RA, DEC -> L,B
 	tran = wcs.Transformation("EQ,fk5,J2000.0", "GAL")
 	self.l,self.b = tran.transform((ra,dec)) # return galactic coordinates in degrees
@@ -189,6 +221,9 @@ class PhotALPs_GMF(PhotALPs_ICM):
 	    (3,N)-dim np.parray containing GMF for all domains in galactocentric cylindrical coordinates (rho, phi, z) 
 	    N-dim np.array, field strength for all domains
 	"""
+	from gmf.trafo import rho_HC2GC,phi_HC2GC,z_HC2GC
+	self.init_gmf_model()
+
 	if np.isscalar(l):
 	    if not l:
 		l = self.l
@@ -214,27 +249,69 @@ class PhotALPs_GMF(PhotALPs_ICM):
 
 	return B,Babs
 
-    def Pag_TM(self, E, ra, dec, pol, pol_final = None):
+    def los_key(self, ra, dec):
 	"""
-	Compute the conversion probability using the Transfer matrix formalism
+	Key of the line of sight to the source in the cache, 
+	it contains all parameters that the B field, angles, and density along the line of sight depend on
 
 	Parameters
 	----------
-	E:		 	 float, Energy in GeV
-	ra, dec:  		 float, float, coordinates of the source in degrees
-	pol:			 np.array((3,3)): 3x3 matrix of the initial polarization
-	pol_final (optional):	 np.array((3,3)): 3x3 matrix of the final polarization
-				 if none, results for final polarization 
-				 in t,u and ALPs direction are returned
+	ra, dec:	 float, float, coordinates of the source in degrees
 
 	Returns
 	-------
-	Pag: float, photon ALPs conversion probability
+	tuple
 	"""
+	return (ra, dec, self.model, self.model_sym, getattr(self,'GMF_FitVal',0), self.int_steps, self.galactic, 
+		self.rho_max, self.zmax, self.d, self.NE2001, self.NE2001file, self.nGMF)
 
-	self.__set_coordinates(ra,dec)
+    def __setDomains_GMF(self, E, ra, dec):
+	"""
+	Set B field, angles, and density in all domains along the line of sight to the source.
+	They do not depend on the energy and the ALP parameters and are taken from the process-wide 
+	cache if the line of sight has already been calculated.
+
+	Parameters
+	----------
+	E:		 float, Energy in GeV
+	ra, dec:	 float, float, coordinates of the source in degrees
+
+	Returns
+	-------
+	Nothing
+	"""
+	key = self.los_key(ra,dec)
+	try:
+	    los = _los_cache[key]
+	except KeyError:
+	    los = self.__calcLOS_GMF(ra,dec)
+	    _los_cache[key] = los
+	self.__dict__.update(dict([(k,copy.copy(v)) for k,v in los.items()]))
 	self.E	= E
 
+	self.T1		= self.ws.get('T1_GMF',(3,3,self.Nd),self.ctype, zero = True)
+	self.T2		= self.ws.get('T2_GMF',(3,3,self.Nd),self.ctype, zero = True)
+	self.T3		= self.ws.get('T3_GMF',(3,3,self.Nd),self.ctype, zero = True)
+	self.Un		= self.ws.get('Un_GMF',(3,3,self.Nd),self.ctype)
+	return
+
+    def __calcLOS_GMF(self, ra, dec):
+	"""
+	Calculate B field, angles, and density in all domains along the line of sight to the source
+
+	Parameters
+	----------
+	ra, dec:	 float, float, coordinates of the source in degrees
+
+	Returns
+	-------
+	dictionary with the coordinates l, b, smax, the domain length Lcoh, the distances s, the number of domains Nd, 
+	and the transversal B field B, the angles Psin, and the density n in all domains
+	"""
+	from gmf.trafo import GC2HCproj
+
+	self.__set_coordinates(ra,dec)
+
 	sa	= np.linspace(self.smax,0., self.int_steps,endpoint = False)	# divide distance into smax / Lcoh large cells
 	self.Lcoh = self.smax / 100.
 	#else:
@@ -260,11 +337,6 @@ class PhotALPs_GMF(PhotALPs_ICM):
 	self.Psin[m]	= np.arctan2(Bt[m],Bu[m])	# arctan2 selects the right quadrant
 	# Debug:
 	#self.Psin[m]	= np.ones((self.Psin[m]).shape[0]) * np.pi / 4.
-
-	self.T1		= np.zeros((3,3,self.Nd),np.complex)
-	self.T2		= np.zeros((3,3,self.Nd),np.complex)
-	self.T3		= np.zeros((3,3,self.Nd),np.complex)
-	self.Un		= np.zeros((3,3,self.Nd),np.complex)
 	# ----------------------------------------------------------------- #
 
 	# --- Calculate density in all domains: ----------------------------#
@@ -277,6 +349,7 @@ class PhotALPs_GMF(PhotALPs_ICM):
 		self.n = pickle.load(f) *1e3	# convert into 1e-3 cm^-3
 		f.close()
 	    except IOError:			# if not already calculated, do it now and save to file with function dl
+		from gmf.ne2001 import density_2001_los as dl
 		self.n = dl(sa,self.l,self.b,self.NE2001file,d=self.d) * 1e3		# convert into 1e-3 cm^-3
 	else:
 	    self.n = self.nGMF * np.ones(self.Nd)
@@ -287,8 +360,78 @@ class PhotALPs_GMF(PhotALPs_ICM):
 #	for i,Bi in enumerate(self.B):
 #	    logging.debug("B,Bt,Bu,Psi: {0:20.2f},{1:20.2f},{2:20.2f},{3:20.2f}".format(Bi,Bt[i],Bu[i],self.Psin[i]))
 
+	return dict([(k,copy.copy(getattr(self,k))) for k in ['l','b','smax','Lcoh','s','Nd','B','Psin','n']])
+
+    def SetDomainN_GMF(self, E, ra, dec):
+	"""
+	Transfer matrix of the GMF along the line of sight to the source
+
+	Parameters
+	----------
+	E:		 float, Energy in GeV
+	ra, dec:	 float, float, coordinates of the source in degrees
+
+	Returns
+	-------
+	U:	3x3 complex numpy array, product of the transfer matrices of all domains
+	"""
+	self.__setDomains_GMF(E, ra, dec)
+	return super(PhotALPs_GMF,self).SetDomainN()		# calculate product of all transfer matrices
+
+    def EigenDomainN_GMF(self, E, ra, dec):
+	"""
+	Eigenvalues and the matrices T1, T2, T3 of the GMF in all domains along the line of sight to the source, 
+	see PhotALPs_ICM.EigenDomainN
 
-	U = super(PhotALPs_GMF,self).SetDomainN()		# calculate product of all transfer matrices
+	Parameters
+	----------
+	E:		 float, Energy in GeV
+	ra, dec:	 float, float, coordinates of the source in degrees
+
+	Returns
+	-------
+	tuple with list of the (3x3xNd) matrices [T1,T2,T3], list of the Nd-dim eigenvalues [EW1,EW2,EW3], 
+	and the domain length in kpc
+	"""
+	self.__setDomains_GMF(E, ra, dec)
+	return super(PhotALPs_GMF,self).EigenDomainN()
+
+    def DerivDomainN_GMF(self, E, ra, dec):
+	"""
+	Transfer matrices of the GMF in all domains along the line of sight to the source and their derivatives 
+	with respect to log(g) and log(m), see PhotALPs_ICM.DerivDomainN
+
+	Parameters
+	----------
+	E:		 float, Energy in GeV
+	ra, dec:	 float, float, coordinates of the source in degrees
+
+	Returns
+	-------
+	tuple with the (3x3xNd) transfer matrices and dictionary with their (3x3xNd) derivatives, keys are g, m
+	"""
+	self.__setDomains_GMF(E, ra, dec)
+	Un,dUn = super(PhotALPs_GMF,self).DerivDomainN()
+	return Un,{'g': dUn['g'], 'm': dUn['m']}
+
+    def Pag_TM(self, E, ra, dec, pol, pol_final = None):
+	"""
+	Compute the conversion probability using the Transfer matrix formalism
+
+	Parameters
+	----------
+	E:		 	 float, Energy in GeV
+	ra, dec:  		 float, float, coordinates of the source in degrees
+	pol:			 np.array((3,3)): 3x3 matrix of the initial polarization
+	pol_final (optional):	 np.array((3,3)): 3x3 matrix of the final polarization
+				 if none, results for final polarization 
+				 in t,u and ALPs direction are returned
+
+	Returns
+	-------
+	Pag: float, photon ALPs conversion probability
+	"""
+	U = self.SetDomainN_GMF(E, ra, dec)
 
 	if pol_final == None:
 	    pol_t = np.zeros((3,3),np.complex)
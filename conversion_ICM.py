@@ -4,6 +4,13 @@ Class for the calculation of photon-ALPs conversion in galaxy clusters
 History:
 - 06/01/12: created
 - 07/18/13: cleaned up
+- 10/18/26: optional single precision transfer matrices
+- 10/18/26: transfer matrices are kept in preallocated work space buffers
+- 10/18/26: turbulent field can be drawn from a given random generator
+- 10/18/26: optional closed form transfer matrix in the strong mixing regime
+- 10/18/26: added EigenDomainN
+- 10/18/26: added DerivDomainN for the derivatives of the transfer matrix
+- 10/18/26: turbulent field can be calculated from given random numbers
 """
 __version__=0.02
 __author__="M. Meyer // manuel.meyer@physik.uni-hamburg.de"
@@ -11,7 +18,6 @@ __author__="M. Meyer // manuel.meyer@physik.uni-hamburg.de"
 
 import numpy as np
 from math import ceil
-import eblstud.ebl.tau_from_model as Tau
 from eblstud.misc.constants import *
 import logging
 import warnings
@@ -20,6 +26,9 @@ from PhotALPsConv.Bturb import Bgaussian as Bgaus
 
 # --- Conversion without absorption, designed to match values in Clusters -------------------------------------------#
 from deltas import *
+from PhotALPsConv.tools import complex_dtype
+from PhotALPsConv.workspace import get_workspace,set_Un,domain_product
+from PhotALPsConv.derivatives import expm_derivative
 class PhotALPs_ICM(object):
     """
     Class for photon ALP conversion in galaxy clusters and the intra cluster medium (ICM) 
@@ -84,6 +93,13 @@ class PhotALPs_ICM(object):
 	beta:		power of n dependence, default: 2/3
 	eta:		power with what B follows n, see Notes. Typical values: 0.5 <= eta <= 1. default: 1.
 
+	precision:	string, precision of the complex transfer matrices, either 'double' (complex128) or 'single' (complex64),
+			the phases are always calculated in double precision, default: 'double'
+	strong_mixing:	boolean, if True, the energy independent transfer matrix of the strong mixing regime is used
+			for all energies at which the error bound deltas.strong_mixing_error is below strong_mixing_tol,
+			default: False
+	strong_mixing_tol:	float, tolerance for the strong mixing approximation, default: 1e-2
+
 	Returns
 	-------
 	Nothing.
@@ -119,6 +135,9 @@ class PhotALPs_ICM(object):
 	kwargs.setdefault('Bn_const',True)
 	kwargs.setdefault('beta',2. / 3.)
 	kwargs.setdefault('eta',1.)
+	kwargs.setdefault('precision','double')
+	kwargs.setdefault('strong_mixing',False)
+	kwargs.setdefault('strong_mixing_tol',1e-2)
 # --------------------
 	self.update_params(**kwargs)
 
@@ -146,28 +165,42 @@ class PhotALPs_ICM(object):
 	    kwargs['Lcoh'] = self.Lcoh
 	    self.bfield	= Bgaus(**kwargs)		# init gaussian turbulent field
 
+	self.ctype	= complex_dtype(self.precision)	# dtype of transfer matrices
+
 	self.Nd	= int(self.r_abell / self.Lcoh)	# number of domains, no expansion assumed
 	self.r	= np.linspace(self.Lcoh, self.r_abell + self.Lcoh, int(self.Nd))
 
 	if new_Bn:
 	    self.new_B_n()
 
-	self.T1		= np.zeros((3,3,self.Nd),np.complex)	# Transfer matrices
-	self.T2		= np.zeros((3,3,self.Nd),np.complex)
-	self.T3		= np.zeros((3,3,self.Nd),np.complex)
-	self.Un		= np.zeros((3,3,self.Nd),np.complex)
+	ws		= get_workspace(self)
+	self.T1		= ws.get('T1',(3,3,self.Nd),self.ctype, zero = True)	# Transfer matrices
+	self.T2		= ws.get('T2',(3,3,self.Nd),self.ctype, zero = True)
+	self.T3		= ws.get('T3',(3,3,self.Nd),self.ctype, zero = True)
+	self.Un		= ws.get('Un',(3,3,self.Nd),self.ctype)
 
 
 	return
 
-    def new_B_n(self):
+    def new_B_n(self, rng = None, numbers = None):
 	"""
 	Recalculate Bfield and density, if Kolmogorov turbulence is set to true, new random values for B and Psi are calculated.
+
+	kwargs
+	------
+	rng:		numpy Generator or RandomState instance for the turbulent field, if None, the global numpy random state is used
+	numbers:	list with two dictionaries with the random numbers of the two transverse components of the turbulent field, 
+			see PhotALPsConv.Bturb.Bgaussian.random_numbers. If given, no new random numbers are drawn.
 	"""
 
 	if self.B_gauss:
+	    if not numbers == None:
+		self.bfield.set_random_numbers(numbers[0])
 	    Bt		= self.bfield.Bgaus(self.r)	# calculate first transverse component
-	    self.bfield.new_random_numbers()		# new random numbers
+	    if numbers == None:
+		self.bfield.new_random_numbers(rng = rng)	# new random numbers
+	    else:
+		self.bfield.set_random_numbers(numbers[1])
 	    Bu		= self.bfield.Bgaus(self.r)	# calculate second transverse component
 	    self.B	= np.sqrt(Bt ** 2. + Bu ** 2.)	# calculate total transverse component 
 	    self.Psin	= np.arctan2(Bt , Bu)		# and angle to x2 (t) axis -- use atan2 to get the quadrants right
@@ -256,6 +289,26 @@ class PhotALPs_ICM(object):
 	self.EW2 = 0.5 * (self.Dpar + self.Da - self.Dosc)
 	self.EW3 = 0.5 * (self.Dpar + self.Da + self.Dosc)
 	return
+
+    def __setEW_strong(self):
+	"""
+	Set Eigenvalues and mixing angle in the strong mixing limit, Dperp = Dpar = Da = 0,
+	i.e. alph = pi / 4 and the eigenvalues are 0, -Dag, and Dag
+	
+	Parameters
+	----------
+	None (self only)
+
+	Returns
+	-------
+	Nothing
+	"""
+	self.alph	= 0.5 * np.arctan2(2. * self.Dag, 0. * self.Dag)
+	self.Dosc	= 2. * np.abs(self.Dag)
+	self.EW1	= 0. * self.Dag
+	self.EW2	= -0.5 * self.Dosc
+	self.EW3	= 0.5 * self.Dosc
+	return
 	
 
     def __setT1n(self):
@@ -336,6 +389,38 @@ class PhotALPs_ICM(object):
 	self.T3[2,2,:] = sa*sa
 	return
 
+    def __setDerivs(self):
+	"""
+	Derivatives of the mixing matrix in all domains with respect to log(g), log(m), log(B), and log(n),
+	where B and n are the fields and densities of all domains scaled by a common factor.
+	The Deltas have to be set before.
+	
+	Parameters
+	----------
+	None (self only)
+
+	Returns
+	-------
+	dictionary with (3x3xNd)-dim arrays, keys are g, m, B, n
+	"""
+	c = np.cos(self.Psin)
+	s = np.sin(self.Psin)
+	Pperp	= np.zeros((3,3,self.Nd))	# projector on the polarization perpendicular to B
+	Ppar	= np.zeros((3,3,self.Nd))	# projector on the polarization parallel to B
+	Pa	= np.zeros((3,3,self.Nd))	# projector on the ALP
+	X	= np.zeros((3,3,self.Nd))	# mixing of parallel polarization and ALP
+	Pperp[0,0], Pperp[0,1], Pperp[1,0], Pperp[1,1]	= c*c, -1. * c*s, -1. * c*s, s*s
+	Ppar[0,0], Ppar[0,1], Ppar[1,0], Ppar[1,1]	= s*s, s*c, s*c, c*c
+	Pa[2,2]		= 1.
+	X[0,2], X[2,0], X[1,2], X[2,1]	= s, s, c, c
+
+	dQED	= self.B * dDelta_QED_kpc_dB(self.B,self.E)
+	dpl	= self.n * dDelta_pl_kpc_dn(self.n,self.E)
+	return {'g': self.Dag * X,
+		'm': 2. * self.Da * Pa,
+		'B': self.Dag * X + dQED * (2. * Pperp + 3.5 * Ppar),
+		'n': dpl * (Pperp + Ppar)}
+
     def __setUn(self):
 	"""
 	Set Transfer Matrix Un in n-th domain
@@ -348,9 +433,7 @@ class PhotALPs_ICM(object):
 	-------
 	Nothing
 	"""
-	self.Un = np.exp(1.j * self.EW1 * self.Lcoh) * self.T1 + \
-	np.exp(1.j * self.EW2 * self.Lcoh) * self.T2 + \
-	np.exp(1.j * self.EW3 * self.Lcoh) * self.T3
+	set_Un(self.ws,'ICM',self.Un,[self.T1,self.T2,self.T3],[self.EW1,self.EW2,self.EW3],self.Lcoh)
 	return
 
     def SetDomainN(self):
@@ -368,14 +451,86 @@ class PhotALPs_ICM(object):
 	if not self.Nd == self.Psin.shape[0]:
 	    raise TypeError("Number of domains (={0:n}) is not equal to number of angles (={1:n})!".format(self.Nd,self.Psin.shape[0]))
 	self.__setEW()
+	if self.strong_mixing and \
+	    strong_mixing_error(self.Dperp,self.Dpar,self.Da,self.Lcoh) < self.strong_mixing_tol:
+	    return self.SetDomainN_strong()
 	self.__setT1n()
 	self.__setT2n()
 	self.__setT3n()
 	self.__setUn()	# self.Un contains now all 3x3 matrices in all self.Nd domains
-	# do the martix multiplication
-	for i in range(self.Un.shape[2]):
-	    if not i:
-		U = self.Un[:,:,i]
-	    else:
-		U = np.dot(U,self.Un[:,:,i])	# first matrix on the left
-	return U
+	# do the martix multiplication, first matrix on the left
+	return domain_product(self.ws,'ICM',self.Un)
+
+    def EigenDomainN(self):
+	"""
+	Set eigenvalues and the matrices T1, T2, T3 in all domains without multiplying the transfer matrices,
+	e.g. to build the superoperators of all domains, see PhotALPsConv.superop
+
+	Parameters
+	----------
+	None (self only)
+
+	Returns
+	-------
+	tuple with list of the (3x3xNd) matrices [T1,T2,T3], list of the Nd-dim eigenvalues [EW1,EW2,EW3], 
+	and the domain length in kpc. The matrices are work space buffers that are overwritten by the next call.
+	"""
+	if not self.Nd == self.Psin.shape[0]:
+	    raise TypeError("Number of domains (={0:n}) is not equal to number of angles (={1:n})!".format(self.Nd,self.Psin.shape[0]))
+	self.__setEW()
+	self.__setT1n()
+	self.__setT2n()
+	self.__setT3n()
+	return [self.T1,self.T2,self.T3],[self.EW1,self.EW2,self.EW3],self.Lcoh
+
+    def DerivDomainN(self):
+	"""
+	Transfer matrices in all domains and their derivatives with respect to log(g), log(m), log(B), and log(n),
+	where B and n are the fields and densities of all domains scaled by a common factor.
+	The matrices are not multiplied, see PhotALPsConv.derivatives.product_derivative. 
+	The strong mixing approximation is not used.
+
+	Parameters
+	----------
+	None (self only)
+
+	Returns
+	-------
+	tuple with the (3x3xNd) transfer matrices and dictionary with their (3x3xNd) derivatives, keys are g, m, B, n
+	"""
+	T,EW,L	= self.EigenDomainN()
+	dH	= self.__setDerivs()
+	self.__setUn()
+	dUn	= expm_derivative(T,EW,L,np.array(dH.values()))
+	return self.Un.astype(np.complex128),dict(zip(dH.keys(),dUn))
+
+    def SetDomainN_strong(self):
+	"""
+	Set Transfer matrix in all domains in the strong mixing limit and multiply it.
+	The result does not depend on energy, so it is kept until the B field, the angles, 
+	the coupling, or the domain length change.
+
+	Parameters
+	----------
+	None (self only)
+
+	Returns
+	-------
+	Transfer matrix as 3x3 complex numpy array
+	"""
+	key = [self.g, self.Lcoh, self.B, self.Psin]
+	try:
+	    if self.U_strong.dtype == self.ctype and \
+		np.all([np.array_equal(k,l) for k,l in zip(key,self.U_strong_key)]):
+		return self.U_strong.copy()
+	except AttributeError:
+	    pass
+	self.Dag	= Delta_ag_kpc(self.g,self.B)
+	self.__setEW_strong()
+	self.__setT1n()
+	self.__setT2n()
+	self.__setT3n()
+	self.__setUn()
+	self.U_strong		= domain_product(self.ws,'ICM',self.Un)
+	self.U_strong_key	= [np.copy(k) for k in key]
+	return self.U_strong.copy()
@@ -3,6 +3,10 @@ Class for the calculation of photon-ALPs conversion in AGN jets
 
 History:
 - 11/13/13: created
+- 10/18/26: B field and density profiles are methods, so that instances can be pickled
+- 10/18/26: optional single precision transfer matrices
+- 10/18/26: transfer matrices are kept in preallocated work space buffers
+- 10/18/26: added EigenDomainN_Jet
 """
 __version__=0.01
 __author__="M. Meyer // manuel.meyer@fysik.su.se"
@@ -17,6 +21,8 @@ from numpy.random import rand, seed
 
 # --- Conversion without absorption, designed to match values in Clusters -------------------------------------------#
 from deltas import *
+from PhotALPsConv.tools import complex_dtype
+from PhotALPsConv.workspace import get_workspace,set_Un,domain_product
 class PhotALPs_Jet(object):
     """
     Class for photon ALP conversion in AGN jets 
@@ -77,6 +83,9 @@ class PhotALPs_Jet(object):
 	theta_jet:	float, angle between jet and l.o.s. in degrees, default: 3.
 	Gamma:		float, bulk lorentz factor, default: 10.
 
+	precision:	string, precision of the complex transfer matrices, either 'double' (complex128) or 'single' (complex64),
+			the phases are always calculated in double precision, default: 'double'
+
 	Returns
 	-------
 	Nothing.
@@ -107,6 +116,7 @@ class PhotALPs_Jet(object):
 	kwargs.setdefault('Psi',0.)
 	kwargs.setdefault('theta_jet',3.)
 	kwargs.setdefault('Gamma',10.)
+	kwargs.setdefault('precision','double')
 # --------------------
 	self.update_params_Jet(**kwargs)
 
@@ -119,10 +129,7 @@ class PhotALPs_Jet(object):
 
 	self.__dict__.update(kwargs)
 
-	self.Bf		= lambda r: self.Bjet * (r / self.R_BLR) ** -self.pjet	# normalized to R_BLR
-	self.nf		= lambda r: self.njet * (r / self.R_BLR) ** -self.sjet	# normalized to R_BLR
-	#self.Bf		= lambda r: self.Bjet * (r / 0.3) ** -self.pjet	# normalized to 0.3 pc
-	#self.nf		= lambda r: self.njet * (r / 0.3) ** -self.sjet	# normalized to 0.3 pc
+	self.ctype	= complex_dtype(self.precision)	# dtype of transfer matrices
 
 	self.Nd_jet	= ceil( -1. * self.pjet * np.log(self.Rmax/self.R_BLR) / np.log(self.sens) )	
 	self.Lcoh_jet	= self.R_BLR *  self.sens ** ( - np.linspace(1.,self.Nd_jet,self.Nd_jet) / self.pjet ) * (1. - self.sens) # domain length
@@ -133,14 +140,25 @@ class PhotALPs_Jet(object):
 	self.Br_jet = self.Bf(self.r_jet)
 	self.nr_jet = self.nf(self.r_jet)
 
-	self.T1jet	= np.zeros((3,3,self.Nd_jet),np.complex)	# Transfer matrices
-	self.T2jet	= np.zeros((3,3,self.Nd_jet),np.complex)
-	self.T3jet	= np.zeros((3,3,self.Nd_jet),np.complex)
-	self.Unjet	= np.zeros((3,3,self.Nd_jet),np.complex)
+	ws		= get_workspace(self)
+	self.T1jet	= ws.get('T1jet',(3,3,self.Nd_jet),self.ctype, zero = True)	# Transfer matrices
+	self.T2jet	= ws.get('T2jet',(3,3,self.Nd_jet),self.ctype, zero = True)
+	self.T3jet	= ws.get('T3jet',(3,3,self.Nd_jet),self.ctype, zero = True)
+	self.Unjet	= ws.get('Unjet',(3,3,self.Nd_jet),self.ctype)
 
 	self.Psin_jet	= np.ones(self.Nd_jet) * self.Psi * np.pi / 180.
 	return
 
+    def Bf(self, r):
+	"""B field in G at distance r in pc, normalized to R_BLR"""
+	return self.Bjet * (r / self.R_BLR) ** -self.pjet
+	#return self.Bjet * (r / 0.3) ** -self.pjet	# normalized to 0.3 pc
+
+    def nf(self, r):
+	"""electron density in cm^-3 at distance r in pc, normalized to R_BLR"""
+	return self.njet * (r / self.R_BLR) ** -self.sjet
+	#return self.njet * (r / 0.3) ** -self.sjet	# normalized to 0.3 pc
+
     def __setDeltas_Jet(self):
 	"""
 	Set Deltas of mixing matrix for each domain in units of 1/pc
@@ -274,9 +292,7 @@ class PhotALPs_Jet(object):
 	-------
 	Nothing
 	"""
-	self.Unjet = np.exp(1.j * self.EW1jet * self.Lcoh_jet) * self.T1jet + \
-	np.exp(1.j * self.EW2jet * self.Lcoh_jet) * self.T2jet + \
-	np.exp(1.j * self.EW3jet * self.Lcoh_jet) * self.T3jet
+	set_Un(self.ws,'Jet',self.Unjet,[self.T1jet,self.T2jet,self.T3jet],[self.EW1jet,self.EW2jet,self.EW3jet],self.Lcoh_jet)
 	return
 
     def SetDomainN_Jet(self):
@@ -294,13 +310,28 @@ class PhotALPs_Jet(object):
 	self.__setT2n_Jet()
 	self.__setT3n_Jet()
 	self.__setUn_Jet()	# self.Un contains now all 3x3 matrices in all self.Nd_jet domains
-	# do the martix multiplication
-	for i in range(self.Unjet.shape[2]):
-	    if not i:
-		U = self.Unjet[:,:,i]
-	    else:
-		U = np.dot(U,self.Unjet[:,:,i])	# first matrix on the left
-	return U
+	# do the martix multiplication, first matrix on the left
+	return domain_product(self.ws,'Jet',self.Unjet)
+
+    def EigenDomainN_Jet(self):
+	"""
+	Set eigenvalues and the matrices T1, T2, T3 in all domains without multiplying the transfer matrices,
+	e.g. to build the superoperators of all domains, see PhotALPsConv.superop
+
+	Parameters
+	----------
+	None (self only)
+
+	Returns
+	-------
+	tuple with list of the (3x3xNd_jet) matrices [T1,T2,T3], list of the Nd_jet-dim eigenvalues [EW1,EW2,EW3], 
+	and the domain length in pc. The matrices are work space buffers that are overwritten by the next call.
+	"""
+	self.__setEW_Jet()
+	self.__setT1n_Jet()
+	self.__setT2n_Jet()
+	self.__setT3n_Jet()
+	return [self.T1jet,self.T2jet,self.T3jet],[self.EW1jet,self.EW2jet,self.EW3jet],self.Lcoh_jet
 
     def analytical_U(self):
 	"""
@@ -314,7 +345,7 @@ class PhotALPs_Jet(object):
 	-------
 	Transfer matrix as 3x3 complex numpy array
 	"""
-	U	= np.zeros((3,3),np.complex)
+	U	= np.zeros((3,3),self.ctype)
 	U[0,0]	= 1.
 	x	= (1e-3 * (Delta_ag_kpc(self.g,self.Bf(np.array([self.Rmax])) * 1e6)) * (self.Rmax / self.R_BLR) ** self.pjet * self.R_BLR * np.log(self.Rmax / self.R_BLR))[0]
 	#x	= self.Dag * (self.r / self.R_BLR) ** self.pjet * self.R_BLR * np.log(self.r / self.R_BLR)
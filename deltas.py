@@ -4,6 +4,9 @@ Functions to calculate the Delta parameters that enter into the photon-Axion Mix
 Version 1.0
 - 11/15/11: created
 - 01/05/16: added correction factors for high magnetic fields
+- 10/18/26: (E x B) grids are calculated with broadcasting in chunks, optionally into an output buffer
+- 10/18/26: added error estimate of the strong mixing approximation
+- 10/18/26: added derivatives of Delta_QED_kpc and Delta_pl_kpc
 """
 
 import numpy as np
@@ -69,7 +72,62 @@ Delta_QED_Mpc= lambda B,E: 4.1e-9*E*B**2.
 Delta_QED_kpc= lambda B,E: 4.1e-9*E*B**2. * (1. + 1.2e-6 * B / Bcrit) / \
 				(1. + 1.33e-6*B / Bcrit + 0.59e-6 * (B / Bcrit)**2.)
 
-def Delta_Osc_kpc_array(m,n,g,B,E): 
+#B is magnetic field in muG
+#E is Energy in GeV
+#returns derivative of Delta_QED_kpc with respect to B in kpc^-1 muG^-1
+dDelta_QED_kpc_dB= lambda B,E: 4.1e-9*E*B * (2. * (1. + 1.2e-6 * B / Bcrit) / (1. + 1.33e-6*B / Bcrit + 0.59e-6 * (B / Bcrit)**2.) + \
+				B / Bcrit * (1.2e-6 - 1.33e-6 - 1.18e-6 * B / Bcrit - 7.08e-13 * (B / Bcrit)**2.) / \
+				(1. + 1.33e-6*B / Bcrit + 0.59e-6 * (B / Bcrit)**2.)**2.)
+
+#n is electron density in 10^-3 cm^-3
+#E is Energy in GeV
+#returns derivative of Delta_pl_kpc with respect to n in kpc^-1 (10^-3 cm^-3)^-1
+dDelta_pl_kpc_dn= lambda n,E: -1.1e-7/E * np.ones(np.shape(n))
+
+def _grid_args(n,B,E,out,chunk):
+    """
+    Check the arguments of the (E x B) grid functions
+
+    Returns
+    -------
+    tuple with n, B, E as arrays, the output array, and the number of energies per chunk
+    """
+    E = np.atleast_1d(np.asarray(E, dtype = np.float))
+    B = np.atleast_1d(np.asarray(B, dtype = np.float))
+    n = np.atleast_1d(np.asarray(n, dtype = np.float))
+    if not B.shape[0] == n.shape[0]:
+	raise ValueError("B and n array have to have the same shape. B.shape: {0}, n.shape: {1}".format(B.shape[0],n.shape[0]))
+    if out is None:
+	out = np.empty((E.shape[0],B.shape[0]))
+    elif not out.shape == (E.shape[0],B.shape[0]):
+	raise ValueError("out has to have shape {0}, not {1}".format((E.shape[0],B.shape[0]),out.shape))
+    if chunk is None:
+	chunk = max(1,2**20 // B.shape[0])	# at most 2**20 grid points per chunk
+    return n,B,E,out,int(chunk)
+
+def _Delta_Osc_array(ca,cpl,m,n,g,B,E,out,chunk):
+    """
+    Delta_osc = sqrt((Delta_a - Delta_pl)^2 + 4 Delta_ag^2) on an (E x B) grid without the CMB and QED terms,
+    ca and cpl are the prefactors of Delta_a and Delta_pl in the used units
+    """
+    n,B,E,out,chunk = _grid_args(n,B,E,out,chunk)
+    a	= ca * m ** 2.
+    ag2	= 4. * (1.52e-2*g*B)**2.
+    tmp	= np.empty((min(chunk,E.shape[0]),B.shape[0]))
+    for i0 in range(0,E.shape[0],chunk):
+	e = E[i0:i0 + chunk,np.newaxis]
+	o = out[i0:i0 + chunk]
+	t = tmp[:o.shape[0]]
+	np.multiply(a, 1. / e, out = o)		# Delta_a
+	np.divide(n, e, out = t)
+	t *= cpl
+	o -= t					# Delta_pl
+	o *= o
+	o += ag2
+	np.sqrt(o, out = o)
+    return out
+
+def Delta_Osc_kpc_array(m,n,g,B,E, out = None, chunk = None): 
     """
     Compute Delta Osc
 
@@ -81,25 +139,19 @@ def Delta_Osc_kpc_array(m,n,g,B,E):
     B: magnetic field in muG, n-dim array
     E: energy in GeV, m-dim array
 
+    kwargs
+    ------
+    out:	mxn-dim array, if given, the result is written into this array
+    chunk:	int, number of energies that are calculated at once, if None, 
+		chunks are chosen to have at most 2**20 grid points
+
     Returns
     -------
     Delta_osc as mxn-dim array in kpc^-1
     """
-    if np.isscalar(E):
-	E = np.array([E])
-    if np.isscalar(B):
-	B = np.array([B])
-    if np.isscalar(n):
-	n = np.array([n])
-    if not B.shape[0] == n.shape[0]:
-	raise ValueError("B and n array have to have the same shape. B.shape: {0}, n.shape: {1}".format(B.shape[0],n.shape[0]))
-    result = -7.8e-2 * m ** 2. * (np.ones((E.shape[0],B.shape[0])).transpose()/E).transpose()	# Delta_a as ExB-shaped matrix
-    result -= -1.1e-7*((np.ones((E.shape[0],B.shape[0]))*n).transpose()/E).transpose()		# Delta_pl as ExB-shaped matrix
-    result *= result
-    result += 4. * np.ones((E.shape[0],B.shape[0]))* (1.52e-2*g*B)**2.
-    return np.sqrt(result)
+    return _Delta_Osc_array(-7.8e-2,-1.1e-7,m,n,g,B,E,out,chunk)
 
-def Delta_Osc_Mpc_array(m,n,g,B,E): 
+def Delta_Osc_Mpc_array(m,n,g,B,E, out = None, chunk = None): 
     """
     Compute Delta Osc
 
@@ -111,23 +163,17 @@ def Delta_Osc_Mpc_array(m,n,g,B,E):
     B: magnetic field in nG, n-dim array
     E: energy in TeV, m-dim array
 
+    kwargs
+    ------
+    out:	mxn-dim array, if given, the result is written into this array
+    chunk:	int, number of energies that are calculated at once, if None, 
+		chunks are chosen to have at most 2**20 grid points
+
     Returns
     -------
     Delta_osc as mxn-dim array in Mpc^-1
     """
-    if np.isscalar(E):
-	E = np.array([E])
-    if np.isscalar(B):
-	B = np.array([B])
-    if np.isscalar(n):
-	n = np.array([n])
-    if not B.shape[0] == n.shape[0]:
-	raise ValueError("B and n array have to have the same shape. B.shape: {0}, n.shape: {1}".format(B.shape[0],n.shape[0]))
-    result = -7.8e-4 * m ** 2. * (np.ones((E.shape[0],B.shape[0])).transpose()/E).transpose()	# Delta_a as ExB-shaped matrix
-    result -= -1.1e-11*((np.ones((E.shape[0],B.shape[0]))*n).transpose()/E).transpose()		# Delta_pl as ExB-shaped matrix
-    result *= result
-    result += 4. * np.ones((E.shape[0],B.shape[0]))* (1.52e-2*g*B)**2.
-    return np.sqrt(result)
+    return _Delta_Osc_array(-7.8e-4,-1.1e-11,m,n,g,B,E,out,chunk)
 
 #Plasma freq in 10^-10 eV
 #n is electron density in 10^-7 cm^-3
@@ -160,6 +206,36 @@ Ecrit_GeV= lambda m,n,B,g: 2.5e0*abs(m**2. - w_pl_e9(n)**2.)/B/g
 # Check this!
 Emax_GeV= lambda B,g: kpcmuG2GeV*(3.5*4.1e-9*B**2 + 0.8e-7 )**-1 *B * g  
 
+def strong_mixing_error(Dperp,Dpar,Da,L):
+    """
+    Upper bound on the error of the transfer matrix of all domains in the strong mixing approximation,
+    i.e. if Delta_perp, Delta_par, and Delta_a are neglected against Delta_ag. 
+    The approximation is valid between Ecrit_GeV and Emax_GeV, where the bound is small.
+
+    Parameters
+    ----------
+    Dperp:	n-dim array or scalar, Delta_perp in all domains, may be complex for absorption
+    Dpar:	n-dim array or scalar, Delta_par in all domains, may be complex for absorption
+    Da:		n-dim array, Delta_a in all domains
+    L:		n-dim array or scalar, domain lengths, in the inverse units of the Deltas
+
+    Returns
+    -------
+    float, sum over all domains of (half the spread of the real parts of Delta_perp, Delta_par, and Delta_a 
+    plus the largest absolute imaginary part) * L
+
+    Notes
+    -----
+    A real shift common to all diagonal elements of the mixing matrix only changes the global phase,
+    which drops out of all conversion probabilities. For the remaining neglected part of the mixing matrix
+    the norm of the difference of the transfer matrices of one domain is bounded by its norm times L, 
+    and the errors of all domains add up.
+    """
+    re	= [np.real(Dperp),np.real(Dpar),np.real(Da)]
+    im	= np.maximum(np.abs(np.imag(Dperp)),np.abs(np.imag(Dpar)))
+    d	= 0.5 * (np.maximum(np.maximum(re[0],re[1]),re[2]) - np.minimum(np.minimum(re[0],re[1]),re[2])) + im
+    return float(np.sum(d * L))
+
 # mixing angle
 #m is axion mass in 10^-09 eV
 #n is electron density in 10^-3 cm^-3
@@ -191,3 +267,89 @@ Delta_osc_kpc = lambda g,B,n,E,m  : np.sqrt((Delta_pl_kpc(n,E) + 3.5*Delta_QED_k
 #g is photon axion coupling in 10^-11 GeV^-1
 #E is energy in TeV
 Delta_osc_Mpc = lambda g,B,n,E,m  : np.sqrt((Delta_pl_Mpc(n,E) + 3.5*Delta_QED_Mpc(B,E) - Delta_a_Mpc(m,E)) ** 2. + 4. * Delta_ag_Mpc(g,B) ** 2.)
+
+def _Delta_mix_kpc_grid(g,B,n,E,m,out,chunk,final):
+    """
+    Delta_pl + 3.5 Delta_QED - Delta_a on an (E x B) grid in kpc^-1, 
+    final(o,ag) is applied in place to each chunk o, where ag is Delta_ag
+    """
+    n,B,E,out,chunk = _grid_args(n,B,E,out,chunk)
+    B2	= B**2.
+    num	= 1. + 1.2e-6 * B / Bcrit					# correction factors of Delta_QED
+    den	= 1. + 1.33e-6*B / Bcrit + 0.59e-6 * (B / Bcrit)**2.
+    ag	= Delta_ag_kpc(g,B)
+    tmp	= np.empty((min(chunk,E.shape[0]),B.shape[0]))
+    for i0 in range(0,E.shape[0],chunk):
+	e = E[i0:i0 + chunk,np.newaxis]
+	o = out[i0:i0 + chunk]
+	t = tmp[:o.shape[0]]
+	np.divide(-1.1e-7*n, e, out = o)
+	o += Delta_CMB_kpc(e)				# Delta_pl
+	np.multiply(4.1e-9*e, B2, out = t)
+	t *= num
+	t /= den
+	t *= 3.5
+	o += t						# 3.5 Delta_QED
+	np.divide(-7.8e-2*m**2., e, out = t[:,:1])
+	o -= t[:,:1]					# Delta_a
+	final(o,ag)
+    return out
+
+def _alpha_final(o,ag):
+    np.arctan2(2. * ag, o, out = o)
+    o *= 0.5
+    return
+
+def _Delta_osc_final(o,ag):
+    o *= o
+    o += 4. * ag ** 2.
+    np.sqrt(o, out = o)
+    return
+
+def alpha_kpc_grid(g,B,n,E,m, out = None, chunk = None):
+    """
+    Mixing angle alpha_kpc on a grid of energies and domains
+
+    Parameters
+    ----------
+    g: photon-ALP coupling strength in 10^-11 GeV^-1, scalar
+    B: magnetic field in muG, n-dim array
+    n: el. density in 10^-3 cm^-3, n-dim array
+    E: energy in GeV, m-dim array
+    m: ALP mass in neV, scalar
+
+    kwargs
+    ------
+    out:	mxn-dim array, if given, the result is written into this array
+    chunk:	int, number of energies that are calculated at once, if None, 
+		chunks are chosen to have at most 2**20 grid points
+
+    Returns
+    -------
+    mxn-dim array with mixing angles
+    """
+    return _Delta_mix_kpc_grid(g,B,n,E,m,out,chunk,_alpha_final)
+
+def Delta_osc_kpc_grid(g,B,n,E,m, out = None, chunk = None):
+    """
+    Oscillation wave number Delta_osc_kpc on a grid of energies and domains
+
+    Parameters
+    ----------
+    g: photon-ALP coupling strength in 10^-11 GeV^-1, scalar
+    B: magnetic field in muG, n-dim array
+    n: el. density in 10^-3 cm^-3, n-dim array
+    E: energy in GeV, m-dim array
+    m: ALP mass in neV, scalar
+
+    kwargs
+    ------
+    out:	mxn-dim array, if given, the result is written into this array
+    chunk:	int, number of energies that are calculated at once, if None, 
+		chunks are chosen to have at most 2**20 grid points
+
+    Returns
+    -------
+    mxn-dim array with oscillation wave numbers in kpc^-1
+    """
+    return _Delta_mix_kpc_grid(g,B,n,E,m,out,chunk,_Delta_osc_final)
@@ -0,0 +1,80 @@
+"""
+Module to calculate derivatives of the transfer matrices with respect to the parameters of the mixing matrix.
+
+The transfer matrix of a domain is U = exp(i H L) = sum_k exp(i EW_k L) T_k, where H is the mixing matrix
+with eigenvalues EW_k and the projectors T_k on its eigenvectors. Its derivative for a change dH of the
+mixing matrix is given by the Daleckii-Krein formula
+    dU = sum_{k,l} F_kl T_k dH T_l,
+where F_kl is the divided difference of exp(i x L) between EW_k and EW_l. The derivative of the product
+of the transfer matrices of all domains follows with the product rule.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+# ------------------------ #
+
+def expm_derivative(T, EW, L, dH):
+    """
+    Derivatives of the transfer matrices of all domains with the Daleckii-Krein formula.
+    The divided differences are written as
+	F_kl = i L exp(i (EW_k + EW_l) L / 2) sinc((EW_k - EW_l) L / 2),
+    which is also valid for (nearly) degenerate eigenvalues.
+
+    Parameters
+    ----------
+    T:		list with three (3 x 3 x Nd)-dim arrays T1, T2, T3
+    EW:		list with three Nd-dim arrays with the (real) eigenvalues
+    L:		float or Nd-dim array, domain lengths
+    dH:		(m x 3 x 3 x Nd)-dim array, derivatives of the mixing matrix in all domains for m parameters
+
+    Returns
+    -------
+    (m x 3 x 3 x Nd)-dim complex numpy array with the derivatives of the transfer matrices
+    """
+    Nd	= T[0].shape[2]
+    EW	= np.array([np.asarray(EW[k]) * np.ones(Nd) for k in range(3)])	# 3 x Nd
+    T	= np.array(T)								# 3 x 3 x 3 x Nd
+    F	= 1.j * L * np.exp(0.5j * (EW[:,np.newaxis] + EW[np.newaxis,:]) * L) * \
+		np.sinc(0.5 * (EW[:,np.newaxis] - EW[np.newaxis,:]) * L / np.pi)	# 3 x 3 x Nd
+    TdH	= np.einsum('kijn,pjmn->pkimn',T,dH)				# T_k dH
+    FTdH	= np.einsum('kln,pkimn->plimn',F,TdH)				# sum_k F_kl T_k dH
+    return np.einsum('plimn,lmjn->pijn',FTdH,T)
+
+def product_derivative(Un, dUn, left = False):
+    """
+    Product of the transfer matrices of all domains and its derivatives for several energies
+
+    Parameters
+    ----------
+    Un:		(n x 3 x 3 x Nd)-dim array, transfer matrices of all domains for n energies
+    dUn:	dictionary with (n x 3 x 3 x Nd)-dim arrays, derivatives of the transfer matrices of all domains
+
+    kwargs
+    ------
+    left:	bool, if True, the matrix of domain i is multiplied from the left,
+		otherwise from the right, see PhotALPsConv.workspace.domain_product, default: False
+
+    Returns
+    -------
+    tuple with (n x 3 x 3)-dim complex numpy array with the product and a dictionary with its derivatives
+    """
+    U	= Un[...,0].astype(np.complex128)
+    dU	= dict([(p,d[...,0].astype(np.complex128)) for p,d in dUn.items()])
+    for i in range(1,Un.shape[-1]):
+	for p in dU.keys():
+	    if left:
+		dU[p] = np.einsum('nij,njk->nik',dUn[p][...,i],U) + np.einsum('nij,njk->nik',Un[...,i],dU[p])
+	    else:
+		dU[p] = np.einsum('nij,njk->nik',dU[p],Un[...,i]) + np.einsum('nij,njk->nik',U,dUn[p][...,i])
+	if left:
+	    U = np.einsum('nij,njk->nik',Un[...,i],U)
+	else:
+	    U = np.einsum('nij,njk->nik',U,Un[...,i])
+    return U,dU
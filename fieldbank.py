@@ -0,0 +1,138 @@
+"""
+Module for a bank of random B-field realizations that are drawn in bulk from a
+seeded random generator and can be stored to disk. Repeated runs, fits, and
+parameter scans can use identical B-field realizations (common random numbers)
+without drawing them again.
+
+Usage:
+> bank = generate_field_bank(cc, 100, seed = 42)
+> bank.save('fields.npz')
+> for Pt,Pu,Pa in cc.iter_conversion(EGeV, bank = load_field_bank('fields.npz')):
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+- 10/18/2026: random numbers instead of field strengths are stored for a turbulent field in the ICM
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+from PhotALPsConv.tools import random_generator
+# ------------------------ #
+
+class RandomFieldBank(object):
+    """
+    Class for a set of random B-field realizations of all B-field environments with random angles.
+
+    Attributes
+    ----------
+    fields:	dictionary with a (nsim x Nd)-dim array for each attribute of the B-field realization,
+		e.g. Psin_IGM, Psin, Psin_BLR. For a turbulent field in the ICM, the random numbers Un_t, Vn_t, Un_u, Vn_u
+		(and dk_t, dk_u for dkType = random) of its transverse components t and u are stored instead of Psin, 
+		so that the realizations can be used for other parameters of the field
+    stages:	list with the names of the B-field environments in the bank
+    seed:	seed of the random generator, None if not seeded
+    nsim:	int, number of realizations
+    """
+    def __init__(self, fields, stages, seed = None):
+	"""
+	Init the bank
+
+	Parameters
+	----------
+	fields:	dictionary with (nsim x Nd)-dim arrays
+	stages:	list with the names of the B-field environments in the bank
+
+	kwargs
+	------
+	seed:	seed of the random generator, default: None
+	"""
+	self.fields	= fields
+	self.stages	= list(stages)
+	self.seed	= seed
+	if len(fields):
+	    self.nsim	= fields.values()[0].shape[0]
+	else:
+	    self.nsim	= 0
+	return
+
+    def apply(self, cc, i):
+	"""
+	Set the B-field realization i of a Calc_Conv instance
+
+	Parameters
+	----------
+	cc:	PhotALPsConv.calc_conversion.Calc_Conv instance with the same scenario and number of domains
+	i:	int, number of the realization
+	"""
+	if not i < self.nsim:
+	    raise IndexError("Bank only contains {0:n} realizations".format(self.nsim))
+	for name in self.stages:
+	    try:
+		stage = cc.pipeline[name]
+	    except KeyError:
+		raise ValueError("{0:s} is not in the scenario {1}".format(name,cc.scenario))
+	    missing = [k for k in stage.fields(cc) if not k in self.fields]
+	    if len(missing):
+		raise ValueError("Bank does not contain {0} of the {1:s}, it was generated for a different B-field model".format(missing,name))
+	    stage.set_fields(cc, dict([(k,self.fields[k][i]) for k in stage.fields(cc)]))
+	return
+
+    def save(self, filename):
+	"""
+	Save the bank to a numpy .npz file
+
+	Parameters
+	----------
+	filename:	string, path to output file
+	"""
+	np.savez(filename, stages = np.array(self.stages), seed = np.array(str(self.seed)), **self.fields)
+	return
+
+def generate_field_bank(cc, nsim, seed = None):
+    """
+    Draw random B-field realizations in bulk for all B-field environments with random angles
+
+    Parameters
+    ----------
+    cc:		PhotALPsConv.calc_conversion.Calc_Conv instance
+    nsim:	int, number of realizations
+
+    kwargs
+    ------
+    seed:	int, seed of the random generator, default: None
+
+    Returns
+    -------
+    RandomFieldBank instance
+    """
+    rng		= random_generator(seed)
+    fields	= {}
+    stages	= []
+    for stage in cc.pipeline:
+	if stage.random:
+	    fields.update(stage.draw_fields(cc, rng, nsim))
+	    stages.append(stage.name)
+    return RandomFieldBank(fields, stages, seed = seed)
+
+def load_field_bank(filename):
+    """
+    Load a bank that was stored with RandomFieldBank.save
+
+    Parameters
+    ----------
+    filename:	string, path to .npz file
+
+    Returns
+    -------
+    RandomFieldBank instance
+    """
+    f		= np.load(filename)
+    fields	= dict([(k,f[k]) for k in f.files if not k in ['stages','seed']])
+    stages	= [str(s) for s in f['stages']]
+    seed	= str(f['seed'])
+    f.close()
+    return RandomFieldBank(fields, stages, seed = None if seed == 'None' else int(seed))
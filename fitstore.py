@@ -0,0 +1,229 @@
+"""
+Module to store fit results on disk, so that fits can be started from the solution
+of a previous fit of the same data set with the same or a similar configuration.
+
+Each result is pickled into its own file <path>/<data hash>/<config hash>.pickle,
+where the hashes are sha1 digests of the data points and of the configuration, i.e.
+the kwargs of PhotALPsConv.calc_conversion.Calc_Conv with plain values (numbers, strings,
+and lists of them). The nearest stored configuration of a data set is found from the
+distance of the numerical parameters, measured in log space for positive values.
+
+Usage:
+> store = FitStore('fits/')
+> fit = PhotALPsConv.iminuit_fit.Fit_JetICMGMF(x, y, s, **kwargs)
+> fit.fit(store = store)	# starts from the nearest stored result and stores the new result
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import logging
+import os
+import glob
+import hashlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+# ------------------------ #
+
+def _plain(v):
+    """True if v is a number, string, or a list or tuple of them"""
+    if isinstance(v, (list,tuple)):
+	return np.all([_plain(vi) for vi in v])
+    return isinstance(v, (str, bool, int, long, float, np.number, np.bool_))
+
+def _numeric(v):
+    """True if v is a number but not a bool"""
+    return isinstance(v, (int, long, float, np.number)) and not isinstance(v, (bool, np.bool_))
+
+def plain_config(config):
+    """
+    Entries of a configuration that are used for hashing and for the nearest-neighbour search
+
+    Parameters
+    ----------
+    config:	dictionary, e.g. kwargs of PhotALPsConv.calc_conversion.Calc_Conv
+
+    Returns
+    -------
+    dictionary with all entries that are numbers, strings, or lists of them,
+    functions and other objects (e.g. func or surrogate) are removed
+    """
+    return dict([(k,(list(v) if isinstance(v, tuple) else v)) for k,v in config.items() if _plain(v)])
+
+def data_hash(x, y, s, bins):
+    """
+    sha1 digest of a data set
+
+    Parameters
+    ----------
+    x:		n-dim array, energies
+    y:		n-dim array, fluxes
+    s:		n-dim array, uncertainties of the fluxes
+    bins:	n+1-dim array, bin boundaries
+
+    Returns
+    -------
+    string with hex digest
+    """
+    h = hashlib.sha1()
+    for a in [x,y,s,bins]:
+	h.update(np.ascontiguousarray(a, dtype = np.float64).tostring())
+    return h.hexdigest()
+
+def config_hash(config):
+    """
+    sha1 digest of the plain entries of a configuration, see plain_config
+
+    Parameters
+    ----------
+    config:	dictionary
+
+    Returns
+    -------
+    string with hex digest
+    """
+    return hashlib.sha1(repr(sorted(plain_config(config).items()))).hexdigest()
+
+def config_distance(config1, config2):
+    """
+    Distance between two configurations: squared differences of all numerical parameters,
+    in log space if both values are positive.
+
+    Parameters
+    ----------
+    config1, config2:	dictionaries returned by plain_config
+
+    Returns
+    -------
+    float, distance, infinite if the configurations have different entries or
+    differ in a parameter that is not a number
+    """
+    if not sorted(config1.keys()) == sorted(config2.keys()):
+	return np.inf
+    d = 0.
+    for k,v1 in config1.items():
+	v2 = config2[k]
+	if _numeric(v1) and _numeric(v2):
+	    if v1 > 0. and v2 > 0.:
+		d += np.log(float(v1) / v2) ** 2.
+	    else:
+		d += (float(v1) - v2) ** 2.
+	elif not v1 == v2:
+	    return np.inf
+    return d
+
+class FitStore(object):
+    """
+    Class to store fit results on disk and to look up the result of the nearest configuration
+
+    Attributes
+    ----------
+    path:	string, directory of the store
+    """
+    def __init__(self, path):
+	"""
+	Init the store
+
+	Parameters
+	----------
+	path:	string, directory of the store, created if it does not exist
+	"""
+	self.path = path
+	if not os.path.isdir(self.path):
+	    os.makedirs(self.path)
+	return
+
+    def filename(self, x, y, s, bins, config):
+	"""
+	Path of the file of a data set and configuration
+
+	Parameters
+	----------
+	x, y, s, bins:	data set, see data_hash
+	config:		dictionary with configuration
+
+	Returns
+	-------
+	string with path
+	"""
+	return os.path.join(self.path, data_hash(x, y, s, bins), config_hash(config) + '.pickle')
+
+    def save(self, x, y, s, bins, config, result):
+	"""
+	Store a fit result, an existing result of the same data set and configuration is replaced
+
+	Parameters
+	----------
+	x, y, s, bins:	data set, see data_hash
+	config:		dictionary with configuration
+	result:		dictionary with the fit result, e.g. with best-fit values, covariance, and PggAve
+	"""
+	fname = self.filename(x, y, s, bins, config)
+	if not os.path.isdir(os.path.dirname(fname)):
+	    os.makedirs(os.path.dirname(fname))
+	entry = dict(result)
+	entry['config'] = plain_config(config)
+	tmp = fname[:-7] + '.tmp.pickle'
+	with open(tmp, 'wb') as f:
+	    pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+	os.rename(tmp, fname)
+	logging.debug("Fit store: saved {0:s}".format(fname))
+	return
+
+    def load(self, x, y, s, bins, config):
+	"""
+	Load the fit result of a data set and configuration
+
+	Parameters
+	----------
+	x, y, s, bins:	data set, see data_hash
+	config:		dictionary with configuration
+
+	Returns
+	-------
+	dictionary with fit result and its configuration, None if not stored
+	"""
+	fname = self.filename(x, y, s, bins, config)
+	if not os.path.isfile(fname):
+	    return None
+	with open(fname, 'rb') as f:
+	    return pickle.load(f)
+
+    def nearest(self, x, y, s, bins, config):
+	"""
+	Load the fit result of a data set with the nearest configuration, see config_distance
+
+	Parameters
+	----------
+	x, y, s, bins:	data set, see data_hash
+	config:		dictionary with configuration
+
+	Returns
+	-------
+	tuple with dictionary with fit result and its configuration and distance,
+	(None, inf) if no result with a comparable configuration is stored for the data set
+	"""
+	result = self.load(x, y, s, bins, config)
+	if not result == None:
+	    return result, 0.
+
+	config	= plain_config(config)
+	result	= None
+	dmin	= np.inf
+	for fname in glob.glob(os.path.join(self.path, data_hash(x, y, s, bins), '*.pickle')):
+	    if fname.endswith('.tmp.pickle'):
+		continue
+	    with open(fname, 'rb') as f:
+		entry = pickle.load(f)
+	    d = config_distance(config, entry['config'])
+	    if d < dmin:
+		result, dmin = entry, d
+	return result, dmin
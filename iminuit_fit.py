@@ -10,10 +10,16 @@ History:
 --------
 - 12/16/2013: version 0.01 - created
 - 01/08/2014: version 0.02 - added fit for ICM environment and included calc_conversion class
+- 10/18/2026: version 0.03 - added interpolation of bin averaged Pgg from precomputed table
+- 10/18/2026: analytic gradient of chi^2 for the ICM + GMF scenario
+- 10/18/2026: minos errors and chi^2 profile can be calculated on a pool of worker processes
+- 10/18/2026: fit results can be stored and used as starting values, see PhotALPsConv.fitstore
+- 10/18/2026: configuration and free parameters are checked against the Pgg table
+- 10/18/2026: ALP parameters are updated through update_params_all, so that cached transfer matrices are removed
 """
 
 __author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
-__version__ = 0.02
+__version__ = 0.03
 
 # --- Imports ------------ #
 import numpy as np
@@ -24,12 +30,15 @@ from eblstud.tools.lsq_fit import *
 from scipy.integrate import simps
 from scipy.interpolate import interp1d
 import logging
+from multiprocessing import Pool
 # --- ALP imports 
 import PhotALPsConv.conversion_Jet as JET
 import PhotALPsConv.conversion as IGM 
 import PhotALPsConv.conversion_ICM as ICM 
 import PhotALPsConv.conversion_GMF as GMF 
 import PhotALPsConv.calc_conversion as CC
+from PhotALPsConv.pgg_table import load_pgg_table
+from PhotALPsConv.fitstore import FitStore, plain_config
 # --- EBL imports
 import eblstud.ebl.tau_from_model as TAU
 from eblstud.misc.bin_energies import calc_bin_bounds
@@ -40,6 +49,76 @@ logging.basicConfig(level = logging.DEBUG)
 # - Chi functions --------------------------------------------------------------------------- #
 errfunc = lambda func, p, x, y, s: (func(p, x)-y) / s
 
+# - Worker functions for minos and profile ---------------------------------------------------- #
+# chi^2 function, gradient, and minuit arguments of the best fit of the worker process.
+# The workers are started with fork, so that each worker holds its own copy of the fit instance.
+_worker = {}
+
+def _init_worker(fcn, grad, fitarg, setup):
+    """Initialize the fit state of a worker process"""
+    _worker.clear()
+    _worker.update({'fcn': fcn, 'grad': grad, 'fitarg': fitarg, 'setup': setup})
+    return
+
+def _minuit_worker(**kwargs):
+    """
+    Minuit instance of the worker process, minimized starting from the best fit
+
+    kwargs
+    ------
+    minuit arguments that replace the ones of the best fit, e.g. to fix a parameter
+    """
+    fitarg = dict(_worker['fitarg'])
+    fitarg.update(kwargs)
+    m = minuit.Minuit(_worker['fcn'], grad = _worker['grad'], print_level = 0,
+		    pedantic = False, errordef = _worker['setup']['up'], **fitarg)
+    m.tol	= _worker['setup']['tol']
+    m.strategy	= _worker['setup']['strategy']
+    m.migrad(ncall = _worker['setup']['ncall'])
+    return m
+
+def minos_error(m, k, conf):
+    """
+    Minos error of one parameter, invalid errors are set to zero
+
+    Parameters
+    ----------
+    m:		minuit instance at the best fit
+    k:		string, parameter name
+    conf:	float, confidence level in sigma
+
+    Returns
+    -------
+    tuple with lower and upper error
+    """
+    t = m.minos(k,conf)
+    return (t[k]['lower'] if t[k]['lower_valid'] else 0.), (t[k]['upper'] if t[k]['upper_valid'] else 0.)
+
+def _minos_worker(args):
+    """Minos error of parameter args[0] for confidence level args[1]"""
+    k, conf = args
+    return minos_error(_minuit_worker(), k, conf)
+
+def _profile_worker(args):
+    """
+    Minimum chi^2 over all other parameters for fixed values of one parameter
+
+    Parameters
+    ----------
+    args:	tuple with parameter name and array with parameter values
+
+    Returns
+    -------
+    tuple with lists of the chi^2 values and of the migrad status
+    """
+    k, x = args
+    fval, status = [], []
+    for xi in x:
+	m = _minuit_worker(**{k: xi, 'fix_' + k: True})
+	fval.append(m.fval)
+	status.append(m.migrad_ok())
+    return fval, status
+
 # ------------------------------------------------------------------------------------------- #
 # - Init the class -------------------------------------------------------------------------- #
 # ------------------------------------------------------------------------------------------- #
@@ -66,6 +145,11 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 
 	func:		Function that describes the observed spectrum and takes x and pobs as parameters, y = func(x,pobs)
 	pobs:		parameters for function
+	surrogate:	PhotALPsConv.pgg_table.PggTable instance or path to a saved table. If given, 
+			the bin averaged photon survival probability is interpolated from the table 
+			instead of being calculated in each chi^2 evaluation. The grid parameters of the table
+			have to be fit parameters and all other parameters have to match the fixed 
+			configuration of the table. default: 'None'
 
 	and all kwargs from PhotALPsConv.calc_conversion.Calc_Conv.
 
@@ -76,6 +160,7 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 # --------------------
 	kwargs.setdefault('nE',30)
 	kwargs.setdefault('Esteps',50)
+	kwargs.setdefault('surrogate','None')
 # --------------------
 
 	for k in kwargs.keys():
@@ -100,6 +185,26 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 	if bins == None or not len(bins) == x.shape[0] + 1:
 	    self.bins = calc_bin_bounds(x)
 
+	if isinstance(self.surrogate, str) and not self.surrogate == 'None':
+	    self.surrogate = load_pgg_table(self.surrogate)
+	if not self.surrogate == 'None':
+	    if not self.surrogate.bins.shape == self.bins.shape or not np.allclose(self.surrogate.bins, self.bins * 1e3):
+		raise ValueError("Bins of Pgg table do not match the bins of the spectrum")
+	    if 'ICM' in self.scenario:
+		fitpar = ['B','r_abell','Lcoh','g','m','n']
+	    else:
+		fitpar = ['Rmax','Bjet','g','m','njet']
+	    missing = [k for k in self.surrogate.names if not k in fitpar]
+	    if len(missing):
+		raise ValueError("Grid parameters {0} of Pgg table are not fit parameters".format(missing))
+	    if not len(self.surrogate.config):
+		logging.warning("Pgg table does not contain its configuration, it cannot be checked")
+	    config = plain_config(self.kwargs)
+	    diff = [k for k,v in self.surrogate.config.items() if k in config and not k in self.surrogate.names and not config[k] == v]
+	    if len(diff):
+		raise ValueError("Pgg table was calculated for different parameters: {0}".format(
+		    ', '.join(['{0:s} = {1} (fit: {2})'.format(k,self.surrogate.config[k],config[k]) for k in sorted(diff)])))
+
 # --- create 2-dim energy and tau arrays to compute average mixing in each energy bin
 	for i,E in enumerate(self.bins):
 	    if not i:
@@ -116,6 +221,21 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 
 	return
 
+    def update_alp_params(self, **alppar):
+	"""
+	Update the ALP and B-field parameters of the fit. The parameters are passed to update_params_all 
+	together with all other parameters, so that only the B-field environments that depend on them 
+	are updated and their cached transfer matrices are removed.
+
+	kwargs
+	------
+	parameters with new values, e.g. g, m, B, or Bjet
+	"""
+	kwargs = dict(self.kwargs)
+	kwargs.update(alppar)
+	self.update_params_all(new_init = False, **kwargs)
+	return
+
 # ----------------------------------------------------------------------------- #
 # ---- Chi square functions --------------------------------------------------- #
 # ----------------------------------------------------------------------------- #
@@ -143,15 +263,13 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 
 	params = {'Prefactor': Prefactor, 'Index': Index, 'Scale': Scale}
 
+	# if a surrogate table is given, interpolate the average correction
+	if not self.surrogate == 'None':
+	    self.PggAve = self.surrogate(Rmax = Rmax, Bjet = Bjet, g = g, m = m, njet = njet)
 	# if any ALP parameters have changed, re-calculate the average correction
-	if self.init or not g == self.g or not m == self.m or not Bjet == self.Bjet or not njet == self.njet or not Rmax == self.Rmax:
+	elif self.init or not g == self.g or not m == self.m or not Bjet == self.Bjet or not njet == self.njet or not Rmax == self.Rmax:
 	    alppar = {'Rmax': Rmax, 'Bjet': Bjet, 'g': g, 'm': m, 'njet': njet, 'R_BLR': self.R_BLR}
-	    self.update_params_Jet(**alppar)		# get the new params.
-	    self.g = g
-	    self.m = m
-	    self.Bjet = Bjet
-	    self.njet = njet
-	    self.Rmax = Rmax
+	    self.update_alp_params(**alppar)		# get the new params.
 	# --- calculate the new deabsorbed data points
 	    #self.PggAve = self.calc_PggAve(Esteps = self.Esteps)
 	    self.PggAve = self.calc_pggave_conversion(self.bins *1e3, self.func, self.pobs, Esteps = self.Esteps)
@@ -195,16 +313,17 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 	if np.isscalar(self.B):
 	    self.B = np.ones(self.Nd) * self.B
 
+	# if a surrogate table is given, interpolate the average correction
+	if not self.surrogate == 'None':
+	    self.PggAve = self.surrogate(r_abell = r_abell, B = B, g = np.exp(g), m = m, n = n, Lcoh = Lcoh)
 	#if self.init or not g == self.g or not m == self.m or not B == self.B[0] or not n == self.n[0] \
-	if self.init or not np.exp(g) == self.g or not m == self.m or not B == self.B[0] or not n == self.n[0] \
+	elif self.init or not np.exp(g) == self.g or not m == self.m or not B == self.B[0] or not n == self.n[0] \
 	    or not r_abell == self.r_abell or not Lcoh == self.Lcoh:
 	    alppar = {'r_abell': r_abell, 'B': B, 'g': np.exp(g), 'm': m, 'n': n, 'Lcoh': Lcoh}
 	    #alppar = {'r_abell': r_abell, 'B': B, 'g': g, 'm': m, 'n': n, 'Lcoh': self.Lcoh}
-	    self.update_params(**alppar)		# get the new params.
-	    self.kwargs.update(alppar)
+	    self.update_alp_params(**alppar)		# get the new params.
 # --- calculate the new deabsorbed data points
 	    self.PggAve = self.calc_pggave_conversion(self.bins *1e3, self.func, self.pobs, Esteps = self.Esteps, new_angles = False)
-	    self.update_params(**alppar)		# B,n,L changed to GMF calc. With this call, they are restored to the ICM values.
 	    if self.init:
 		self.init = False
 
@@ -213,6 +332,40 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 	logging.debug("{0}".format(self.PggAve))
 	return np.sum(errfunc(pl,params,self.x,self.y / self.PggAve, self.yerr / self.PggAve)**2.)
 
+    def __FillGrad_ICMGMF(self,Prefactor,Index,Scale,B,r_abell,Lcoh,g,m,n):
+	"""
+	Calculate the gradient of the chi^2 value for ALP conversion in ICM and GMF 
+	from the derivatives of the bin averaged photon survival probability. 
+	Derivatives with respect to r_abell and Lcoh are not available, these parameters have to be fixed.
+
+	Parameters
+	----------
+	see __FillChiSq_ICMGMF
+
+	Returns
+	-------
+	list with the derivatives of the chi^2 value with respect to all parameters
+	"""
+	self.__FillChiSq_ICMGMF(Prefactor,Index,Scale,B,r_abell,Lcoh,g,m,n)	# updates the ALP parameters and PggAve if they have changed
+	if not self.dPggAve_par == [B,r_abell,Lcoh,g,m,n]:
+	    self.PggAve,self.dPggAve = self.calc_pggave_gradient(self.bins *1e3, self.func, self.pobs, Esteps = self.Esteps)
+	    self.dPggAve_par = [B,r_abell,Lcoh,g,m,n]
+
+	params = {'Prefactor': Prefactor, 'Index': Index, 'Scale': Scale}
+	f	= pl(params,self.x)
+	chi	= errfunc(pl,params,self.x,self.y / self.PggAve, self.yerr / self.PggAve)
+	dchisq	= lambda df: np.sum(2. * chi * df / self.yerr)	# derivative of chi^2 for a derivative df of the model f * PggAve
+
+	return [dchisq(f * self.PggAve / Prefactor),
+		dchisq(f * self.PggAve * np.log(self.x / Scale)),
+		dchisq(-1. * f * self.PggAve * Index / Scale),
+		dchisq(f * self.dPggAve['B']) / B,
+		0.,
+		0.,
+		dchisq(f * self.dPggAve['g']),		# g is the logarithm of the coupling
+		dchisq(f * self.dPggAve['m']) / m,
+		dchisq(f * self.dPggAve['n']) / n]
+
 # ----------------------------------------------------------------------------- #
 # ---- The fit function ------------------------------------------------------- #
 # ----------------------------------------------------------------------------- #
@@ -238,6 +391,13 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 	limits:		dictionary containing 2-tuple for all fit parameters
 	pinit:		dictionary with initial fit for all fit parameters
 	fix:		dictionary with booleans if parameter is frozen for all fit parameters
+	grad:		bool, if True, the analytic gradient of the chi^2 is passed to minuit, only for the ICM + GMF scenario
+			without surrogate table and strong mixing approximation and with fixed r_abell and Lcoh, default: False
+	nproc:		int, number of worker processes for minos and the chi^2 profile. Each worker starts 
+			from the best fit with its own copy of the fit instance, default: 1
+	store:		PhotALPsConv.fitstore.FitStore instance or path of the store directory. If given and pinit is not given,
+			the fit starts from the stored result of the same data with the nearest configuration (for the free 
+			parameters) and the result is stored after the fit, default: 'None'
 
 	Returns
 	-------
@@ -248,6 +408,8 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 	if full_output = True:
 	    3. dictionary with +/- 1 Sigma Minos errors
 	    4. dictionary with covariance matrix
+	if full_output = True and sample_chi2 > 0:
+	    5. tuple with parameter values, chi^2 values relative to their minimum, and migrad status of the profile
 
 	Notes
 	-----
@@ -267,6 +429,9 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 	kwargs.setdefault('pedantic',True)		# Give all warnings
 	kwargs.setdefault('limits',{})
 	kwargs.setdefault('pinit',{})
+	kwargs.setdefault('grad',False)
+	kwargs.setdefault('nproc',1)
+	kwargs.setdefault('store','None')
 	try:
 	    self.scenario.index('Jet')
 	    kwargs.setdefault('fix',{'Prefactor': False,'Scale': True,'Index': False,'g': False,'m': True,'njet':True ,'Bjet': True,'Rmax': True})	
@@ -279,6 +444,21 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 	    pass
 # --------------------
 	self.init = True	# first function call to FillChiSq
+	config = dict(self.kwargs)	# configuration before the fit, self.kwargs are updated in FillChiSq
+
+	if kwargs['grad']:
+	    if not 'ICM' in self.scenario or not self.surrogate == 'None':
+		raise ValueError("Analytic gradient is only available for the ICM + GMF scenario without surrogate table")
+	    if self.strong_mixing:
+		raise ValueError("Analytic gradient is not available for the strong mixing approximation")
+	    if not kwargs['fix']['r_abell'] or not kwargs['fix']['Lcoh']:
+		raise ValueError("Analytic gradient is not available for r_abell and Lcoh, they have to be fixed")
+	if not self.surrogate == 'None':
+	    free = [k for k in kwargs['fix'].keys() if not kwargs['fix'][k] and not k in ['Prefactor','Index','Scale']]
+	    missing = [k for k in free if not k in self.surrogate.names]
+	    if len(missing):
+		raise ValueError("Free parameters {0} are not grid parameters of the Pgg table".format(missing))
+	self.dPggAve_par = []	# ALP parameters of the last gradient calculation
 
 
 	if not len(kwargs['limits']):
@@ -302,10 +482,44 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 		pass
 
 
+	# the fit parameters are limited to the range of the Pgg table
+	if not self.surrogate == 'None':
+	    for k,a in zip(self.surrogate.names,self.surrogate.axes):
+		if kwargs['fix'][k]:
+		    if not a[0] <= self.kwargs[k] <= a[-1]:
+			raise ValueError("Fixed parameter {0:s} = {1} is outside the range of the Pgg table".format(k,self.kwargs[k]))
+		    continue
+		lim = kwargs['limits'].get(k,(a[0],a[-1]))
+		kwargs['limits'][k] = (max(lim[0],a[0]),min(lim[1],a[-1]))
+
+	if isinstance(kwargs['store'], str) and not kwargs['store'] == 'None':
+	    kwargs['store'] = FitStore(kwargs['store'])
+	data = self.x, self.y * 10.**self.exp, self.yerr * 10.**self.exp, self.bins
+
+	if 'ICM' in self.scenario:
+	    start = dict([(k,getattr(self,k)) for k in ['g','m','B','r_abell','Lcoh','n']])
+	else:
+	    start = dict([(k,getattr(self,k)) for k in ['g','m','Bjet','Rmax','njet']])
+
+	if not len(kwargs['pinit']) and not kwargs['store'] == 'None':
+	    stored, dist = kwargs['store'].nearest(*(data + (config,)))
+	    if not stored == None:
+		logging.info("PL Jet GMF: Starting from stored fit result, distance of configuration: {0:.3e}".format(dist))
+		kwargs['pinit'] = dict([(k,stored['values'][k]) for k in ['Prefactor','Index','Scale']])
+		for k in start.keys():
+		    if kwargs['fix'][k]:
+			continue
+		    start[k] = stored['values'][k]
+		    if k == 'g' and 'ICM' in self.scenario:	# fit parameter is the logarithm of the coupling
+			start[k] = np.exp(start[k])
+
 	if not len(kwargs['pinit']):
-	    cc = CC.Calc_Conv(**self.kwargs)		# has to be used here instead of self in order not to change self.kwargs
-	    Pgg = cc.calc_pggave_conversion(self.bins *1e3, self.func, self.pobs, Esteps = self.Esteps, new_angles = False)
-	    del cc
+	    if not self.surrogate == 'None':
+		Pgg = self.surrogate(**self.kwargs)
+	    else:
+		cc = CC.Calc_Conv(**self.kwargs)		# has to be used here instead of self in order not to change self.kwargs
+		Pgg = cc.calc_pggave_conversion(self.bins *1e3, self.func, self.pobs, Esteps = self.Esteps, new_angles = False)
+		del cc
 	    kwargs['pinit']['Scale']	= self.x[np.argmax(self.y/self.yerr)]
 	    kwargs['pinit']['Prefactor']= prior_norm(self.x / kwargs['pinit']['Scale'],self.y / Pgg)
 	    kwargs['pinit']['Index']	= prior_pl_ind(self.x / kwargs['pinit']['Scale'],self.y / Pgg)
@@ -328,11 +542,11 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 			    Prefactor	= kwargs['pinit']["Prefactor"],
 			    Index = kwargs['pinit']["Index"],
 			    Scale = kwargs['pinit']["Scale"],
-			    g = self.g,
-			    m = self.m,
-			    Bjet = self.Bjet,
-			    Rmax = self.Rmax,
-			    njet = self.njet,
+			    g = start['g'],
+			    m = start['m'],
+			    Bjet = start['Bjet'],
+			    Rmax = start['Rmax'],
+			    njet = start['njet'],
 			    # --- errors
 			    error_Prefactor	= kwargs['pinit']['Prefactor'] * kwargs['int_steps'],
 			    error_Index		= kwargs['pinit']['Index'] * kwargs['int_steps'],
@@ -369,17 +583,18 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 	try:
 	    self.scenario.index('ICM')
 	    m = minuit.Minuit(self.__FillChiSq_ICMGMF, print_level = kwargs['print_level'],
+			    grad = self.__FillGrad_ICMGMF if kwargs['grad'] else None,
 			    # --- initial values
 			    Prefactor	= kwargs['pinit']["Prefactor"],
 			    Index = kwargs['pinit']["Index"],
 			    Scale = kwargs['pinit']["Scale"],
-			    g = np.log(self.g),
+			    g = np.log(start['g']),
 			    #g = self.g,
-			    m = self.m,
-			    B = self.B,
-			    r_abell = self.r_abell,
-			    Lcoh = self.Lcoh,
-			    n = self.n,
+			    m = start['m'],
+			    B = start['B'],
+			    r_abell = start['r_abell'],
+			    Lcoh = start['Lcoh'],
+			    n = start['n'],
 			    # --- errors
 			    error_Prefactor	= kwargs['pinit']['Prefactor'] * kwargs['int_steps'],
 			    error_Index		= kwargs['pinit']['Index'] * kwargs['int_steps'],
@@ -440,7 +655,7 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 	logging.info("PL Jet GMF: Hesse matrix calculation finished")
 
 	if kwargs['full_output']:
-	    merr = {}
+	    minos_tasks = []
 	    for k in kwargs['fix'].keys():
 		if kwargs['fix'][k]:
 		    continue
@@ -448,49 +663,66 @@ class Fit_JetICMGMF(CC.Calc_Conv):
 		    if not k == kwargs['minos_only']:
 			continue
 		if np.isscalar(kwargs['minos_conf']):
-		    logging.info("PL Jet GMF: Running Minos for error estimation for parameter {0:s} at confidence level {1:.1f}".format(k,kwargs['minos_conf']))
-		    t = m.minos(k,kwargs['minos_conf'])
-		    if t['g']['lower_valid']:
-			merr[(k,-1. * kwargs['minos_conf'])] = t['g']['lower']
-		    else:
-			merr[(k,-1. * kwargs['minos_conf'])] = 0.
-		    if t['g']['upper_valid']:
-			merr[(k,kwargs['minos_conf'])] = t['g']['upper']
-		    else:
-			merr[(k,kwargs['minos_conf'])] = 0.
-		    del t
+		    minos_tasks.append((k,kwargs['minos_conf']))
 		else:
 		    for i in kwargs['minos_conf']:
-			logging.info("PL Jet GMF: Running Minos for error estimation for parameter {0:s} at confidence level {1:.1f}".format(k,i))
-			t = m.minos(k,i)
-			if t['g']['lower_valid']:
-			    merr[(k,-1. * i )] = t['g']['lower']
-			else:
-			    merr[(k,-1. * i )] = 0.
-			if t['g']['upper_valid']:
-			    merr[(k,i )] = t['g']['upper']
-			else:
-			    merr[(k,i )] = 0.
-			del t
-	    logging.info("PL_JetGMF: Minos finished")
-	if kwargs['sample_chi2'] and not kwargs['minos_only'] == 'None' and kwargs['full_output']:
-	    #self.kwargs.update(m.fitarg)
-	    #self.update_params_all(**self.kwargs)
-	    #print m.fitarg
-	    profile = m.mnprofile(kwargs['minos_only'],bins = kwargs['sample_chi2'], bound = 3, subtract_min = True)
+			minos_tasks.append((k,i))
+	    sample_chi2 = kwargs['sample_chi2'] and not kwargs['minos_only'] == 'None'
+
+	    pool = None
+	    if kwargs['nproc'] > 1:
+		try:
+		    self.scenario.index('Jet')
+		    fcn, grad = self.__FillChiSq_JetGMF, None
+		except ValueError:
+		    fcn, grad = self.__FillChiSq_ICMGMF, self.__FillGrad_ICMGMF if kwargs['grad'] else None
+		pool = Pool(kwargs['nproc'], initializer = _init_worker,
+			initargs = (fcn, grad, m.fitarg, dict([(k,kwargs[k]) for k in ['up','tol','strategy','ncall']])))
+	    try:
+		logging.info("PL Jet GMF: Running Minos for error estimation for parameter(s) {0} at confidence level(s) {1}".format(
+		    sorted(set([t[0] for t in minos_tasks])), sorted(set([t[1] for t in minos_tasks]))))
+		if pool == None:
+		    result = [minos_error(m,k,i) for k,i in minos_tasks]
+		else:
+		    result = pool.map(_minos_worker, minos_tasks)
+		merr = {}
+		for (k,i),(lower,upper) in zip(minos_tasks,result):
+		    merr[(k,-1. * i)]	= lower
+		    merr[(k,i)]		= upper
+		logging.info("PL_JetGMF: Minos finished")
+
+		if sample_chi2:
+		    if pool == None:
+			profile = m.mnprofile(kwargs['minos_only'],bins = kwargs['sample_chi2'], bound = 3, subtract_min = True)
+		    else:
+			k = kwargs['minos_only']
+			x = np.linspace(m.values[k] - 3. * m.errors[k], m.values[k] + 3. * m.errors[k], kwargs['sample_chi2'])
+			result = pool.map(_profile_worker, [(k,xi) for xi in np.array_split(x,kwargs['nproc'])])
+			y = np.concatenate([r[0] for r in result])
+			profile = x, y - y.min(), np.concatenate([r[1] for r in result]).astype(np.bool)
+	    finally:
+		if not pool == None:
+		    pool.terminate()
 
 	fit_stat = m.fval, float(len(self.x) - npar), pvalue(float(len(self.x) - npar), m.fval)
 
+	if not kwargs['store'] == 'None':
+	    m.fcn(*m.args)	# PggAve at the best fit, minos and profile evaluate other parameters
 
 	m.values['Prefactor'] *= 10.**self.exp
 	m.errors['Prefactor'] *= 10.**self.exp
 
+	for k in kwargs['limits'].keys():
+	    if kwargs['fix'][k]:
+		continue
+	    m.covariance[k,'Prefactor'] *= 10.**self.exp 
+	    m.covariance['Prefactor',k] *= 10.**self.exp 
+
+	if not kwargs['store'] == 'None':
+	    kwargs['store'].save(*(data + (config, {'fit_stat': fit_stat, 'values': dict(m.values), 'errors': dict(m.errors), 
+				'covariance': dict(m.covariance), 'PggAve': np.array(self.PggAve)})))
+
 	if kwargs['full_output']:
-	    for k in kwargs['limits'].keys():
-		if kwargs['fix'][k]:
-		    continue
-		m.covariance[k,'Prefactor'] *= 10.**self.exp 
-		m.covariance['Prefactor',k] *= 10.**self.exp 
 	    if kwargs['sample_chi2']:
 		return fit_stat,m.values, m.errors,merr, m.covariance, profile
 	    else:
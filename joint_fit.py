@@ -0,0 +1,280 @@
+"""
+Module for a joint fit of the photon-ALP coupling and the ALP mass to the spectra of several sources.
+
+The chi^2 values of all sources are summed. The intrinsic spectrum of each source is a power law
+whose normalization and index are profiled for each value of g and m: for a fixed index, the chi^2
+is quadratic in the normalization, which is therefore calculated analytically, and the index is found
+with a bounded one-dimensional minimization. The outer minimization with iminuit only varies g and m.
+
+The sources are evaluated on a pool of worker processes. Within a process, all sources share the
+loaded EBL models (see PhotALPsConv.conversion.load_ebl_model) and the B field along the lines of
+sight through the GMF (see PhotALPsConv.conversion_GMF.clear_los_cache), and the B-field realization
+of each source is kept fixed during the fit.
+
+Usage:
+> sources = [{'x': x1, 'y': y1, 's': s1, 'z': 0.1, 'ra': 10., 'dec': 20.}, {'x': x2, 'y': y2, 's': s2, 'z': 0.2, 'ra': 50., 'dec': -5.}]
+> jf = JointFit(sources, nproc = 4, scenario = ['ICM','GMF'], B = 1., n = 1., Lcoh = 10.)
+> fit_stat, values, errors, nuisance = jf.fit()
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import iminuit as minuit
+import logging
+from multiprocessing import Pool
+from scipy.optimize import minimize_scalar
+from eblstud.tools.lsq_fit import pvalue
+from eblstud.misc.bin_energies import calc_bin_bounds
+from eblstud.tools.iminuit_fit import pl
+# --- ALP imports
+import PhotALPsConv.calc_conversion as CC
+# ------------------------ #
+
+def profile_pl(x, y, s, Scale, limits = (-10.,2.)):
+    """
+    Minimize the chi^2 of the power law y = Prefactor * (x / Scale) ** Index over Prefactor and Index.
+    For a fixed index, the minimum over the prefactor is given analytically.
+
+    Parameters
+    ----------
+    x:		n-dim array, energies
+    y:		n-dim array, fluxes
+    s:		n-dim array, uncertainties of the fluxes
+    Scale:	float, pivot energy
+
+    kwargs
+    ------
+    limits:	2-tuple, limits of the index, default: (-10.,2.)
+
+    Returns
+    -------
+    tuple with minimum chi^2, Prefactor, and Index
+    """
+    w = 1. / s**2.
+
+    def chisq(Index):
+	f = (x / Scale) ** Index
+	return np.sum(w * y**2.) - np.sum(w * f * y)**2. / np.sum(w * f**2.)
+
+    Index	= minimize_scalar(chisq, bounds = limits, method = 'bounded').x
+    f		= (x / Scale) ** Index
+    return chisq(Index), np.sum(w * f * y) / np.sum(w * f**2.), Index
+
+# sources of the worker process, the Calc_Conv instance of a source is
+# created when the source is evaluated for the first time
+_sources	= None
+_cc		= {}
+
+def _init_worker(sources):
+    """Initialize the sources of a worker process"""
+    global _sources
+    _sources = sources
+    _cc.clear()
+    return
+
+def _calc_source(args):
+    """
+    Calculate the chi^2 of one source profiled over the power-law parameters
+
+    Parameters
+    ----------
+    args:	tuple with source number, g, and m
+
+    Returns
+    -------
+    tuple with source number, chi^2, Prefactor, and Index
+    """
+    i, g, m = args
+    src = _sources[i]
+    if not i in _cc:
+	np.random.seed(src['seed'])
+	_cc[i] = CC.Calc_Conv(**src['kwargs'])
+    cc = _cc[i]
+
+    kwargs = dict(src['kwargs'])
+    kwargs.update({'g': g, 'm': m})
+    cc.update_params_all(new_init = False, **kwargs)
+    Pgg = cc.calc_pggave_conversion(src['bins'] * 1e3, src['func'], src['pobs'], new_angles = False, **src['pgg_kwargs'])
+    return (i,) + profile_pl(src['x'], src['y'] / Pgg, src['s'] / Pgg, src['Scale'], limits = src['index_limits'])
+
+class JointFit(object):
+    """
+    Class for a joint fit of g and m to the spectra of several sources
+
+    Attributes
+    ----------
+    sources:	list with a dictionary for each source with the data x, y, s, bins, the pivot energy Scale,
+		and the kwargs of its PhotALPsConv.calc_conversion.Calc_Conv instance
+    nproc:	int, number of worker processes
+    nuisance:	list with a dictionary for each source with the profiled Prefactor, Index, Scale,
+		and the chi^2 at the last evaluation
+    """
+    def __init__(self, sources, nproc = 1, seed = 0, **kwargs):
+	"""
+	Init the joint fit
+
+	Parameters
+	----------
+	sources:	list with a dictionary for each source with the entries
+			x:	n-dim array with energies in TeV
+			y:	n-dim array with fluxes
+			s:	n-dim array with (symmetric) uncertainties of the fluxes
+			and optionally
+			bins:	n+1-dim array with bin boundaries in TeV, if not given, computed from x
+			func, pobs:	function and parameters used for averaging Pgg over the bins, see
+					PhotALPsConv.calc_conversion.Calc_Conv.calc_pggave_conversion
+			and all kwargs of PhotALPsConv.calc_conversion.Calc_Conv that differ between the sources, e.g. z, ra, dec
+
+	kwargs
+	------
+	nproc:		int, number of worker processes, default: 1
+	seed:		int, the B-field realization of source i is drawn with the random seed seed + i, default: 0
+	func:		function used for averaging Pgg over the bins if it is not given for a source.
+			Has to be called with func(pobs,E), default: power law
+	pobs:		parameters of func, default: power law with index -2
+	index_limits:	2-tuple, limits of the power-law indices, default: (-10.,2.)
+	pgg_kwargs:	dictionary with kwargs for PhotALPsConv.calc_conversion.Calc_Conv.calc_pggave_conversion,
+			e.g. Esteps or mode, default: {}
+	and all kwargs of PhotALPsConv.calc_conversion.Calc_Conv that are shared by all sources.
+
+	Notes
+	-----
+	If nproc > 1, the workers are started with fork, so that func does not need to be picklable.
+	"""
+	kwargs.setdefault('func',pl)
+	kwargs.setdefault('pobs',{'Prefactor': 1., 'Index': -2., 'Scale': 1.})
+	kwargs.setdefault('index_limits',(-10.,2.))
+	kwargs.setdefault('pgg_kwargs',{})
+
+	fitpar = dict([(k,kwargs.pop(k)) for k in ['func','pobs','index_limits','pgg_kwargs']])
+
+	self.nproc	= nproc
+	self.kwargs	= kwargs
+	self.sources	= []
+	for i,src in enumerate(sources):
+	    src = dict(src)
+	    x,y,s	= np.array(src.pop('x')),np.array(src.pop('y')),np.array(src.pop('s'))
+	    if not x.shape == y.shape or not x.shape == s.shape:
+		raise TypeError("Arrays of source {0:n} must have same length!".format(i))
+	    bins	= src.pop('bins',None)
+	    if bins is None or not len(bins) == x.shape[0] + 1:
+		bins	= calc_bin_bounds(x)
+	    source	= {'x': x, 'y': y, 's': s, 'bins': np.array(bins), 'Scale': x[np.argmax(y/s)], 'seed': seed + i}
+	    for k in fitpar.keys():
+		source[k] = src.pop(k,fitpar[k])
+	    source['kwargs'] = dict(kwargs)
+	    source['kwargs'].update(src)
+	    self.sources.append(source)
+
+	self.nuisance	= [{} for src in self.sources]
+	self.pool	= None
+	return
+
+    def chisq(self, g, m):
+	"""
+	Summed chi^2 of all sources, profiled over the power-law parameters of each source,
+	which are stored in self.nuisance
+
+	Parameters
+	----------
+	g:	float, photon-ALP coupling constant, in 10^-11 GeV^-1
+	m:	float, ALP mass in neV
+
+	Returns
+	-------
+	float, chi^2 value
+	"""
+	tasks = [(i,g,m) for i in range(len(self.sources))]
+	if self.pool == None:
+	    if not _sources is self.sources:
+		_init_worker(self.sources)
+	    result = map(_calc_source, tasks)
+	else:
+	    result = self.pool.map(_calc_source, tasks)
+
+	for i,chi2,Prefactor,Index in result:
+	    self.nuisance[i] = {'Prefactor': Prefactor, 'Index': Index, 'Scale': self.sources[i]['Scale'], 'chisq': chi2}
+	logging.debug("g = {0}, m = {1}, chi^2 = {2}".format(g, m, np.sum([r[1] for r in result])))
+	return np.sum([r[1] for r in result])
+
+    def __FillChiSq(self, g, m):
+	return self.chisq(g, m)
+
+    def fit(self, **kwargs):
+	"""
+	Fit g and m to the spectra of all sources
+
+	kwargs
+	-------
+	print_level:	0,1, level of verbosity, defualt = 0 means nothing is printed
+	int_steps:	float, initial step width, multiply with initial values of errors, default = 0.1
+	strategy:	0 = fast, 1 = default (default), 2 = thorough
+	tol:		float, required tolerance of fit = 0.001*tol*UP, default = 0.1
+	up		float, errordef, 1 (default) for chi^2, 0.5 for log-likelihood
+	ncall:		int, number of maximum calls, default = 1000
+	pedantic:	bool, if true (default), give all warnings
+	limits:		dictionary containing 2-tuple for g and m, default: g: (0.1,8.), m: (0.01,50.)
+	pinit:		dictionary with initial values for g and m, default: the values in the kwargs of the sources
+	fix:		dictionary with booleans if g or m is frozen, default: g free, m frozen
+
+	Returns
+	-------
+	tuple containing
+	    0. list of Fit Stats: ChiSq, Dof, P-value
+	    1. dictionary with final fit parameters
+	    2. dictionary with 1 Sigma errors of final fit parameters
+	    3. list with a dictionary for each source with the profiled Prefactor, Index, Scale, and chi^2 at the best fit
+	"""
+# --------------------
+	kwargs.setdefault('print_level',0)		# no output
+	kwargs.setdefault('int_steps',0.1)		# Initial step width, multiply with initial values in m.errors
+	kwargs.setdefault('strategy',1)		# 0 = fast, 1 = default, 2 = thorough
+	kwargs.setdefault('tol',0.1)			# Tolerance of fit = 0.001*tol*UP
+	kwargs.setdefault('up',1.)			# 1 for chi^2, 0.5 for log-likelihood
+	kwargs.setdefault('ncall',1000.)		# number of maximum calls
+	kwargs.setdefault('pedantic',True)		# Give all warnings
+	kwargs.setdefault('limits',{'g': (0.1,8.), 'm': (0.01,50.)})
+	kwargs.setdefault('pinit',{'g': self.kwargs.get('g',1.), 'm': self.kwargs.get('m',1.)})
+	kwargs.setdefault('fix',{'g': False, 'm': True})
+# --------------------
+
+	if self.nproc > 1:
+	    self.pool = Pool(self.nproc, initializer = _init_worker, initargs = (self.sources,))
+	try:
+	    m = minuit.Minuit(self.__FillChiSq, print_level = kwargs['print_level'],
+			    g = kwargs['pinit']['g'],
+			    m = kwargs['pinit']['m'],
+			    error_g = kwargs['pinit']['g'] * kwargs['int_steps'],
+			    error_m = kwargs['pinit']['m'] * kwargs['int_steps'],
+			    limit_g = kwargs['limits']['g'],
+			    limit_m = kwargs['limits']['m'],
+			    fix_g = kwargs['fix']['g'],
+			    fix_m = kwargs['fix']['m'],
+			    pedantic	= kwargs['pedantic'],
+			    errordef	= kwargs['up'],
+			    )
+	    m.tol	= kwargs['tol']
+	    m.strategy	= kwargs['strategy']
+
+	    m.migrad(ncall = kwargs['ncall'])
+	    logging.info("Joint fit: Migrad minimization finished")
+	    m.hesse()
+	    logging.info("Joint fit: Hesse matrix calculation finished")
+
+	    fval = self.chisq(m.values['g'], m.values['m'])	# nuisance parameters at the best fit
+	finally:
+	    if not self.pool == None:
+		self.pool.terminate()
+		self.pool = None
+
+	npar = 2 * len(self.sources) + len([k for k in kwargs['fix'] if not kwargs['fix'][k]])
+	dof = float(np.sum([src['x'].shape[0] for src in self.sources]) - npar)
+	fit_stat = fval, dof, pvalue(dof, fval)
+	return fit_stat, m.values, m.errors, [dict(n) for n in self.nuisance]
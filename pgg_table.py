@@ -0,0 +1,191 @@
+"""
+Module to tabulate the bin averaged photon survival probability on a grid
+of ALP and B-field parameters and to interpolate it as a fast surrogate
+for the calculation of the bin averaged photon survival probability in fits.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+- 10/18/2026: B-field realization is drawn after the parameter update, so that it does not depend on the previous grid point
+- 10/18/2026: the fixed configuration is stored with the table, grid parameters are clipped to the grid
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import logging
+import json
+from itertools import product
+from scipy.interpolate import RegularGridInterpolator
+from PhotALPsConv.fitstore import plain_config
+# ------------------------ #
+
+class PggTable(object):
+    """
+    Class to interpolate a table of bin averaged photon survival probabilities
+    that has been calculated for one fixed B-field realization.
+
+    Attributes
+    ----------
+    names:	list with the names of the grid parameters, e.g. ['g','m']
+    axes:	list with n-dim arrays with the grid values of each parameter
+    logaxes:	list with bools, if True, parameter is interpolated in log space
+    logPggAve:	(n_1 x ... x n_k x nbins)-dim array with log of bin averaged photon survival probability
+    bins:	(nbins+1)-dim array with bin boundaries in GeV
+    config:	dictionary with the fixed parameters of the table, i.e. the kwargs of 
+		PhotALPsConv.calc_conversion.Calc_Conv without the grid parameters, and the random seed
+    """
+    def __init__(self, names, axes, logPggAve, bins, logaxes = None, config = None):
+	"""
+	Init the interpolation of the photon survival probability table
+
+	Parameters
+	----------
+	names:		list with the names of the k grid parameters
+	axes:		list with k arrays with the (strictly increasing) grid values of the parameters
+	logPggAve:	(n_1 x ... x n_k x nbins)-dim array with log of bin averaged photon survival probability
+	bins:		(nbins+1)-dim array with bin boundaries in GeV
+
+	kwargs
+	------
+	logaxes:	list with k bools, if True, parameter is interpolated in log space.
+			default: True for all parameters with strictly positive grid values
+	config:		dictionary with the fixed parameters of the table, default: empty
+	"""
+	if not len(names) == len(axes):
+	    raise ValueError("Number of parameter names ({0:n}) and grid axes ({1:n}) has to be equal".format(len(names),len(axes)))
+
+	self.names	= list(names)
+	self.axes	= [np.array(a, dtype = np.float) for a in axes]
+	self.logPggAve	= np.array(logPggAve)
+	self.bins	= np.array(bins)
+
+	if not self.logPggAve.shape == tuple([a.shape[0] for a in self.axes]) + (self.bins.shape[0] - 1,):
+	    raise ValueError("Shape of table {0} does not match grid axes and bins".format(self.logPggAve.shape))
+
+	if logaxes == None:
+	    logaxes = [bool(np.all(a > 0.)) for a in self.axes]
+	self.logaxes = list(logaxes)
+	self.config = {} if config == None else dict(config)
+
+	points = [np.log(a) if l else a for a,l in zip(self.axes,self.logaxes)]
+	self.interp = RegularGridInterpolator(points, self.logPggAve)
+	return
+
+    def __call__(self, **kwargs):
+	"""
+	Interpolate the bin averaged photon survival probability
+
+	kwargs
+	------
+	values of all grid parameters, additional kwargs are ignored.
+	Values outside of the grid are set to the closest grid boundary.
+
+	Returns
+	-------
+	nbins-dim array with bin averaged photon survival probability
+	"""
+	point = []
+	for k,l in zip(self.names,self.logaxes):
+	    try:
+		x = kwargs[k]
+	    except KeyError:
+		raise KeyError("Value for grid parameter {0:s} is missing".format(k))
+	    x = np.clip(np.log(x) if l else x, self.interp.grid[len(point)][0], self.interp.grid[len(point)][-1])
+	    point.append(x)
+	return np.exp(self.interp(np.array(point))[0])
+
+    def save(self, filename):
+	"""
+	Save the table to a numpy .npz file
+
+	Parameters
+	----------
+	filename:	string, path to output file
+	"""
+	kwargs = {}
+	for i,a in enumerate(self.axes):
+	    kwargs['axis_{0:n}'.format(i)] = a
+	np.savez(filename,
+	    names	= np.array(self.names),
+	    logaxes	= np.array(self.logaxes),
+	    logPggAve	= self.logPggAve,
+	    bins	= self.bins,
+	    config	= np.array(json.dumps(self.config, default = float)),
+	    **kwargs
+	    )
+	return
+
+def load_pgg_table(filename):
+    """
+    Load a photon survival probability table from a numpy .npz file
+
+    Parameters
+    ----------
+    filename:	string, path to file written with PggTable.save
+
+    Returns
+    -------
+    PggTable instance
+    """
+    f = np.load(filename)
+    names = [str(k) for k in f['names']]
+    axes = [f['axis_{0:n}'.format(i)] for i in range(len(names))]
+    config = json.loads(str(f['config'])) if 'config' in f.files else {}
+    return PggTable(names, axes, f['logPggAve'], f['bins'], logaxes = list(f['logaxes']), config = config)
+
+def calc_pgg_table(bins, grid, func, pfunc, seed = 0, Esteps = 50, filename = 'None', **kwargs):
+    """
+    Calculate the bin averaged photon survival probability on a parameter grid
+
+    The same random B-field realization is used for all grid points by re-seeding the 
+    random number generator and drawing a complete realization after each parameter update,
+    see PhotALPsConv.pipeline.Pipeline.new_realization.
+
+    Parameters
+    ----------
+    bins:	(nbins+1)-dim array with bin boundaries in GeV
+    grid:	list of tuples (name, n-dim array) with the grid parameters and their values,
+		e.g. [('g', np.logspace(-1.,1.,20)), ('m', np.logspace(-1.,2.,30))]
+    func:	function used for averaging, has to be called with func(pfunc,E)
+    pfunc:	parameters for function
+
+    kwargs
+    ------
+    seed:	int, seed for random number generator that determines the B-field realization, default: 0
+    Esteps:	int, number of energies to interpolate photon survival probability, default: 50
+    filename:	string, if given, table is saved to this file
+    and all kwargs of PhotALPsConv.calc_conversion.Calc_Conv, which set the fixed parameters
+
+    Returns
+    -------
+    PggTable instance
+    """
+    import PhotALPsConv.calc_conversion as CC
+
+    names	= [g[0] for g in grid]
+    axes	= [np.array(g[1], dtype = np.float) for g in grid]
+    logPggAve	= np.zeros(tuple([a.shape[0] for a in axes]) + (len(bins) - 1,))
+
+    np.random.seed(seed)
+    cc = CC.Calc_Conv(**kwargs)
+    config = dict(cc.kwargs)
+
+    for idx in product(*[range(a.shape[0]) for a in axes]):
+	par = dict(config)
+	par.update(dict([(k,a[i]) for k,a,i in zip(names,axes,idx)]))
+
+	cc.update_params_all(**par)
+	np.random.seed(seed)
+	cc.pipeline.new_realization(cc)
+	logPggAve[idx] = np.log(cc.calc_pggave_conversion(bins, func = func, pfunc = pfunc, new_angles = False, Esteps = Esteps))
+	logging.debug("Pgg table: calculated grid point {0}".format(idx))
+
+    config = plain_config(dict([(k,v) for k,v in config.items() if not k in names]))
+    config['seed'] = seed
+    table = PggTable(names, axes, logPggAve, bins, config = config)
+    if not filename == 'None':
+	table.save(filename)
+    return table
@@ -0,0 +1,923 @@
+"""
+Module to compile the list of B-field environments (the scenario) into an ordered
+pipeline of stages with a common batched interface.
+
+The pipeline runs the stages in the order BLR, Jet, ICM, IGM (or the EBL attenuation
+if the IGM is not included) and GMF. The transfer matrices of adjacent stages are
+multiplied before they are applied to the polarization matrix, so that the polarization
+matrix is only transformed once per energy. Each stage declares the parameters its
+update function depends on, so that only stages with changed parameters are updated.
+The transfer matrices of stages without random B-field angles (Jet, GMF, and the EBL
+attenuation) are cached and reused for all B-field realizations.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+- 10/18/2026: cache for the transfer matrices of deterministic stages
+- 10/18/2026: random B-field realizations can be drawn in bulk and set from arrays
+- 10/18/2026: transfer matrices on a fine grid within energy bins from interpolated eigenvalues and eigenprojectors
+- 10/18/2026: mean over the random angles with averaged superoperators
+- 10/18/2026: derivatives of the probabilities with respect to g, m, B, and n for the ICM and GMF
+- 10/18/2026: new_realization draws a reproducible realization independent of the updated stages
+- 10/18/2026: the realization of a turbulent ICM field is given by its random numbers
+- 10/18/2026: transfer matrices of the jet are cached for all parameters of the jet
+- 10/18/2026: documented the random numbers drawn by new_realization compared to new_random
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import copy
+import time
+from PhotALPsConv.conversion import load_ebl_model
+from PhotALPsConv.tools import uniform
+from PhotALPsConv.binaverage import transfer_bin
+from PhotALPsConv.superop import superop_transfer,angle_average
+from PhotALPsConv.derivatives import product_derivative
+# ------------------------ #
+
+class Stage(object):
+    """
+    Base class for one B-field environment of the conversion calculation.
+    Stages do not hold any state, all parameters and matrices are attributes
+    of the Calc_Conv instance cc that is passed to every method.
+
+    Attributes
+    ----------
+    name:	string, name of the stage as used in the scenario list
+    kind:	string, 'matrix' if the stage is described by a 3x3 transfer matrix for each energy,
+		'attenuation' if the photon polarization states are multiplied with an absorption factor,
+		'final' if the stage acts on the diagonal polarization matrix after the read out
+    depends:	list with names of the parameters that are used by the update function of the stage
+    random:	bool, if True, the transfer matrices depend on random B-field angles
+    left:	bool, if True, the transfer matrices of the domains are multiplied from the left
+    angle:	string, name of the attribute of cc with the random angles of all domains, 'None' if the stage has no random angles
+    cache_params:	list with names of the parameters that are used by the transfer function,
+    			if random is False, the transfer matrices are cached as long as these parameters 
+			and the energies do not change and the stage is not updated
+    derivs:	list with names of the parameters p for which the stage provides the derivatives 
+		of its transfer matrices with respect to log(p), empty if derivatives are not implemented
+    """
+    name		= 'None'
+    kind		= 'matrix'
+    depends		= []
+    random		= False
+    left		= False
+    angle		= 'None'
+    cache_params	= []
+    derivs		= []
+
+    def update(self, cc, **kwargs):
+	"""Update the parameters of the stage and initialize its matrices"""
+	return
+
+    def new_random(self, cc, init = False):
+	"""Draw a new random B-field realization, init is True for the first realization"""
+	return
+
+    def fields(self, cc):
+	"""Names of the attributes of cc that hold the random B-field realization"""
+	return []
+
+    def draw_fields(self, cc, rng, nsim):
+	"""
+	Draw random B-field realizations in bulk
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	rng:	numpy Generator or RandomState instance
+	nsim:	int, number of realizations
+
+	Returns
+	-------
+	dictionary with a (nsim x Nd)-dim array for each name in fields(cc)
+	"""
+	return dict([(k,2. * np.pi * uniform(rng,(nsim,self.ndomains(cc)))) for k in self.fields(cc)])
+
+    def set_fields(self, cc, fields):
+	"""
+	Set the random B-field realization
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	fields:	dictionary with an Nd-dim array for each name in fields(cc)
+	"""
+	for k in self.fields(cc):
+	    if not fields[k].shape == (self.ndomains(cc),):
+		raise ValueError("Shape of {0:s} {1} does not match the {2:n} domains of the {3:s}".format(k,fields[k].shape,
+				    self.ndomains(cc),self.name))
+	    setattr(cc,k,np.array(fields[k],dtype = np.float))
+	return
+
+    def unitary(self, cc):
+	"""True if the transfer matrices of the stage are unitary, i.e. the stage has no absorption"""
+	return False
+
+    def ndomains(self, cc):
+	"""Number of domains of the stage"""
+	return 0
+
+    def domain_product(self, cc, E):
+	"""Transfer matrix of the stage for the energy E in GeV"""
+	raise NotImplementedError
+
+    def eigen(self, cc, E):
+	"""Matrices T1, T2, T3, eigenvalues, and domain lengths of all domains for the energy E in GeV"""
+	raise NotImplementedError
+
+    def domain_derivs(self, cc, E):
+	"""Transfer matrices of all domains for the energy E in GeV and a dictionary with their derivatives"""
+	raise NotImplementedError
+
+    def set_energies(self, cc, EGeV):
+	"""Prepare the calculation for all energies in the n-dim array EGeV"""
+	return
+
+    def transfer(self, cc, EGeV):
+	"""
+	Transfer matrices of the stage for all energies
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	EGeV:	n-dim array, energies in GeV
+
+	Returns
+	-------
+	(n x 3 x 3)-dim complex128 array with the transfer matrix for each energy
+	"""
+	T = np.empty((EGeV.shape[0],3,3), dtype = np.complex128)
+	for i,E in enumerate(EGeV):
+	    T[i] = self.domain_product(cc, E)
+	return T
+
+    def transfer_derivs(self, cc, EGeV):
+	"""
+	Transfer matrices of the stage for all energies and their derivatives with respect to log(p)
+	for all parameters p in self.derivs
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	EGeV:	n-dim array, energies in GeV
+
+	Returns
+	-------
+	tuple with (n x 3 x 3)-dim complex128 array with the transfer matrix for each energy 
+	and dictionary with the (n x 3 x 3)-dim derivatives
+	"""
+	Nd	= self.ndomains(cc)
+	Un	= np.empty((EGeV.shape[0],3,3,Nd), dtype = np.complex128)
+	dUn	= dict([(p,np.empty((EGeV.shape[0],3,3,Nd), dtype = np.complex128)) for p in self.derivs])
+	for i,E in enumerate(EGeV):
+	    Un[i],d = self.domain_derivs(cc, E)
+	    for p in self.derivs:
+		dUn[p][i] = d[p]
+	return product_derivative(Un, dUn, left = self.left)
+
+    def transfer_bins(self, cc, EGeV, dlogE, x):
+	"""
+	Transfer matrices of the stage on a fine grid of energies within energy bins,
+	see PhotALPsConv.binaverage.transfer_bin. 
+	The eigenvalues and matrices T1, T2, T3 are calculated at the center and the boundaries of each bin.
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	EGeV:	n-dim array, centers of the energy bins in log(E) in GeV
+	dlogE:	n-dim array, widths of the energy bins in log(E)
+	x:	m-dim array, positions of the grid points within the bins in units of the bin width, -0.5 <= x <= 0.5
+
+	Returns
+	-------
+	(n x m x 3 x 3)-dim complex128 array with the transfer matrices at the energies EGeV * exp(x * dlogE)
+	"""
+	U = np.empty((EGeV.shape[0],x.shape[0],3,3), dtype = np.complex128)
+	for i,E in enumerate(EGeV):
+	    eig = []
+	    for Ei in [E * np.exp(-0.5 * dlogE[i]), E, E * np.exp(0.5 * dlogE[i])]:
+		T,EW,L = self.eigen(cc, Ei)
+		eig.append(([Tk.copy() for Tk in T],EW,L))
+	    U[i] = transfer_bin(eig, x * dlogE[i], dlogE[i], left = self.left)
+	return U
+
+    def mean_superops(self, cc, EGeV):
+	"""
+	Superoperators of the stage for all energies averaged over the random angles of all domains,
+	see PhotALPsConv.superop.angle_average. The angles of the current realization are restored afterwards.
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	EGeV:	n-dim array, energies in GeV
+
+	Returns
+	-------
+	(n x 9 x 9)-dim complex128 array with the averaged superoperator for each energy
+	"""
+	psi	= getattr(cc,self.angle)
+	S	= np.empty((EGeV.shape[0],9,9), dtype = np.complex128)
+	for i,E in enumerate(EGeV):
+	    S[i] = angle_average(lambda: self.eigen(cc, E), lambda p: setattr(cc,self.angle,p), self.ndomains(cc), left = self.left)
+	setattr(cc,self.angle,psi)
+	return S
+
+class StageBLR(Stage):
+    """Mixing in the broad line region"""
+    name	= 'BLR'
+    depends	= ['R_BLR','L_BLR','n_BLR','B_BLR','Elines','Nlines','z','A','precision']
+    random	= True
+    angle	= 'Psin_BLR'
+
+    def update(self, cc, **kwargs):
+	cc.update_params_BLR(**kwargs)
+	return
+
+    def new_random(self, cc, init = False):
+	cc.new_random_psi_BLR()
+	return
+
+    def fields(self, cc):
+	return ['Psin_BLR']
+
+    def unitary(self, cc):
+	return not cc.A
+
+    def ndomains(self, cc):
+	return int(cc.Nd_BLR)
+
+    def domain_product(self, cc, E):
+	cc.E	= E
+	return cc.SetDomainN_BLR()
+
+    def eigen(self, cc, E):
+	cc.E	= E
+	return cc.EigenDomainN_BLR()
+
+class StageJet(Stage):
+    """Mixing in the AGN jet"""
+    name	= 'Jet'
+    depends	= ['R_BLR','Rmax','sens','pjet','sjet','Bjet','njet','Gamma','theta_jet','Psi','precision']
+    cache_params	= ['g','m','R_BLR','Rmax','sens','pjet','sjet','Bjet','njet','Gamma','theta_jet','Psi','precision']
+
+    def update(self, cc, **kwargs):
+	cc.update_params_Jet(**kwargs)
+	return
+
+    def unitary(self, cc):
+	return True
+
+    def ndomains(self, cc):
+	return int(cc.Nd_jet)
+
+    def domain_product(self, cc, E):
+	cc.E	= E
+	return cc.SetDomainN_Jet()
+
+    def eigen(self, cc, E):
+	cc.E	= E
+	return cc.EigenDomainN_Jet()
+
+class StageICM(Stage):
+    """Mixing in the intra cluster medium"""
+    name	= 'ICM'
+    depends	= ['B','n','Lcoh','r_abell','B_gauss','kL','kH','kMin','q','dkType','dkSteps',
+		    'Bn_const','r_core','beta','eta','n2','r_core2','beta2','precision']
+    random	= True
+    angle	= 'Psin'
+    derivs	= ['g','m','B','n']
+    state	= ['B','Lcoh','Nd','Psin','n']	# attributes that are overwritten by the GMF stage
+
+    def update(self, cc, **kwargs):
+	cc.update_params(**kwargs)
+	return
+
+    def new_random(self, cc, init = False):
+	if cc.B_gauss:
+	    if not init:
+		cc.new_B_n()
+	else:
+	    cc.new_random_psi()
+	return
+
+    def fields(self, cc):
+	# for a turbulent field, the random numbers of its two transverse components t and u are stored,
+	# so that B and Psin follow the current field parameters
+	if cc.B_gauss:
+	    return ['{0:s}_{1:s}'.format(k,c) for c in ['t','u'] for k in sorted(cc.bfield.random_numbers().keys())]
+	return ['Psin']
+
+    def draw_fields(self, cc, rng, nsim):
+	if not cc.B_gauss:
+	    return super(StageICM,self).draw_fields(cc, rng, nsim)
+	state	= cc.bfield.random_numbers()
+	fields	= dict([(k,[]) for k in self.fields(cc)])
+	for i in range(nsim):
+	    for c in ['t','u']:
+		cc.bfield.new_random_numbers(rng = rng)
+		for k,v in cc.bfield.random_numbers().items():
+		    fields['{0:s}_{1:s}'.format(k,c)].append(v)
+	cc.bfield.set_random_numbers(state)
+	return dict([(k,np.array(v)) for k,v in fields.items()])
+
+    def set_fields(self, cc, fields):
+	if not cc.B_gauss:
+	    return super(StageICM,self).set_fields(cc, fields)
+	numbers = [dict([(k,np.asarray(fields['{0:s}_{1:s}'.format(k,c)])) for k in cc.bfield.random_numbers().keys()]) for c in ['t','u']]
+	cc.new_B_n(numbers = numbers)
+	return
+
+    def unitary(self, cc):
+	return True
+
+    def ndomains(self, cc):
+	return int(cc.Nd)
+
+    def domain_product(self, cc, E):
+	cc.E	= E
+	return cc.SetDomainN()
+
+    def eigen(self, cc, E):
+	cc.E	= E
+	return cc.EigenDomainN()
+
+    def domain_derivs(self, cc, E):
+	cc.E	= E
+	return cc.DerivDomainN()
+
+    def save_state(self, cc):
+	"""Copy of the B-field realization of the ICM"""
+	return dict([(k,copy.copy(getattr(cc,k))) for k in self.state])
+
+    def restore_state(self, cc, state):
+	"""Restore the B-field realization of the ICM and its transfer matrix buffers"""
+	cc.__dict__.update(state)
+	cc.T1		= cc.ws.get('T1',(3,3,cc.Nd),cc.ctype, zero = True)	# Transfer matrices
+	cc.T2		= cc.ws.get('T2',(3,3,cc.Nd),cc.ctype, zero = True)
+	cc.T3		= cc.ws.get('T3',(3,3,cc.Nd),cc.ctype, zero = True)
+	cc.Un		= cc.ws.get('Un',(3,3,cc.Nd),cc.ctype)
+	return
+
+class StageIGM(Stage):
+    """Mixing in the intergalactic magnetic field including the EBL absorption"""
+    name	= 'IGM'
+    depends	= ['z','L0','B0','n0','ebl','filename','precision']
+    random	= True
+    left	= True
+    angle	= 'Psin_IGM'
+
+    def update(self, cc, **kwargs):
+	cc.update_params_IGM(**kwargs)
+	return
+
+    def new_random(self, cc, init = False):
+	cc.new_random_psi_IGM()
+	return
+
+    def fields(self, cc):
+	return ['Psin_IGM']
+
+    def ndomains(self, cc):
+	return int(cc.Nd_IGM)
+
+    def set_energies(self, cc, EGeV):
+	cc.set_energy_grid_IGM(EGeV)	# optical depth of all domains and energies
+	return
+
+    def transfer(self, cc, EGeV):
+	self.set_energies(cc, EGeV)
+	return super(StageIGM,self).transfer(cc, EGeV)
+
+    def domain_product(self, cc, E):
+	cc.E	= E
+	cc.E0	= E
+	return cc.SetDomainN_IGM()
+
+    def eigen(self, cc, E):
+	cc.E	= E
+	cc.E0	= E
+	return cc.EigenDomainN_IGM()
+
+class StageEBL(Stage):
+    """Absorption of photons on the EBL without mixing, used if the IGM is not included"""
+    name	= 'EBL'
+    kind	= 'attenuation'
+    depends	= ['ebl','filename']
+    cache_params	= ['z','ebl_norm']
+
+    def update(self, cc, **kwargs):
+	cc.tau = load_ebl_model(cc.ebl, filename = cc.filename)
+	return
+
+    def transfer(self, cc, EGeV):
+	"""
+	Photon survival probability due to the EBL
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	EGeV:	n-dim array, energies in GeV
+
+	Returns
+	-------
+	n-dim array with exp(-ebl_norm * tau)
+	"""
+	return np.array([np.exp(-1. * cc.ebl_norm * cc.tau.opt_depth(cc.z,E / 1e3)) for E in EGeV])
+
+class StageGMF(Stage):
+    """Mixing in the Galactic magnetic field"""
+    name	= 'GMF'
+    kind	= 'final'
+    depends	= ['model','model_sym','GMF_FitVal']
+    cache_params	= ['g','m','ra','dec','nGMF','int_steps','NE2001','NE2001file','galactic','rho_max','zmax','d','precision',
+		    'strong_mixing','strong_mixing_tol']
+    derivs	= ['g','m']
+
+    def update(self, cc, **kwargs):
+	cc.update_params_GMF(**kwargs)
+	return
+
+    def ndomains(self, cc):
+	return int(cc.int_steps)
+
+    def transfer(self, cc, EGeV):
+	"""
+	Transfer matrices of the GMF for all energies. The B field, density, and angles of
+	the ICM are overwritten by the GMF calculation, they are restored afterwards.
+	"""
+	if 'ICM' in cc.pipeline:
+	    state = cc.pipeline['ICM'].save_state(cc)
+	T = np.empty((EGeV.shape[0],3,3), dtype = np.complex128)
+	for i,E in enumerate(EGeV):
+	    T[i] = cc.SetDomainN_GMF(E,cc.ra,cc.dec)
+	if 'ICM' in cc.pipeline:
+	    cc.pipeline['ICM'].restore_state(cc, state)
+	return T
+
+    def eigen(self, cc, E):
+	return cc.EigenDomainN_GMF(E,cc.ra,cc.dec)
+
+    def domain_derivs(self, cc, E):
+	return cc.DerivDomainN_GMF(E,cc.ra,cc.dec)
+
+    def transfer_derivs(self, cc, EGeV):
+	"""Transfer matrices of the GMF and their derivatives, the B-field realization of the ICM is restored afterwards"""
+	if 'ICM' in cc.pipeline:
+	    state = cc.pipeline['ICM'].save_state(cc)
+	T = super(StageGMF,self).transfer_derivs(cc, EGeV)
+	if 'ICM' in cc.pipeline:
+	    cc.pipeline['ICM'].restore_state(cc, state)
+	return T
+
+    def transfer_bins(self, cc, EGeV, dlogE, x):
+	"""Transfer matrices of the GMF within energy bins, the B-field realization of the ICM is restored afterwards"""
+	if 'ICM' in cc.pipeline:
+	    state = cc.pipeline['ICM'].save_state(cc)
+	U = super(StageGMF,self).transfer_bins(cc, EGeV, dlogE, x)
+	if 'ICM' in cc.pipeline:
+	    cc.pipeline['ICM'].restore_state(cc, state)
+	return U
+
+    def apply(self, cc, U, Pt, Pu, Pa, atten):
+	"""
+	Mixing in the GMF for all energies, Pt, Pu, and Pa are changed in place
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	U:	(n x 3 x 3)-dim array, transfer matrices of the GMF for all energies
+	Pt,Pu,Pa:	n-dim arrays, photon and ALP probabilities at the border of the Milky Way
+			without EBL absorption
+	atten:	n-dim array, photon survival probability due to the EBL
+	"""
+	pol = np.array([Pt * atten,Pu * atten,Pa]).transpose()
+	pol = np.einsum('nij,nj,nkj->nik',U,pol,U.conjugate())	# U diag(pol) U^dagger
+	Pt[...] = np.real(pol[:,0,0])
+	Pu[...] = np.real(pol[:,1,1])
+	Pa[...] = np.real(pol[:,2,2])
+	return
+
+    def apply_derivs(self, cc, U, dU, Pt, Pu, Pa, dP, atten):
+	"""
+	Derivatives of the probabilities after the mixing in the GMF for all energies, 
+	dP is changed in place. Has to be called before apply.
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	U:	(n x 3 x 3)-dim array, transfer matrices of the GMF for all energies
+	dU:	dictionary with the (n x 3 x 3)-dim derivatives of the transfer matrices
+	Pt,Pu,Pa:	n-dim arrays, photon and ALP probabilities at the border of the Milky Way
+			without EBL absorption
+	dP:	dictionary with (3 x n)-dim arrays, derivatives of Pt, Pu, Pa
+	atten:	n-dim array, photon survival probability due to the EBL
+	"""
+	pol = np.array([Pt * atten,Pu * atten,Pa]).transpose()
+	att = np.array([atten,atten,np.ones(atten.shape[0])])
+	for p in dP.keys():
+	    dpol = np.einsum('nij,nj,nkj->nik',U,(dP[p] * att).transpose(),U.conjugate())
+	    if p in dU:
+		X	= np.einsum('nij,nj,nkj->nik',dU[p],pol,U.conjugate())
+		dpol	+= X + np.transpose(X.conjugate(),(0,2,1))
+	    dP[p][...] = np.real(np.diagonal(dpol,axis1 = 1,axis2 = 2)).transpose()
+	return
+
+STAGES		= dict([(s.name,s) for s in [StageBLR,StageJet,StageICM,StageIGM,StageEBL,StageGMF]])
+ORDER		= ['BLR','Jet','ICM','IGM','EBL','GMF']	# order of the propagation from the source to the observer
+UPDATE_ORDER	= ['GMF','IGM','ICM','Jet','BLR','EBL']	# order in which the parameters are updated
+RANDOM_ORDER	= ['IGM','ICM','BLR']			# order in which random angles are drawn, as in calc_conversion before the pipeline
+
+def changed_params(old, new):
+    """
+    Names of parameters that are new or have changed
+
+    Parameters
+    ----------
+    old:	dictionary with previous parameter values
+    new:	dictionary with new parameter values
+
+    Returns
+    -------
+    list with keys of new that are not in old or whose values differ
+    """
+    changed = []
+    for k in new.keys():
+	try:
+	    same = bool(np.array_equal(old[k],new[k]))
+	except Exception:	# includes KeyError
+	    same = False
+	if not same:
+	    changed.append(k)
+    return changed
+
+class Pipeline(object):
+    """
+    Ordered list of the stages of a scenario.
+
+    Attributes
+    ----------
+    stages:		list with Stage instances in the order of the propagation
+    matrix:		list with the stages that are described by transfer matrices,
+			they are fused into a single transfer matrix for each energy
+    attenuation:	list with stages that attenuate the photon polarization states
+    final:		list with stages that act on the diagonal polarization matrix after the read out
+    """
+    def __init__(self, scenario):
+	"""
+	Compile the pipeline
+
+	Parameters
+	----------
+	scenario:	string or list of strings with the B-field environments, see Calc_Conv
+	"""
+	if isinstance(scenario,str):
+	    scenario = [scenario]
+	for s in scenario:
+	    if not s in STAGES or s == 'EBL':
+		raise ValueError("Unknown B-field environment {0}! Use one of Jet, ICM, IGM, GMF, BLR.".format(s))
+	names = list(scenario)
+	if not 'IGM' in names:
+	    names.append('EBL')
+
+	self.stages		= [STAGES[n]() for n in ORDER if n in names]
+	self.matrix		= [s for s in self.stages if s.kind == 'matrix']
+	self.attenuation	= [s for s in self.stages if s.kind == 'attenuation']
+	self.final		= [s for s in self.stages if s.kind == 'final']
+	return
+
+    def __contains__(self, name):
+	return name in [s.name for s in self.stages]
+
+    def __getitem__(self, name):
+	for s in self.stages:
+	    if s.name == name:
+		return s
+	raise KeyError(name)
+
+    def __iter__(self):
+	return iter(self.stages)
+
+    def update(self, cc, changed, force = False, **kwargs):
+	"""
+	Update all stages that depend on changed parameters
+
+	Parameters
+	----------
+	cc:		Calc_Conv instance
+	changed:	list with names of the changed parameters
+
+	kwargs
+	------
+	force:	bool, if True, all stages are updated, default: False
+	all other kwargs are parameters, every stage is updated with the parameters it depends on
+
+	Returns
+	-------
+	list with names of the updated stages
+	"""
+	updated = []
+	for name in UPDATE_ORDER:
+	    if not name in self:
+		continue
+	    s = self[name]
+	    if force or len([k for k in s.depends if k in changed]):
+		s.update(cc, **dict([(k,kwargs[k]) for k in s.depends if k in kwargs]))
+		self.clear_cache(cc, name = name)
+		updated.append(name)
+	return updated
+
+    def clear_cache(self, cc, name = 'None'):
+	"""
+	Remove cached transfer matrices
+
+	kwargs
+	------
+	name:	string, name of the stage, if 'None', the cache of all stages is removed
+	"""
+	cache = cc.__dict__.setdefault('stage_cache',{})
+	if name == 'None':
+	    cache.clear()
+	else:
+	    cache.pop(name,None)
+	return
+
+    def transfer(self, cc, stage, EGeV):
+	"""
+	Transfer matrices of a stage for all energies. For stages without random B-field angles
+	the result is cached and reused until the parameters in stage.cache_params or the energies change.
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	stage:	Stage instance
+	EGeV:	n-dim array, energies in GeV
+
+	Returns
+	-------
+	tuple with the result of stage.transfer and a bool that is True if the result was taken from the cache.
+	Cached arrays are read-only.
+	"""
+	if stage.random:
+	    return stage.transfer(cc, EGeV), False
+
+	cache	= cc.__dict__.setdefault('stage_cache',{})
+	key	= dict([(k,cc.__dict__.get(k)) for k in stage.cache_params])
+	key['EGeV'] = EGeV
+	if stage.name in cache and not len(changed_params(cache[stage.name][0], key)):
+	    return cache[stage.name][1], True
+
+	T = stage.transfer(cc, EGeV).copy()
+	T.flags.writeable = False
+	cache[stage.name] = (dict([(k,copy.copy(v)) for k,v in key.items()]), T)
+	return T, False
+
+    def new_random(self, cc, init = False):
+	"""
+	Draw new random B-field realizations for all stages with random B-field angles
+
+	kwargs
+	------
+	init:	bool, True for the first realization after the initialization, default: False
+	"""
+	for name in RANDOM_ORDER:
+	    if name in self:
+		self[name].new_random(cc, init = init)
+	return
+
+    def new_realization(self, cc):
+	"""
+	Draw a complete new B-field realization of all stages with random B-field angles from the global numpy random state.
+	In contrast to new_random, the realization does not depend on the previous realization or on the stages
+	that were updated by the last call of Calc_Conv.update_params_all, so that np.random.seed(seed) followed by 
+	new_realization gives the same realization for the same parameters.
+
+	The random numbers are drawn in the same order as by new_random (and by calc_conversion with new_angles = True),
+	i.e. the angles of the IGM, the ICM, and the BLR. For random angles, the same seed therefore gives the same 
+	realization as new_random. For a turbulent field in the ICM, new_random (as calc_conversion before the pipeline)
+	reuses the random numbers of the second transverse component of the previous realization for the first one 
+	and only draws new numbers for the second one, while new_realization draws new numbers for both components.
+	For a turbulent field, realizations of new_realization therefore differ from those of new_random for the same seed.
+	"""
+	for name in RANDOM_ORDER:
+	    if name in self:
+		fields = self[name].draw_fields(cc, np.random, 1)
+		self[name].set_fields(cc, dict([(k,v[0]) for k,v in fields.items()]))
+	return
+
+    def propagate(self, cc, EGeV, stats = None):
+	"""
+	Calculate the photon and ALP probabilities for the current B-field realization
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	EGeV:	n-dim array, energies in GeV
+
+	kwargs
+	------
+	stats:	StageStats instance to record the timing of each stage, default: None
+
+	Returns
+	-------
+	tuple with n-dim arrays with the probabilities in t,u, and a polarization
+	"""
+	nE	= EGeV.shape[0]
+	t	= time.time()
+
+	# --- transfer matrices of all stages, the number of matrix multiplications
+	# --- is Nd - 1 for the product of the transfer matrices of Nd domains
+	T = []
+	for s in self.matrix:
+	    Ts,cached = self.transfer(cc, s, EGeV)
+	    T.append(Ts)
+	    if not stats is None:
+		nd	= 0 if cached else s.ndomains(cc) * nE
+		t	= stats.add(s.name, t, domains = nd, matmuls = max(nd - nE,0))
+
+	# --- fuse the transfer matrices and transform the polarization matrix once
+	if len(T):
+	    U = T[0]
+	    for Ti in T[1:]:
+		U = np.einsum('nij,njk->nik',Ti,U)
+	    pol = np.einsum('nij,jk,nlk->nil',U,cc.pol,U.conjugate())	# new polarization matrices
+	else:
+	    pol = np.tile(cc.pol,(nE,1,1))
+	if not stats is None:
+	    t = stats.add('fuse', t, matmuls = (len(T) + 1) * nE if len(T) else 0)
+
+	atten = np.ones(nE)
+	for s in self.attenuation:
+	    atten = atten * self.transfer(cc, s, EGeV)[0]
+	    if not stats is None:
+		t = stats.add(s.name, t)
+
+	Pt	= np.einsum('ij,nji->n',cc.polt,pol).real.copy()
+	Pu	= np.einsum('ij,nji->n',cc.polu,pol).real.copy()
+	Pa	= np.einsum('ij,nji->n',cc.pola,pol).real.copy()
+	if not stats is None:
+	    t = stats.add('readout', t, matmuls = 3 * nE)
+
+	# --- the number of matrix multiplications is Nd - 1 for the product 
+	# --- and two for the transformation of the polarization matrix
+	for s in self.final:
+	    U,cached = self.transfer(cc, s, EGeV)
+	    s.apply(cc, U, Pt, Pu, Pa, atten)
+	    if not stats is None:
+		nd	= 0 if cached else s.ndomains(cc) * nE
+		t	= stats.add(s.name, t, domains = nd, matmuls = nd + nE)
+	return Pt,Pu,Pa
+
+    def propagate_bins(self, cc, EGeV, dlogE, nx = 32):
+	"""
+	Calculate the photon and ALP probabilities for the current B-field realization on a fine grid 
+	of energies within energy bins. The transfer matrices of each stage are calculated from the eigenvalues 
+	and the matrices T1, T2, T3 of all domains at the center and the boundaries of each bin,
+	which are interpolated quadratically in log(E), see PhotALPsConv.binaverage.
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	EGeV:	n-dim array, centers of the energy bins in log(E) in GeV
+	dlogE:	n-dim array, widths of the energy bins in log(E)
+
+	kwargs
+	------
+	nx:	int, number of equally spaced grid points in log(E) within each bin, default: 32
+
+	Returns
+	-------
+	tuple with (n x nx)-dim arrays with the energies of the grid points in GeV 
+	and the probabilities in t,u, and a polarization
+	"""
+	x	= (np.arange(nx) + 0.5) / nx - 0.5
+	Ex	= EGeV[:,np.newaxis] * np.exp(x[np.newaxis,:] * dlogE[:,np.newaxis])
+	for s in self.stages:
+	    s.set_energies(cc, np.concatenate((EGeV * np.exp(-0.5 * dlogE),EGeV,EGeV * np.exp(0.5 * dlogE))))
+
+	U = None
+	for s in self.matrix:
+	    T = s.transfer_bins(cc, EGeV, dlogE, x)
+	    U = T if U is None else np.einsum('bnij,bnjk->bnik',T,U)
+	if U is None:
+	    pol = np.tile(cc.pol,Ex.shape + (1,1))
+	else:
+	    pol = np.einsum('bnij,jk,bnlk->bnil',U,cc.pol,U.conjugate())
+
+	atten = np.ones(Ex.size)
+	for s in self.attenuation:
+	    atten = atten * self.transfer(cc, s, Ex.flatten())[0]
+
+	Pt	= np.einsum('ij,bnji->bn',cc.polt,pol).real.copy()
+	Pu	= np.einsum('ij,bnji->bn',cc.polu,pol).real.copy()
+	Pa	= np.einsum('ij,bnji->bn',cc.pola,pol).real.copy()
+
+	for s in self.final:	# Pt, Pu, Pa are changed in place through the flat views
+	    s.apply(cc, s.transfer_bins(cc, EGeV, dlogE, x).reshape(-1,3,3), Pt.reshape(-1), Pu.reshape(-1), Pa.reshape(-1), atten)
+	return Ex,Pt,Pu,Pa
+
+    def propagate_derivs(self, cc, EGeV, params = ['g','m','B','n']):
+	"""
+	Calculate the photon and ALP probabilities for the current B-field realization 
+	and their derivatives with respect to log(p) for the parameters p. The derivatives 
+	of the transfer matrices are calculated in each stage, see PhotALPsConv.derivatives.
+	Derivatives are only implemented for the ICM and the GMF and not for the strong mixing approximation.
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	EGeV:	n-dim array, energies in GeV
+
+	kwargs
+	------
+	params:	list with parameter names, default: ['g','m','B','n']
+
+	Returns
+	-------
+	tuple with n-dim arrays with the probabilities in t,u, and a polarization
+	and dictionary with (3 x n)-dim arrays with their derivatives for each parameter
+	"""
+	if getattr(cc, 'strong_mixing', False):
+	    raise ValueError("Derivatives are not implemented for the strong mixing approximation")
+	for s in self.matrix + self.final:
+	    if not len(s.derivs):
+		raise ValueError("Derivatives are not implemented for the {0:s}".format(s.name))
+	for p in params:
+	    if not len([s for s in self.matrix + self.final if p in s.derivs]):
+		raise ValueError("Derivatives with respect to {0} are not implemented".format(p))
+
+	nE	= EGeV.shape[0]
+	U	= np.tile(np.eye(3, dtype = np.complex128),(nE,1,1))
+	dU	= dict([(p,np.zeros((nE,3,3), dtype = np.complex128)) for p in params])
+	for s in self.matrix:
+	    Ts,dTs = s.transfer_derivs(cc, EGeV)
+	    for p in params:
+		dU[p] = np.einsum('nij,njk->nik',Ts,dU[p])
+		if p in dTs:
+		    dU[p] += np.einsum('nij,njk->nik',dTs[p],U)
+	    U = np.einsum('nij,njk->nik',Ts,U)
+	pol	= np.einsum('nij,jk,nlk->nil',U,cc.pol,U.conjugate())
+	dpol	= {}
+	for p in params:
+	    X		= np.einsum('nij,jk,nlk->nil',dU[p],cc.pol,U.conjugate())
+	    dpol[p]	= X + np.transpose(X.conjugate(),(0,2,1))
+
+	atten = np.ones(nE)
+	for s in self.attenuation:
+	    atten = atten * self.transfer(cc, s, EGeV)[0]
+
+	Pt	= np.einsum('ij,nji->n',cc.polt,pol).real.copy()
+	Pu	= np.einsum('ij,nji->n',cc.polu,pol).real.copy()
+	Pa	= np.einsum('ij,nji->n',cc.pola,pol).real.copy()
+	dP	= dict([(p,np.array([np.einsum('ij,nji->n',q,dpol[p]).real for q in [cc.polt,cc.polu,cc.pola]])) for p in params])
+
+	for s in self.final:
+	    Ts,dTs = s.transfer_derivs(cc, EGeV)
+	    s.apply_derivs(cc, Ts, dTs, Pt, Pu, Pa, dP, atten)
+	    s.apply(cc, Ts, Pt, Pu, Pa, atten)
+	return Pt,Pu,Pa,dP
+
+    def propagate_mean(self, cc, EGeV):
+	"""
+	Calculate the mean photon and ALP probabilities over all realizations of the random angles 
+	in the ICM, IGM, and BLR in one pass. The polarization matrix is propagated with the superoperators 
+	of the stages, which are averaged over the angles, see PhotALPsConv.superop.
+	For a turbulent field in the ICM, the mean is taken over the angles for the current field strengths.
+
+	Parameters
+	----------
+	cc:	Calc_Conv instance
+	EGeV:	n-dim array, energies in GeV
+
+	Returns
+	-------
+	tuple with n-dim arrays with the mean probabilities in t,u, and a polarization
+	"""
+	nE	= EGeV.shape[0]
+	for s in self.stages:
+	    s.set_energies(cc, EGeV)
+
+	rho = np.tile(cc.pol.reshape(9),(nE,1)).astype(np.complex128)
+	for s in self.matrix:
+	    if s.angle == 'None':
+		S = superop_transfer(self.transfer(cc, s, EGeV)[0])
+	    else:
+		S = s.mean_superops(cc, EGeV)
+	    rho = np.einsum('nij,nj->ni',S,rho)
+	pol = rho.reshape(nE,3,3)
+
+	atten = np.ones(nE)
+	for s in self.attenuation:
+	    atten = atten * self.transfer(cc, s, EGeV)[0]
+
+	Pt	= np.einsum('ij,nji->n',cc.polt,pol).real.copy()
+	Pu	= np.einsum('ij,nji->n',cc.polu,pol).real.copy()
+	Pa	= np.einsum('ij,nji->n',cc.pola,pol).real.copy()
+
+	# the final stages are deterministic and linear in the probabilities
+	for s in self.final:
+	    s.apply(cc, self.transfer(cc, s, EGeV)[0], Pt, Pu, Pa, atten)
+	return Pt,Pu,Pa
@@ -0,0 +1,156 @@
+"""
+Module to store random realizations of photon-ALP conversion probabilities
+in memory-mapped numpy arrays on disk, so that large numbers of realizations
+do not have to be held in memory.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import logging
+from numpy.lib.format import open_memmap
+# ------------------------ #
+
+class RealizationWriter(object):
+    """
+    Class to append realizations of the conversion probabilities to memory-mapped .npy files.
+
+    For each polarization state, a file <key>.npy with shape (nsim, nE) is created in the
+    directory path. The number of realizations written so far is stored in count.npy.
+
+    Attributes
+    ----------
+    path:	string, directory of the store
+    keys:	list with the names of the stored arrays
+    nsim:	int, maximum number of realizations
+    n:		int, number of realizations written so far
+    """
+    def __init__(self, path, nsim, nE, keys = ['Pt','Pu','Pa'], dtype = np.float64, resume = False):
+	"""
+	Init the writer
+
+	Parameters
+	----------
+	path:	string, directory of the store, created if it does not exist
+	nsim:	int, maximum number of realizations
+	nE:	int, number of energies
+
+	kwargs
+	------
+	keys:	list with the names of the stored arrays, default: ['Pt','Pu','Pa']
+	dtype:	numpy dtype of the stored arrays, default: float64
+	resume:	bool, if True, open an existing store and append after the last written realization
+	"""
+	self.path	= path
+	self.keys	= list(keys)
+	self.nsim	= nsim
+	self.arrays	= {}
+
+	if not os.path.isdir(self.path):
+	    os.makedirs(self.path)
+
+	if resume:
+	    self.n = int(np.load(os.path.join(self.path,'count.npy')))
+	    for k in self.keys:
+		self.arrays[k] = open_memmap(os.path.join(self.path,'{0:s}.npy'.format(k)), mode = 'r+')
+		if not self.arrays[k].shape == (nsim,nE):
+		    raise ValueError("Shape of {0:s} ({1}) does not match ({2:n},{3:n})".format(k,self.arrays[k].shape,nsim,nE))
+	else:
+	    self.n = 0
+	    for k in self.keys:
+		self.arrays[k] = open_memmap(os.path.join(self.path,'{0:s}.npy'.format(k)), mode = 'w+',
+					    dtype = dtype, shape = (nsim,nE))
+	    self.flush()
+	return
+
+    def append(self, *P):
+	"""
+	Append one realization
+
+	Parameters
+	----------
+	P:	nE-dim arrays, one for each key, e.g. Pt, Pu, Pa as returned by Calc_Conv.calc_conversion
+	"""
+	if self.n >= self.nsim:
+	    raise IndexError("Store is full, already {0:n} realizations written".format(self.nsim))
+	if not len(P) == len(self.keys):
+	    raise TypeError("Expected {0:n} arrays, got {1:n}".format(len(self.keys),len(P)))
+	for k,p in zip(self.keys,P):
+	    self.arrays[k][self.n] = p
+	self.n += 1
+	return
+
+    def flush(self):
+	"""Write the memory-mapped arrays and the number of written realizations to disk"""
+	for k in self.keys:
+	    self.arrays[k].flush()
+	np.save(os.path.join(self.path,'count.npy'), self.n)
+	return
+
+    def close(self):
+	"""Flush and close the store"""
+	self.flush()
+	self.arrays = {}
+	return
+
+def write_realizations(cc, EGeV, path, nsim = None, new_angles = True, flush_every = 100, resume = False):
+    """
+    Calculate random realizations with a Calc_Conv instance and write them to a memory-mapped store
+
+    Parameters
+    ----------
+    cc:		PhotALPsConv.calc_conversion.Calc_Conv instance
+    EGeV:	n-dim array, energies in GeV
+    path:	string, directory of the store
+
+    kwargs
+    ------
+    nsim:		int, number of realizations, if None, use cc.nsim
+    new_angles:		bool, if True, calculate new random angles for each realization. Default: True
+    flush_every:	int, number of realizations after which the store is flushed to disk, default: 100
+    resume:		bool, if True, append to an existing store until it contains nsim realizations
+
+    Returns
+    -------
+    RealizationWriter instance (closed)
+    """
+    if nsim == None:
+	nsim = cc.nsim
+    w = RealizationWriter(path, nsim, EGeV.shape[0], resume = resume)
+    for P in cc.iter_conversion(EGeV, nsim = nsim - w.n, new_angles = new_angles):
+	w.append(*P)
+	if not w.n % flush_every:
+	    w.flush()
+	    logging.debug("Written {0:n} / {1:n} realizations to {2:s}".format(w.n,nsim,path))
+    w.close()
+    return w
+
+def load_realizations(path, mmap_mode = 'r', keys = ['Pt','Pu','Pa']):
+    """
+    Load the realizations from a store without reading them into memory
+
+    Parameters
+    ----------
+    path:	string, directory of the store
+
+    kwargs
+    ------
+    mmap_mode:	string, mode for memory mapping, see numpy.load, default: 'r'
+    keys:	list with the names of the stored arrays, default: ['Pt','Pu','Pa']
+
+    Returns
+    -------
+    dictionary with (n x nE)-dim memory-mapped arrays, where n is the number of written realizations
+    """
+    n = int(np.load(os.path.join(path,'count.npy')))
+    result = {}
+    for k in keys:
+	result[k] = np.load(os.path.join(path,'{0:s}.npy'.format(k)), mmap_mode = mmap_mode)[:n]
+    return result
@@ -0,0 +1,258 @@
+"""
+Module to scan the photon survival probability over a grid of parameters,
+e.g. photon-ALP coupling versus ALP mass.
+
+Grid points are evaluated in chunks, optionally on a pool of worker processes,
+and each finished chunk is written to disk, so that an interrupted scan
+is resumed where it stopped. The fixed configuration, the random seed, and the
+confidence levels are stored with the grid, a scan can only be resumed with the same settings.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+- 10/18/2026: yaml is imported only if a config file is given
+- 10/18/2026: random seed is set after the parameter update, so that results do not depend on the chunks
+- 10/18/2026: configuration and random seed are stored and checked when a scan is resumed
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import logging
+import os
+import glob
+import json
+from itertools import product
+from multiprocessing import Pool
+# --- ALP imports
+import PhotALPsConv.calc_conversion as CC
+from PhotALPsConv.tools import median_contours
+from PhotALPsConv.fitstore import plain_config
+# ------------------------ #
+
+# Calc_Conv instance of each worker process
+_cc = None
+
+def _init_worker(kwargs):
+    """Initialize the Calc_Conv instance of a worker process"""
+    global _cc
+    _cc = CC.Calc_Conv(**kwargs)
+    return
+
+def _calc_chunk(args):
+    """
+    Calculate the photon survival probability for all grid points of one chunk
+
+    Parameters
+    ----------
+    args:	tuple with chunk number, list of flat grid indices, list with parameter dicts,
+		energies in GeV, confidence levels and random seed
+
+    Returns
+    -------
+    tuple with chunk number, flat grid indices and dictionary with median and confidence contours
+    """
+    ichunk, index, pars, EGeV, conf, seed = args
+
+    try:
+	_cc.scenario.index('Jet')
+	new_angles = False
+    except ValueError:
+	new_angles = True
+
+    result = {}
+    for i,par in zip(index,pars):
+	_cc.update_params_all(**par)
+	np.random.seed(seed + i)		# seeded after the update, which draws a varying number of random numbers
+	_cc.pipeline.new_realization(_cc)
+	Pgg = np.zeros((_cc.nsim,EGeV.shape[0]))
+	for j in range(_cc.nsim):
+	    Pt,Pu,Pa = _cc.calc_conversion(EGeV, new_angles = new_angles and j > 0)
+	    Pgg[j] = Pt + Pu
+	for k,v in median_contours(Pgg, conf = conf).items():
+	    result.setdefault(k,[]).append(v)
+    for k in result.keys():
+	result[k] = np.array(result[k])
+    return ichunk, np.array(index), result
+
+class ParamScan(object):
+    """
+    Class to scan the photon survival probability over a parameter grid
+    with a resumable on-disk store of the results.
+
+    Attributes
+    ----------
+    outdir:	string, directory where results are stored
+    names:	list with names of grid parameters
+    axes:	list with arrays of grid values of the parameters
+    EGeV:	n-dim array with energies in GeV
+    kwargs:	dictionary with the kwargs for PhotALPsConv.calc_conversion.Calc_Conv
+    """
+    def __init__(self, outdir, grid, EGeV = None, config = 'None', chunksize = 10, nproc = 1,
+		    seed = 0, conf = [0.68,0.95], **kwargs):
+	"""
+	Init the parameter scan
+
+	Parameters
+	----------
+	outdir:		string, directory for the results, created if it does not exist
+	grid:		list of tuples (name, n-dim array) with the grid parameters and their values,
+			e.g. [('g', np.logspace(-1.,1.,20)), ('m', np.logspace(-1.,2.,30))]
+
+	kwargs
+	------
+	EGeV:		n-dim array, energies in GeV. If None, calculated from
+			log10Estart, log10Estop, and Estep of the configuration
+	config:		string, path to config yaml file, e.g. EXAMPLE.yaml. If none, use kwargs.
+	chunksize:	int, number of grid points evaluated and stored together, default: 10
+	nproc:		int, number of worker processes, default: 1
+	seed:		int, the random seed of grid point i is seed + i, so that results do not
+			depend on the order of evaluation, default: 0
+	conf:		list with confidence levels of the contours, default: [0.68,0.95]
+	and all kwargs of PhotALPsConv.calc_conversion.Calc_Conv, if no config file is given.
+	"""
+	if not config == 'None':
+	    import yaml
+	    kwargs = yaml.load(open(config))
+	kwargs.setdefault('nsim',1)
+
+	self.outdir	= outdir
+	self.names	= [g[0] for g in grid]
+	self.axes	= [np.array(g[1], dtype = np.float) for g in grid]
+	self.shape	= tuple([a.shape[0] for a in self.axes])
+	self.chunksize	= chunksize
+	self.nproc	= nproc
+	self.seed	= seed
+	self.conf	= conf
+	self.kwargs	= kwargs
+
+	if EGeV == None:
+	    EGeV = np.logspace(kwargs['log10Estart'],kwargs['log10Estop'],kwargs['Estep'])
+	self.EGeV	= np.array(EGeV)
+
+	self.nchunk = int(np.ceil(np.prod(self.shape) / float(self.chunksize)))
+
+	if not os.path.isdir(self.outdir):
+	    os.makedirs(self.outdir)
+	self.__init_store()
+	return
+
+    def config(self):
+	"""
+	Returns
+	-------
+	dictionary with the fixed configuration of the scan, i.e. the kwargs of Calc_Conv without 
+	the grid parameters (see PhotALPsConv.fitstore.plain_config), the random seed, and the confidence levels
+	"""
+	config = plain_config(dict([(k,v) for k,v in self.kwargs.items() if not k in self.names]))
+	config['seed'] = self.seed
+	config['conf'] = list(self.conf)
+	return json.loads(json.dumps(config, default = float))
+
+    def __init_store(self):
+	"""Write the grid definition and the configuration to the store or check them against an existing one"""
+	fname = os.path.join(self.outdir,'scan.npz')
+	if os.path.isfile(fname):
+	    f = np.load(fname)
+	    same = [str(k) for k in f['names']] == self.names and f['chunksize'] == self.chunksize and \
+		    f['EGeV'].shape == self.EGeV.shape and np.allclose(f['EGeV'],self.EGeV)
+	    for i,a in enumerate(self.axes):
+		same = same and f['axis_{0:n}'.format(i)].shape == a.shape and np.allclose(f['axis_{0:n}'.format(i)],a)
+	    if not same:
+		raise ValueError("Scan in {0:s} was started with a different grid, energies or chunk size".format(self.outdir))
+	    stored	= json.loads(str(f['config'])) if 'config' in f.files else {}
+	    config	= self.config()
+	    diff	= sorted([k for k in set(stored.keys() + config.keys()) if not stored.get(k) == config.get(k)])
+	    if len(diff):
+		raise ValueError("Scan in {0:s} was started with a different configuration: {1}".format(self.outdir,
+		    ', '.join(['{0:s} = {1} (now: {2})'.format(k,stored.get(k),config.get(k)) for k in diff])))
+	else:
+	    axes = {}
+	    for i,a in enumerate(self.axes):
+		axes['axis_{0:n}'.format(i)] = a
+	    np.savez(fname, names = np.array(self.names), EGeV = self.EGeV, chunksize = self.chunksize, 
+		config = np.array(json.dumps(self.config())), **axes)
+	return
+
+    def __chunk_file(self, ichunk):
+	return os.path.join(self.outdir,'chunk_{0:05n}.npz'.format(ichunk))
+
+    def missing_chunks(self):
+	"""
+	Returns
+	-------
+	list with the numbers of the chunks that have not been calculated yet
+	"""
+	return [i for i in range(self.nchunk) if not os.path.isfile(self.__chunk_file(i))]
+
+    def __tasks(self):
+	"""Generator for the arguments of all chunks that still need to be calculated"""
+	for ichunk in self.missing_chunks():
+	    index = range(ichunk * self.chunksize, min((ichunk + 1) * self.chunksize, int(np.prod(self.shape))))
+	    pars = []
+	    for i in index:
+		idx = np.unravel_index(i,self.shape)
+		par = dict(self.kwargs)
+		par.update(dict([(k,a[j]) for k,a,j in zip(self.names,self.axes,idx)]))
+		pars.append(par)
+	    yield ichunk, index, pars, self.EGeV, self.conf, self.seed
+
+    def __write_chunk(self, ichunk, index, result):
+	"""Write the results of one chunk to disk. The file is renamed only after it has been written completely."""
+	fname = self.__chunk_file(ichunk)
+	tmp = fname[:-4] + '.tmp.npz'
+	np.savez(tmp, index = index, **result)
+	os.rename(tmp, fname)
+	logging.info("Scan: finished chunk {0:n} / {1:n}".format(ichunk + 1, self.nchunk))
+	return
+
+    def run(self):
+	"""
+	Calculate all grid points that are not yet stored on disk
+	"""
+	for f in glob.glob(os.path.join(self.outdir,'chunk_*.tmp.npz')):	# remove chunks of interrupted runs
+	    os.remove(f)
+
+	if self.nproc > 1:
+	    pool = Pool(self.nproc, initializer = _init_worker, initargs = (self.kwargs,))
+	    try:
+		for ichunk, index, result in pool.imap_unordered(_calc_chunk, self.__tasks()):
+		    self.__write_chunk(ichunk, index, result)
+	    finally:
+		pool.terminate()
+	else:
+	    _init_worker(self.kwargs)
+	    for args in self.__tasks():
+		self.__write_chunk(*_calc_chunk(args))
+	return
+
+    def collect(self):
+	"""
+	Collect the results of all stored chunks
+
+	Returns
+	-------
+	dictionary with entries
+	    done:		boolean array with grid shape, True if grid point has been calculated
+	    median:		array with shape (grid shape, n) with median photon survival probability
+	    conf_{int(100 * conf)}: array with shape (grid shape, 2, n) with confidence contours
+	"""
+	nE = self.EGeV.shape[0]
+	result = {'done': np.zeros(self.shape, dtype = np.bool), 'median': np.zeros(self.shape + (nE,))}
+	for c in self.conf:
+	    result['conf_{0:n}'.format(int(c * 100))] = np.zeros(self.shape + (2,nE))
+
+	for ichunk in range(self.nchunk):
+	    fname = self.__chunk_file(ichunk)
+	    if not os.path.isfile(fname):
+		continue
+	    f = np.load(fname)
+	    idx = np.unravel_index(f['index'],self.shape)
+	    result['done'][idx] = True
+	    for k in result.keys():
+		if k == 'done':
+		    continue
+		result[k][idx] = f[k]
+	return result
@@ -0,0 +1,134 @@
+"""
+Module to collect timing and counter statistics of the conversion calculation
+for each B-field environment (stage), e.g. to find out which stage dominates
+the run time.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import os
+import time
+import json
+# ------------------------ #
+
+class StageStats(object):
+    """
+    Class to accumulate wall time, number of calls, number of domains,
+    and number of 3x3 matrix multiplications for each stage.
+
+    Attributes
+    ----------
+    time:	dictionary with total wall time in seconds for each stage
+    calls:	dictionary with number of calls for each stage
+    domains:	dictionary with total number of processed domains for each stage
+    matmuls:	dictionary with total number of 3x3 matrix multiplications for each stage
+    events:	list with (stage, start time, duration, process id) tuples, only filled if trace = True
+    """
+    def __init__(self, trace = False):
+	"""
+	Init the statistics
+
+	kwargs
+	------
+	trace:	bool, if True, keep every timed call as an event for export with write_trace, default: False
+	"""
+	self.trace = trace
+	self.reset()
+	return
+
+    def reset(self):
+	"""Set all statistics to zero"""
+	self.time	= {}
+	self.calls	= {}
+	self.domains	= {}
+	self.matmuls	= {}
+	self.events	= []
+	return
+
+    def add(self, stage, t0, domains = 0, matmuls = 0):
+	"""
+	Add one call of a stage that started at time t0 and ends now
+
+	Parameters
+	----------
+	stage:	string, name of the stage, e.g. 'ICM'
+	t0:	float, start time of the call as returned by time.time()
+
+	kwargs
+	------
+	domains:	int, number of domains processed in this call
+	matmuls:	int, number of 3x3 matrix multiplications in this call
+
+	Returns
+	-------
+	float, current time
+	"""
+	t1 = time.time()
+	self.time[stage]	= self.time.get(stage,0.) + t1 - t0
+	self.calls[stage]	= self.calls.get(stage,0) + 1
+	self.domains[stage]	= self.domains.get(stage,0) + domains
+	self.matmuls[stage]	= self.matmuls.get(stage,0) + matmuls
+	if self.trace:
+	    self.events.append((stage, t0, t1 - t0, os.getpid()))
+	return t1
+
+    def merge(self, other):
+	"""
+	Add the statistics of another StageStats instance, e.g. from a worker process
+
+	Parameters
+	----------
+	other:	StageStats instance
+	"""
+	for k in other.calls.keys():
+	    self.time[k]	= self.time.get(k,0.) + other.time[k]
+	    self.calls[k]	= self.calls.get(k,0) + other.calls[k]
+	    self.domains[k]	= self.domains.get(k,0) + other.domains[k]
+	    self.matmuls[k]	= self.matmuls.get(k,0) + other.matmuls[k]
+	self.events += other.events
+	return
+
+    def as_dict(self):
+	"""
+	Returns
+	-------
+	dictionary with a dictionary with time, calls, domains, and matmuls for each stage
+	"""
+	return dict([(k, {'time': self.time[k], 'calls': self.calls[k],
+			'domains': self.domains[k], 'matmuls': self.matmuls[k]}) for k in self.calls.keys()])
+
+    def summary(self):
+	"""
+	Returns
+	-------
+	string with a table of the statistics, sorted by wall time
+	"""
+	total = sum(self.time.values())
+	lines = ['{0:12s} {1:>10s} {2:>7s} {3:>10s} {4:>12s} {5:>12s}'.format('stage','time (s)','frac','calls','domains','matmuls')]
+	for k in sorted(self.time.keys(), key = lambda k: -self.time[k]):
+	    lines.append('{0:12s} {1:10.3e} {2:7.3f} {3:10n} {4:12n} {5:12n}'.format(k, self.time[k],
+			    self.time[k] / total if total > 0. else 0., self.calls[k], self.domains[k], self.matmuls[k]))
+	return '\n'.join(lines)
+
+    def write_trace(self, filename):
+	"""
+	Write the recorded events to a file in the chrome trace event format,
+	which can be viewed with chrome://tracing or perfetto
+
+	Parameters
+	----------
+	filename:	string, path to output json file
+	"""
+	if not len(self.events):
+	    raise ValueError("No events recorded, init StageStats with trace = True")
+	t0 = min([e[1] for e in self.events])
+	events = [{'name': s, 'ph': 'X', 'ts': (t - t0) * 1e6, 'dur': dt * 1e6, 'pid': pid, 'tid': 0}
+		    for s,t,dt,pid in self.events]
+	json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, open(filename,'w'))
+	return
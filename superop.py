@@ -0,0 +1,113 @@
+"""
+Module for the superoperators of the photon-ALP mixing, i.e. the linear maps
+rho -> U rho U^dagger of the 3x3 polarization matrix rho written as 9x9 matrices
+acting on the 9-dim vector of rho (row major).
+
+With the matrices T_k and eigenvalues EW_k of a domain of length L the superoperator is
+    S = sum_{k,l} exp(i (EW_k - EW_l^*) L) T_k (x) T_l^*
+where (x) is the Kronecker product. Since the superoperators are linear, the average
+over a random angle between the B field and the polarization in each domain can be
+taken for each domain separately, and the product of the averaged superoperators of all
+domains gives the mean polarization matrix over all B-field realizations in one pass.
+The elements of T_k are polynomials of second order in cos(psi) and sin(psi), so the elements 
+of the superoperator are trigonometric polynomials of fourth order in psi and their average 
+over a uniform angle psi is given exactly by the mean over 8 equally spaced angles, see angle_average.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+# ------------------------ #
+
+def superop(T, EW, L):
+    """
+    Superoperators of all domains
+
+    Parameters
+    ----------
+    T:		list with three (3 x 3 x Nd)-dim arrays T1, T2, T3
+    EW:		list with three Nd-dim arrays with eigenvalues (real or complex)
+    L:		float or Nd-dim array, domain lengths
+
+    Returns
+    -------
+    (Nd x 9 x 9)-dim complex numpy array
+    """
+    Nd	= T[0].shape[2]
+    ph	= np.array([np.exp(1.j * np.asarray(EW[k]) * L) * np.ones(Nd) for k in range(3)])	# 3 x Nd
+    c	= ph[:,np.newaxis,:] * ph.conjugate()[np.newaxis,:,:]				# 3 x 3 x Nd
+    T	= np.array(T, dtype = np.complex128)
+    return np.einsum('kln,kian,ljbn->nijab',c,T,T.conjugate()).reshape(Nd,9,9)
+
+def superop_product(S, left = False):
+    """
+    Multiply the superoperators of all domains in the same order as the transfer matrices
+
+    Parameters
+    ----------
+    S:		(Nd x 9 x 9)-dim array, superoperators of all domains
+
+    kwargs
+    ------
+    left:	bool, if True, the superoperator of domain i is multiplied from the left,
+		otherwise from the right, see PhotALPsConv.workspace.domain_product, default: False
+
+    Returns
+    -------
+    9x9 numpy array with the product
+    """
+    P = S[0].copy()
+    for i in range(1,S.shape[0]):
+	if left:
+	    P = np.dot(S[i],P)
+	else:
+	    P = np.dot(P,S[i])
+    return P
+
+def superop_transfer(U):
+    """
+    Superoperators of transfer matrices
+
+    Parameters
+    ----------
+    U:	(n x 3 x 3)-dim array with transfer matrices
+
+    Returns
+    -------
+    (n x 9 x 9)-dim complex numpy array
+    """
+    return np.einsum('nia,njb->nijab',U,U.conjugate()).reshape(U.shape[0],9,9)
+
+NPSI	= 8	# number of angles that average trigonometric polynomials of up to 7th order exactly
+
+def angle_average(eigen, set_psi, Nd, left = False):
+    """
+    Product of the superoperators of all domains, each averaged over a uniform random angle psi
+
+    Parameters
+    ----------
+    eigen:	function without arguments that returns the matrices T1, T2, T3, the eigenvalues, and the domain lengths
+		of all domains for the current angles, e.g. PhotALPs_ICM.EigenDomainN
+    set_psi:	function that sets the angles of all domains to the Nd-dim array given as argument
+    Nd:		int, number of domains
+
+    kwargs
+    ------
+    left:	bool, if True, the superoperator of domain i is multiplied from the left, default: False
+
+    Returns
+    -------
+    9x9 numpy array with the product of the averaged superoperators
+    """
+    S = np.zeros((Nd,9,9), dtype = np.complex128)
+    for psi in 2. * np.pi * np.arange(NPSI) / NPSI:
+	set_psi(psi * np.ones(Nd))
+	T,EW,L = eigen()
+	S += superop(T,EW,L)
+    return superop_product(S / NPSI, left = left)
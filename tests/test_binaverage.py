@@ -0,0 +1,76 @@
+"""
+Tests of the bin averaged photon survival probability from interpolated eigenvalues and eigenprojectors.
+
+The external packages are replaced by the stand-ins of the benchmarks.
+
+Usage:
+> python -m unittest discover -s tests
+
+PhotALPsConv has to be in your PYTHONPATH.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import sys
+import unittest
+import warnings
+from scipy.integrate import simps
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import standins
+standins.install()
+# --- ALP imports
+import PhotALPsConv.calc_conversion as CC
+# ------------------------ #
+
+warnings.simplefilter('ignore')
+
+KWARGS	= {'z': 0.1, 'ra': 100., 'dec': 20., 'g': 5., 'm': 10., 'B': 1., 'n': 1., 'Lcoh': 10., 'r_abell': 200.,
+	    'B_BLR': 0.2, 'n_BLR': 1e5, 'R_BLR': 0.3, 'L_BLR': 0.01}
+BINS	= np.logspace(1.,4.,7)	# bins of 0.5 dex around the critical energy
+pl	= lambda p,E: p['Prefactor'] * (E / p['Scale']) ** p['Index']
+PFUNC	= {'Prefactor': 1., 'Index': -2., 'Scale': 1e2}
+TOL	= 1e-3			# default tolerance of the eigen mode
+
+def dense_average(cc, bins, steps = 1201):
+    """Bin averages of the photon survival probability of the current realization on a dense grid"""
+    PggAve = np.zeros(len(bins) - 1)
+    for i in range(len(bins) - 1):
+	logE		= np.linspace(np.log(bins[i]), np.log(bins[i+1]), steps)
+	Pt,Pu,Pa	= cc.calc_conversion(np.exp(logE), new_angles = False)
+	w		= pl(PFUNC,np.exp(logE)) * np.exp(logE)
+	PggAve[i]	= simps(w * (Pt + Pu), logE) / simps(w, logE)
+    return PggAve
+
+class TestEigenMode(unittest.TestCase):
+    def test_dense_reference(self):
+	"""eigen mode with the default settings agrees with a dense reference within the default tolerance"""
+	for scenario in [['ICM'],['ICM','GMF'],['BLR']]:
+	    kwargs = dict(KWARGS)
+	    kwargs['scenario'] = scenario
+	    np.random.seed(1)
+	    cc	= CC.Calc_Conv(**kwargs)
+	    ref	= dense_average(cc, BINS)
+	    P	= cc.calc_pggave_conversion(BINS, pl, PFUNC, new_angles = False, mode = 'eigen')
+	    self.assertTrue(np.abs(P - ref).max() < TOL, msg = '{0}: {1:.2e}'.format(scenario, np.abs(P - ref).max()))
+
+    def test_refinement(self):
+	"""refined sub-bins are more accurate than a single sub-bin without refinement"""
+	kwargs = dict(KWARGS)
+	kwargs['scenario'] = ['ICM']
+	np.random.seed(1)
+	cc	= CC.Calc_Conv(**kwargs)
+	ref	= dense_average(cc, BINS)
+	P1	= cc.calc_pggave_conversion(BINS, pl, PFUNC, new_angles = False, mode = 'eigen', tol_eigen = 'None')
+	P	= cc.calc_pggave_conversion(BINS, pl, PFUNC, new_angles = False, mode = 'eigen')
+	self.assertTrue(np.abs(P - ref).max() < 0.1 * np.abs(P1 - ref).max())
+
+if __name__ == '__main__':
+    unittest.main()
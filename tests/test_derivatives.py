@@ -0,0 +1,80 @@
+"""
+Tests of the analytic derivatives of the photon survival probability in the ICM and the GMF.
+
+The external packages are replaced by the stand-ins of the benchmarks.
+
+Usage:
+> python -m unittest discover -s tests
+
+PhotALPsConv has to be in your PYTHONPATH.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import sys
+import unittest
+import warnings
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import standins
+standins.install()
+# --- ALP imports
+import PhotALPsConv.calc_conversion as CC
+# ------------------------ #
+
+warnings.simplefilter('ignore')
+
+EGeV	= np.logspace(0.,4.,9)
+KWARGS	= {'scenario': ['ICM','GMF'], 'z': 0.1, 'ra': 100., 'dec': 20., 'B': 1., 'n': 1., 'Lcoh': 10., 'r_abell': 100.,
+	    'g': 3., 'm': 1.}
+PARAMS	= ['g','m','B','n']
+H	= 1e-5		# step in log(p) of the finite differences
+ATOL	= 1e-8		# absolute tolerance, the finite differences are accurate to about 1e-9
+
+def conversion(**kwargs):
+    """Calc_Conv instance with the same random angles for all parameters"""
+    par = dict(KWARGS)
+    par.update(kwargs)
+    np.random.seed(2)
+    return CC.Calc_Conv(**par)
+
+def finite_difference(f, p):
+    """Central finite difference of f(cc) with respect to log(p)"""
+    return (f(conversion(**{p: KWARGS[p] * np.exp(H)})) - f(conversion(**{p: KWARGS[p] * np.exp(-H)}))) / (2. * H)
+
+class TestDerivatives(unittest.TestCase):
+    def test_conversion(self):
+	"""derivatives of the conversion probabilities agree with finite differences"""
+	cc = conversion()
+	Pt,Pu,Pa,dP = cc.calc_conversion_derivs(EGeV)
+	np.testing.assert_allclose(np.array([Pt,Pu,Pa]), np.array(cc.calc_conversion(EGeV, new_angles = False)), atol = 1e-14)
+	for p in PARAMS:
+	    fd = finite_difference(lambda c: np.array(c.calc_conversion(EGeV, new_angles = False)), p)
+	    np.testing.assert_allclose(dP[p], fd, atol = ATOL, rtol = 0., err_msg = p)
+
+    def test_pggave(self):
+	"""derivatives of the bin averaged photon survival probability agree with finite differences"""
+	bins	= np.logspace(1.,4.,7)
+	pl	= lambda p,E: p['Prefactor'] * (E / p['Scale']) ** p['Index']
+	pfunc	= {'Prefactor': 1., 'Index': -2., 'Scale': 1e2}
+	PggAve,dPggAve = conversion().calc_pggave_gradient(bins, pl, pfunc, params = ['g','B'])
+	self.assertEqual(sorted(dPggAve.keys()), ['B','g'])
+	for p in ['g','B']:
+	    fd = finite_difference(lambda c: c.calc_pggave_gradient(bins, pl, pfunc, params = [p])[0], p)
+	    np.testing.assert_allclose(dPggAve[p], fd, atol = ATOL, rtol = 0., err_msg = p)
+
+    def test_not_implemented(self):
+	"""derivatives raise an error for the strong mixing approximation, other environments, and unknown parameters"""
+	self.assertRaises(ValueError, conversion(strong_mixing = True).calc_conversion_derivs, EGeV)
+	self.assertRaises(ValueError, conversion(scenario = ['ICM','IGM']).calc_conversion_derivs, EGeV)
+	self.assertRaises(ValueError, conversion().calc_conversion_derivs, EGeV, params = ['Lcoh'])
+
+if __name__ == '__main__':
+    unittest.main()
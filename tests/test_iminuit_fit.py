@@ -0,0 +1,74 @@
+"""
+Tests of the chi^2 functions of the fit of a spectrum with ALP modifications.
+
+The external packages are replaced by the stand-ins of the benchmarks.
+
+Usage:
+> python -m unittest discover -s tests
+
+PhotALPsConv and iminuit have to be in your PYTHONPATH.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+- 10/18/2026: analytic gradient is rejected with the strong mixing approximation
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import sys
+import logging
+import unittest
+import warnings
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import standins
+standins.install()
+# --- ALP imports
+import PhotALPsConv.iminuit_fit as IF
+# ------------------------ #
+
+warnings.simplefilter('ignore')
+logging.getLogger().setLevel(logging.WARNING)
+
+X	= np.logspace(-1.,1.,6)
+Y	= 1e-11 * X ** -2.
+S	= 0.1 * Y
+KWARGS	= {'scenario': ['Jet','GMF'], 'z': 0.1, 'ra': 100., 'dec': 20., 'g': 2., 'm': 10., 'Bjet': 0.1, 'njet': 1e3, 'Rmax': 100.,
+	    'func': standins.pl, 'pobs': {'Prefactor': 1., 'Index': -2., 'Scale': 1.}}
+
+class TestFitJetGMF(unittest.TestCase):
+    def test_jet_params(self):
+	"""bin averaged Pgg follows a change of the jet parameters after the first evaluation"""
+	fit = IF.Fit_JetICMGMF(X, Y, S, **KWARGS)
+	chisq = fit._Fit_JetICMGMF__FillChiSq_JetGMF
+	fit.init = True
+	for k,v in [('Bjet',1.),('njet',1e5),('Rmax',50.)]:
+	    par = dict([(p,KWARGS[p]) for p in ['Rmax','Bjet','g','m','njet']])
+	    chisq(1., -2., 1., **par)
+	    P0 = fit.PggAve.copy()
+	    par[k] = v
+	    chisq(1., -2., 1., **par)
+	    self.assertTrue(np.abs(fit.PggAve - P0).max() > 1e-6)
+
+	    # reference without any previous evaluation
+	    kwargs = dict(KWARGS)
+	    kwargs[k] = v
+	    ref = IF.Fit_JetICMGMF(X, Y, S, **kwargs)
+	    np.testing.assert_allclose(fit.PggAve, ref.calc_pggave_conversion(ref.bins * 1e3, ref.func, ref.pobs, Esteps = ref.Esteps),
+					rtol = 1e-10)
+
+class TestFitICMGMF(unittest.TestCase):
+    def test_grad_strong_mixing(self):
+	"""analytic gradient is rejected together with the strong mixing approximation"""
+	kwargs = dict([(k,v) for k,v in KWARGS.items() if not k in ['Bjet','njet','Rmax']])
+	kwargs.update({'scenario': ['ICM','GMF'], 'B': 1., 'n': 1., 'Lcoh': 10., 'r_abell': 100., 'strong_mixing': True})
+	fit = IF.Fit_JetICMGMF(X, Y, S, **kwargs)
+	self.assertRaises(ValueError, fit.fit, grad = True)
+	self.assertRaises(ValueError, fit.calc_pggave_gradient, fit.bins * 1e3, fit.func, fit.pobs)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Tests of the interpolated table of bin averaged photon survival probabilities.
+
+The external packages are replaced by the stand-ins of the benchmarks.
+
+Usage:
+> python -m unittest discover -s tests
+
+PhotALPsConv has to be in your PYTHONPATH.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import warnings
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import standins
+standins.install()
+# --- ALP imports
+from PhotALPsConv.pgg_table import calc_pgg_table, load_pgg_table
+# ------------------------ #
+
+warnings.simplefilter('ignore')
+
+KWARGS	= {'scenario': ['ICM'], 'z': 0.05, 'B': 1., 'n': 1., 'r_abell': 100., 'Lcoh': 10., 'g': 3., 'm': 1.}
+BINS	= np.logspace(2.,4.,5)
+pl	= lambda p,E: p['Prefactor'] * (E / p['Scale']) ** p['Index']
+PFUNC	= {'Prefactor': 1., 'Index': -2., 'Scale': 1e3}
+
+class TestPggTable(unittest.TestCase):
+    def setUp(self):
+	self.outdir	= tempfile.mkdtemp()
+	self.grid	= [('g', np.array([1.,2.,4.])), ('B', np.array([0.5,1.]))]
+	self.table	= calc_pgg_table(BINS, self.grid, pl, PFUNC, seed = 3, Esteps = 15,
+				filename = os.path.join(self.outdir,'table.npz'), **KWARGS)
+	return
+
+    def tearDown(self):
+	shutil.rmtree(self.outdir)
+	return
+
+    def test_config(self):
+	"""fixed configuration without the grid parameters is stored in the table file"""
+	table = load_pgg_table(os.path.join(self.outdir,'table.npz'))
+	self.assertEqual(table.config, self.table.config)
+	self.assertEqual(table.config['seed'], 3)
+	self.assertEqual(table.config['z'], KWARGS['z'])
+	self.assertFalse('g' in table.config or 'B' in table.config)
+
+    def test_clip(self):
+	"""values outside of the grid are set to the grid boundaries"""
+	np.testing.assert_allclose(self.table(g = 10., B = 0.1), np.exp(self.table.logPggAve[-1,0]), rtol = 1e-12)
+	np.testing.assert_allclose(self.table(g = 1. - 1e-15, B = 1.), np.exp(self.table.logPggAve[0,-1]), rtol = 1e-12)
+
+if __name__ == '__main__':
+    unittest.main()
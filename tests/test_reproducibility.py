@@ -0,0 +1,176 @@
+"""
+Tests that the B-field realizations drawn after a parameter update with a fixed 
+random seed do not depend on previously evaluated parameters.
+
+The external packages are replaced by the stand-ins of the benchmarks.
+
+Usage:
+> python -m unittest discover -s tests
+
+PhotALPsConv has to be in your PYTHONPATH.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+- 10/18/2026: parameter scans with different chunks and worker processes
+- 10/18/2026: field bank of a turbulent field applied for other field parameters
+- 10/18/2026: order of the random numbers drawn for a new realization
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import warnings
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import standins
+standins.install()
+# --- ALP imports
+import PhotALPsConv.calc_conversion as CC
+from PhotALPsConv.pgg_table import calc_pgg_table
+from PhotALPsConv.scan import ParamScan
+from PhotALPsConv.fieldbank import generate_field_bank
+# ------------------------ #
+
+warnings.simplefilter('ignore')
+
+# ICM with a turbulent field, the number of random numbers drawn during an update depends on the updated stages
+KWARGS	= {'scenario': ['ICM','IGM'], 'z': 0.05, 'B_gauss': True, 'B': 1., 'n': 1., 'r_abell': 100., 'kH': 1. / 5.,
+	    'dkSteps': 50, 'g': 3., 'm': 1., 'ebl': 'gilmore'}
+EGeV	= np.logspace(2.,4.,8)
+BINS	= np.logspace(2.,4.,5)
+pl	= lambda p,E: p['Prefactor'] * (E / p['Scale']) ** p['Index']
+PFUNC	= {'Prefactor': 1., 'Index': -2., 'Scale': 1e3}
+
+def pgg_after_update(cc, seed, **kwargs):
+    """Photon survival probability after a parameter update and seeding"""
+    cc.update_params_all(**kwargs)
+    np.random.seed(seed)
+    cc.pipeline.new_realization(cc)
+    Pt,Pu,Pa = cc.calc_conversion(EGeV, new_angles = False)
+    return Pt + Pu
+
+class TestReproducibility(unittest.TestCase):
+    def test_evaluation_order(self):
+	"""each parameter point gives the same result independent of the point evaluated before"""
+	Bs = [0.5,1.,2.]
+	np.random.seed(0)
+	cc = CC.Calc_Conv(**KWARGS)
+	par = dict(cc.kwargs)
+	for B in Bs:
+	    P = []
+	    for Bprev in Bs:
+		par['B'] = Bprev
+		pgg_after_update(cc, 2, **par)
+		par['B'] = B
+		P.append(pgg_after_update(cc, 1, **par))
+	    for Pi in P[1:]:
+		np.testing.assert_array_equal(P[0], Pi)
+
+    def test_pgg_table_base_parameters(self):
+	"""Pgg table does not depend on the base value of the grid parameter"""
+	grid = [('B', np.array([0.5,1.]))]
+	tables = []
+	for B in [0.5,2.]:
+	    kwargs = dict(KWARGS)
+	    kwargs['B'] = B
+	    tables.append(calc_pgg_table(BINS, grid, pl, PFUNC, seed = 3, Esteps = 15, **kwargs))
+	np.testing.assert_array_equal(tables[0].logPggAve, tables[1].logPggAve)
+
+    def test_scan_chunks(self):
+	"""scan results do not depend on the number of worker processes and the chunk size"""
+	grid = [('B', np.array([0.5,1.,2.])), ('g', np.array([1.,3.]))]
+	outdir = tempfile.mkdtemp()
+	try:
+	    median = []
+	    for i,(nproc,chunksize) in enumerate([(1,6),(2,1),(2,4)]):
+		scan = ParamScan(os.path.join(outdir,str(i)), grid, EGeV = EGeV, chunksize = chunksize, nproc = nproc,
+				seed = 5, nsim = 2, **KWARGS)
+		scan.run()
+		result = scan.collect()
+		self.assertTrue(np.all(result['done']))
+		median.append(result['median'])
+	finally:
+	    shutil.rmtree(outdir)
+	for m in median[1:]:
+	    np.testing.assert_array_equal(median[0], m)
+
+    def test_field_bank_parameters(self):
+	"""realizations of a turbulent field from a bank follow the current field parameters"""
+	for dkType in ['log','random']:
+	    P = []
+	    for B in [1.,5.]:
+		kwargs = dict(KWARGS)
+		kwargs.update({'B': B, 'dkType': dkType, 'scenario': ['ICM']})
+		np.random.seed(0)
+		cc = CC.Calc_Conv(**kwargs)
+		bank = generate_field_bank(cc, 2, seed = 7)
+		par = dict(cc.kwargs)
+		par['B'] = 5.
+		cc.update_params_all(**par)
+		bank.apply(cc, 1)
+		P.append(cc.calc_conversion(EGeV, new_angles = False)[0])
+	    np.testing.assert_allclose(P[0], P[1], rtol = 1e-10)
+
+class TestDrawOrder(unittest.TestCase):
+    def test_random_angles(self):
+	"""random angles are drawn in the order IGM, ICM, BLR, as by calc_conversion with new angles"""
+	kwargs = {'scenario': ['BLR','ICM','IGM'], 'z': 0.05, 'B': 1., 'n': 1., 'r_abell': 100., 'Lcoh': 10., 'g': 3., 'm': 1.,
+		    'B_BLR': 0.2, 'n_BLR': 1e5, 'R_BLR': 0.3, 'L_BLR': 0.01}
+	np.random.seed(0)
+	cc = CC.Calc_Conv(**kwargs)
+	angles = ['Psin_IGM','Psin','Psin_BLR']
+
+	np.random.seed(4)
+	cc.pipeline.new_realization(cc)
+	P = cc.calc_conversion(EGeV, new_angles = False)[0]
+	realization = [getattr(cc,k).copy() for k in angles]
+
+	np.random.seed(4)
+	for k,Nd in zip(angles,[cc.Nd_IGM,cc.Nd,cc.Nd_BLR]):
+	    np.testing.assert_array_equal(getattr(cc,k), 2. * np.pi * np.random.rand(1,int(Nd))[0])
+
+	np.random.seed(4)
+	np.testing.assert_allclose(cc.calc_conversion(EGeV, new_angles = True)[0], P, rtol = 1e-12)
+	for k,v in zip(angles,realization):
+	    np.testing.assert_array_equal(getattr(cc,k), v)
+
+    def test_turbulent_field(self):
+	"""
+	new random numbers of both transverse components of a turbulent field are drawn, while 
+	calc_conversion with new angles reuses the numbers of the second component for the first one
+	"""
+	np.random.seed(0)
+	cc	= CC.Calc_Conv(**KWARGS)
+	last	= cc.bfield.random_numbers()
+
+	np.random.seed(4)
+	igm	= 2. * np.pi * np.random.rand(1,int(cc.Nd_IGM))[0]
+	numbers	= []
+	for c in ['t','u']:
+	    cc.bfield.new_random_numbers()
+	    numbers.append(cc.bfield.random_numbers())
+
+	np.random.seed(4)
+	cc.bfield.set_random_numbers(last)
+	cc.calc_conversion(EGeV, new_angles = True)
+	np.testing.assert_array_equal(cc.Psin_IGM, igm)
+	B = cc.B.copy()
+	cc.new_B_n(numbers = [last,numbers[0]])
+	np.testing.assert_array_equal(cc.B, B)
+
+	np.random.seed(4)
+	cc.pipeline.new_realization(cc)
+	np.testing.assert_array_equal(cc.Psin_IGM, igm)
+	B = cc.B.copy()
+	cc.new_B_n(numbers = numbers)
+	np.testing.assert_array_equal(cc.B, B)
+
+if __name__ == '__main__':
+    unittest.main()
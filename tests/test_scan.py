@@ -0,0 +1,76 @@
+"""
+Tests of resuming a parameter scan from its on-disk store.
+
+The external packages are replaced by the stand-ins of the benchmarks.
+
+Usage:
+> python -m unittest discover -s tests
+
+PhotALPsConv has to be in your PYTHONPATH.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import warnings
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import standins
+standins.install()
+# --- ALP imports
+from PhotALPsConv.scan import ParamScan
+# ------------------------ #
+
+warnings.simplefilter('ignore')
+
+KWARGS	= {'scenario': ['ICM'], 'z': 0.05, 'B': 1., 'n': 1., 'r_abell': 100., 'Lcoh': 10., 'g': 3., 'm': 1., 'nsim': 2}
+GRID	= [('g', np.array([1.,2.,4.])), ('m', np.array([0.5,1.]))]
+EGeV	= np.logspace(2.,4.,8)
+
+class TestScanResume(unittest.TestCase):
+    def setUp(self):
+	self.outdir	= tempfile.mkdtemp()
+	self.scan	= ParamScan(self.outdir, GRID, EGeV = EGeV, chunksize = 2, seed = 5, **KWARGS)
+	self.scan.run()
+	self.result	= self.scan.collect()
+	os.remove(os.path.join(self.outdir,'chunk_00001.npz'))	# interrupted scan
+	return
+
+    def tearDown(self):
+	shutil.rmtree(self.outdir)
+	return
+
+    def test_resume(self):
+	"""resumed scan with the same settings calculates the missing chunk only"""
+	scan = ParamScan(self.outdir, GRID, EGeV = EGeV, chunksize = 2, seed = 5, **KWARGS)
+	self.assertEqual(scan.missing_chunks(), [1])
+	scan.run()
+	result = scan.collect()
+	self.assertTrue(np.all(result['done']))
+	np.testing.assert_array_equal(result['median'], self.result['median'])
+
+    def test_resume_config(self):
+	"""resuming a scan with a different configuration, seed, or number of realizations raises an error"""
+	for k,v in [('B',2.),('seed',6),('nsim',3),('B_gauss',True),('conf',[0.68])]:
+	    kwargs = dict(KWARGS)
+	    kwargs[k] = v
+	    self.assertRaises(ValueError, ParamScan, self.outdir, GRID, EGeV = EGeV, chunksize = 2, **dict([('seed',5)] + kwargs.items()))
+	self.assertEqual(self.scan.missing_chunks(), [1])
+
+    def test_resume_grid(self):
+	"""resuming a scan with a different grid or chunk size raises an error"""
+	self.assertRaises(ValueError, ParamScan, self.outdir, GRID[:1], EGeV = EGeV, chunksize = 2, seed = 5, **KWARGS)
+	self.assertRaises(ValueError, ParamScan, self.outdir, GRID, EGeV = EGeV, chunksize = 3, seed = 5, **KWARGS)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests of the closed form transfer matrix in the strong mixing regime.
+
+The external packages are replaced by the stand-ins of the benchmarks.
+
+Usage:
+> python -m unittest discover -s tests
+
+PhotALPsConv has to be in your PYTHONPATH.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import sys
+import unittest
+import warnings
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import standins
+standins.install()
+# --- ALP imports
+import PhotALPsConv.calc_conversion as CC
+from PhotALPsConv.deltas import strong_mixing_error
+# ------------------------ #
+
+warnings.simplefilter('ignore')
+
+EGeV	= np.logspace(-1.,4.,21)
+TOL	= 1e-2		# default strong_mixing_tol
+KWARGS	= {'ICM': {'scenario': ['ICM'], 'z': 0.1, 'B': 10., 'n': 1., 'Lcoh': 10., 'r_abell': 30., 'g': 0.5, 'm': 0.1},
+	    'BLR': {'scenario': ['BLR'], 'z': 0.1, 'B_BLR': 0.1, 'n_BLR': 1., 'R_BLR': 0.3, 'L_BLR': 0.01, 'g': 5., 'm': 0.01}}
+
+def conversion(kwargs, strong_mixing):
+    """Photon survival probability and error bound of the strong mixing approximation in each energy bin"""
+    np.random.seed(2)
+    cc	= CC.Calc_Conv(strong_mixing = strong_mixing, **kwargs)
+    Pt,Pu,Pa = cc.calc_conversion(EGeV, new_angles = False)
+    err	= np.zeros(EGeV.shape[0])
+    for i,E in enumerate(EGeV):
+	cc.calc_conversion(np.array([E]), new_angles = False)
+	if kwargs['scenario'] == ['ICM']:
+	    err[i] = strong_mixing_error(cc.Dperp,cc.Dpar,cc.Da,cc.Lcoh)
+	else:
+	    err[i] = strong_mixing_error(cc.Dperp_BLR,cc.Dpar_BLR,cc.Da_BLR,cc.L_BLR * 1e-3)
+    return Pt + Pu, err
+
+class TestStrongMixing(unittest.TestCase):
+    def test_error_bound(self):
+	"""a common real shift of all Deltas does not count towards the error, their spread and absorption do"""
+	L = np.array([1.,2.])
+	self.assertEqual(strong_mixing_error(np.array([3.,3.]),np.array([3.,3.]),np.array([3.,3.]),L), 0.)
+	self.assertAlmostEqual(strong_mixing_error(np.array([1.,0.]),np.array([0.,0.]),np.array([-1.,2.]),L), 1. + 2.)
+	self.assertAlmostEqual(strong_mixing_error(np.array([1j,0.]),np.array([0.,0.]),np.array([0.,0.]),L), 1.)
+
+    def test_conversion(self):
+	"""strong mixing approximation agrees with the full calculation within its error bound for ICM and BLR"""
+	for env,kwargs in KWARGS.items():
+	    P,err	= conversion(kwargs, False)
+	    Ps,errs	= conversion(kwargs, True)
+	    np.testing.assert_array_equal(err, errs)
+	    m = err < TOL
+	    self.assertTrue(np.any(m) and not np.all(m), msg = env)
+	    # energy independent transfer matrix where the approximation is used, full calculation elsewhere
+	    np.testing.assert_allclose(Ps[m], Ps[m][0], rtol = 1e-12, err_msg = env)
+	    np.testing.assert_array_equal(Ps[~m], P[~m])
+	    # |U|^2 changes by at most twice the error of the transfer matrix
+	    self.assertTrue(np.all(np.abs(Ps[m] - P[m]) <= 2. * err[m]), msg = env)
+	    self.assertTrue(np.abs(Ps[m] - P[m]).max() > 0., msg = env)
+
+if __name__ == '__main__':
+    unittest.main()
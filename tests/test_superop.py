@@ -0,0 +1,73 @@
+"""
+Tests of the mean photon survival probability from the angle averaged superoperators.
+
+The external packages are replaced by the stand-ins of the benchmarks.
+
+Usage:
+> python -m unittest discover -s tests
+
+PhotALPsConv has to be in your PYTHONPATH.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import sys
+import unittest
+import warnings
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import standins
+standins.install()
+# --- ALP imports
+import PhotALPsConv.calc_conversion as CC
+# ------------------------ #
+
+warnings.simplefilter('ignore')
+
+EGeV	= np.array([1.,10.,100.,1000.])
+KWARGS	= {'z': 0.1, 'ra': 100., 'dec': 20., 'g': 3., 'm': 1., 'B': 1., 'n': 1., 'Lcoh': 10., 'r_abell': 20.,
+	    'B_BLR': 0.2, 'n_BLR': 1e5, 'R_BLR': 0.3, 'L_BLR': 0.01}
+NSIM	= 1000		# number of realizations of the Monte Carlo average
+
+class TestMeanConversion(unittest.TestCase):
+    def test_angle_grid(self):
+	"""mean over a grid of 8 x 8 angles in two ICM domains is exact"""
+	kwargs = dict(KWARGS)
+	kwargs['scenario'] = ['ICM','GMF']
+	np.random.seed(1)
+	cc	= CC.Calc_Conv(**kwargs)
+	self.assertEqual(cc.Nd, 2)
+	Pmean	= cc.calc_mean_conversion(EGeV)
+	psi	= 2. * np.pi * np.arange(8) / 8.
+	P	= np.zeros((3,EGeV.shape[0]))
+	for a in psi:
+	    for b in psi:
+		cc.Psin	= np.array([a,b])
+		P	+= np.array(cc.calc_conversion(EGeV, new_angles = False)) / psi.shape[0] ** 2
+	for i in range(3):
+	    np.testing.assert_allclose(Pmean[i], P[i], rtol = 1e-10, atol = 1e-14)
+
+    def test_monte_carlo(self):
+	"""mean agrees with the average over random realizations in BLR, ICM, IGM, and GMF within 4 sigma"""
+	kwargs = dict(KWARGS)
+	kwargs['scenario'] = ['BLR','ICM','IGM','GMF']
+	kwargs['r_abell'] = 50.
+	np.random.seed(4)
+	cc	= CC.Calc_Conv(**kwargs)
+	Pt,Pu,Pa = cc.calc_mean_conversion(EGeV)
+	P	= np.zeros((NSIM,EGeV.shape[0]))
+	for i in range(NSIM):
+	    Pt_i,Pu_i,Pa_i	= cc.calc_conversion(EGeV, new_angles = True)
+	    P[i]		= Pt_i + Pu_i
+	sigma = P.std(axis = 0) / np.sqrt(NSIM)
+	self.assertTrue(np.all(np.abs(P.mean(axis = 0) - (Pt + Pu)) < 4. * sigma), msg = str((P.mean(axis = 0) - (Pt + Pu)) / sigma))
+
+if __name__ == '__main__':
+    unittest.main()
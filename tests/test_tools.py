@@ -0,0 +1,130 @@
+"""
+Tests of the statistical tools for the photon survival probabilities.
+
+Usage:
+> python -m unittest discover -s tests
+
+PhotALPsConv has to be in your PYTHONPATH.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+- 10/18/2026: added tests of median_contours
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+import os
+import tempfile
+import unittest
+# --- ALP imports
+from PhotALPsConv.tools import QuantileSketch, median_contours, ind_lo, ind_up
+# ------------------------ #
+
+N	= 20000		# number of realizations
+NE	= 5		# number of energy bins
+
+def rank(P, v):
+    """Fraction of realizations in each energy bin below and up to the values v"""
+    return (P < v).mean(axis = 0), (P <= v).mean(axis = 0)
+
+def sorted_contours(P, axis = 0, conf = [0.68,0.95]):
+    """Median and confidence contours from the fully sorted matrix, as before the single np.partition"""
+    result = {}
+    for c in conf:
+	idx_up	= min(ind_up(P,c,axis), P.shape[axis] - 1)
+	result['conf_{0:n}'.format(int(c * 100))] = np.array([np.take(np.sort(P, axis = axis), ind_lo(P,c,axis), axis = axis),
+							    np.take(np.sort(P, axis = axis), idx_up, axis = axis)])
+    result['median'] = np.median(P, axis = axis)
+    return result
+
+class TestMedianContours(unittest.TestCase):
+    def setUp(self):
+	self.rng = np.random.RandomState(7)
+	return
+
+    def check(self, result, ref):
+	self.assertEqual(sorted(result.keys()), sorted(ref.keys()))
+	for k in ref.keys():
+	    np.testing.assert_array_equal(result[k], ref[k])
+	return
+
+    def test_sorted(self):
+	"""contours equal those of the sorted matrix for odd and even number of realizations and both axes"""
+	for nsim in [1,2,99,100]:
+	    P = self.rng.rand(nsim,NE)
+	    self.check(median_contours(P), sorted_contours(P))
+	    self.check(median_contours(P.T, axis = 1), sorted_contours(P.T, axis = 1))
+	    self.check(median_contours(P[:,0]), sorted_contours(P[:,0]))
+	conf = [0.5,0.68,0.9,0.95,0.99]
+	P = self.rng.rand(101,NE)
+	self.check(median_contours(P, conf = conf), sorted_contours(P, conf = conf))
+	self.check(median_contours(P, axis = -2), sorted_contours(P, axis = 0))
+
+    def test_chunk(self):
+	"""processing a memory-mapped matrix in blocks gives the same contours"""
+	fname = os.path.join(tempfile.mkdtemp(), 'P.npy')
+	P = np.lib.format.open_memmap(fname, mode = 'w+', shape = (200,13))
+	P[...] = self.rng.rand(200,13)
+	for axis in [0,1]:
+	    ref = sorted_contours(np.array(P), axis = axis)
+	    for chunk in [1,4,13,50]:
+		self.check(median_contours(P, axis = axis, chunk = chunk), ref)
+	del P
+	os.remove(fname)
+	os.rmdir(os.path.dirname(fname))
+
+class TestQuantileSketch(unittest.TestCase):
+    def setUp(self):
+	rng	= np.random.RandomState(3)
+	self.P	= rng.beta(0.5, 0.5, size = (N,NE))
+	return
+
+    def check_median(self, sketch, P):
+	"""median of the sketch deviates from np.median by at most the stated rank error"""
+	self.assertEqual(sketch.N, P.shape[0])
+	eps	= sketch.rank_error()
+	self.assertTrue(eps > 0.)
+	median	= sketch.median_contours()['median']
+	lo,up	= rank(P, median)
+	self.assertTrue(np.all(lo <= 0.5 + eps) and np.all(up >= 0.5 - eps), msg = 'eps = {0:.3f}'.format(eps))
+	self.assertTrue(np.all(median >= np.percentile(P, 100. * (0.5 - eps), axis = 0)))
+	self.assertTrue(np.all(median <= np.percentile(P, 100. * (0.5 + eps), axis = 0)))
+	return
+
+    def test_update(self):
+	"""median from single and batch updates"""
+	for k in [64,256]:
+	    sketch = QuantileSketch(NE, k = k)
+	    for p in self.P[:N // 4]:
+		sketch.update(p)
+	    self.check_median(sketch, self.P[:N // 4])
+	    sketch = QuantileSketch(NE, k = k)
+	    sketch.update(self.P)
+	    self.check_median(sketch, self.P)
+
+    def test_merge(self):
+	"""median from merged sketches, also if the merged sketch has more levels"""
+	for k in [64,256]:
+	    sketch = QuantileSketch(NE, k = k)
+	    for P in np.array_split(self.P[:N // 10], 3) + [self.P[N // 10:]]:
+		other = QuantileSketch(NE, k = k)
+		other.update(P)
+		sketch.merge(other)
+	    self.check_median(sketch, self.P)
+
+    def test_rank_error(self):
+	"""stated rank error grows with the number of compacted levels"""
+	sketch	= QuantileSketch(NE, k = 64)
+	eps	= []
+	for P in np.array_split(self.P, 4):
+	    sketch.update(P)
+	    eps.append(sketch.rank_error())
+	    self.assertAlmostEqual(eps[-1], (len(sketch.buf) - 1) / 63.)
+	self.assertTrue(np.all(np.diff(eps) >= 0.) and eps[-1] > eps[0])
+
+if __name__ == '__main__':
+    unittest.main()
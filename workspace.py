@@ -0,0 +1,152 @@
+"""
+Module with preallocated work space buffers for the transfer matrices of the
+B-field environments, so that the propagation of photons and ALPs does not
+allocate new arrays for each energy or B-field realization.
+
+History:
+--------
+- 10/18/2026: version 0.01 - created
+"""
+
+__author__ = "Manuel Meyer // manuel.meyer@fysik.su.se"
+__version__ = 0.01
+
+# --- Imports ------------ #
+import numpy as np
+# ------------------------ #
+
+class Workspace(object):
+    """
+    Class to manage named buffers that are reused between calls.
+    A buffer only grows, so after the first calls with the maximum number of domains
+    no new memory is allocated.
+
+    Attributes
+    ----------
+    buffers:	dictionary with flat numpy arrays
+    shapes:	dictionary with the shape that was last requested for each buffer
+    nalloc:	int, number of allocations so far
+    """
+    def __init__(self):
+	self.buffers	= {}
+	self.shapes	= {}
+	self.nalloc	= 0
+	return
+
+    def get(self, name, shape, dtype = np.complex128, zero = False):
+	"""
+	Return a buffer with a given shape and dtype
+
+	Parameters
+	----------
+	name:	string, name of the buffer
+	shape:	tuple, shape of the buffer
+
+	kwargs
+	------
+	dtype:	numpy dtype of the buffer, default: complex128
+	zero:	bool, if True, the buffer is set to zero if it is new or if its shape has changed
+		since the last call, otherwise the content of the buffer is undefined, default: False
+
+	Returns
+	-------
+	numpy array with the requested shape, a view of the buffer
+	"""
+	shape	= tuple([int(s) for s in shape])
+	size	= int(np.prod(shape))
+	buf	= self.buffers.get(name)
+
+	if buf is None or not buf.dtype == dtype or buf.shape[0] < size:
+	    buf = np.zeros(size, dtype)
+	    self.buffers[name] = buf
+	    self.nalloc += 1
+	elif zero and not self.shapes[name] == shape:
+	    buf[:size] = 0.
+	self.shapes[name] = shape
+	return buf[:size].reshape(shape)
+
+    def nbytes(self):
+	"""
+	Returns
+	-------
+	int, total memory of all buffers in bytes
+	"""
+	return sum([b.nbytes for b in self.buffers.values()])
+
+def get_workspace(obj):
+    """
+    Return the workspace of an instance of a conversion class, it is created if it does not exist yet.
+    All stages of a Calc_Conv instance share the same workspace.
+    """
+    try:
+	return obj.ws
+    except AttributeError:
+	obj.ws = Workspace()
+	return obj.ws
+
+def set_Un(ws, name, Un, T, EW, L):
+    """
+    Calculate the transfer matrices sum_k exp(i EW_k L) T_k in all domains in place
+
+    Parameters
+    ----------
+    ws:		Workspace instance
+    name:	string, prefix for the names of the temporary buffers
+    Un:		(3 x 3 x Nd)-dim array, output
+    T:		list with three (3 x 3 x Nd)-dim arrays T1, T2, T3
+    EW:		list with three Nd-dim arrays with eigenvalues (real or complex)
+    L:		float or Nd-dim array, domain lengths
+
+    Returns
+    -------
+    Un
+    """
+    Nd	= Un.shape[2]
+    ph	= ws.get(name + '_phase', (Nd,))		# phases are always calculated in double precision
+    if Un.dtype == ph.dtype:
+	phc = ph
+    else:
+	phc = ws.get(name + '_phasec', (Nd,), Un.dtype)
+    tmp	= ws.get(name + '_tmp', Un.shape, Un.dtype)
+    for k in range(3):
+	np.multiply(EW[k], L, out = ph)
+	ph *= 1.j
+	np.exp(ph, out = ph)
+	if not phc is ph:
+	    phc[...] = ph
+	if not k:
+	    np.multiply(phc, T[k], out = Un)
+	else:
+	    np.multiply(phc, T[k], out = tmp)
+	    Un += tmp
+    return Un
+
+def domain_product(ws, name, Un, left = False):
+    """
+    Multiply the transfer matrices of all domains, alternating between two 3x3 buffers
+
+    Parameters
+    ----------
+    ws:		Workspace instance
+    name:	string, prefix for the names of the buffers
+    Un:		(3 x 3 x Nd)-dim array, transfer matrices of all domains
+
+    kwargs
+    ------
+    left:	bool, if True, the matrix of domain i is multiplied from the left (U = Un_i U),
+		otherwise from the right (U = U Un_i), default: False
+
+    Returns
+    -------
+    3x3 numpy array with the product
+    """
+    U	= ws.get(name + '_U0', (3,3), Un.dtype)
+    V	= ws.get(name + '_U1', (3,3), Un.dtype)
+    U[...] = Un[:,:,0]
+    for i in range(1,Un.shape[2]):
+	if left:
+	    np.dot(Un[:,:,i], U, out = V)
+	else:
+	    np.dot(U, Un[:,:,i], out = V)
+	U,V = V,U
+    return U.copy()